@@ -1,98 +1,23 @@
+import os
 import streamlit as st
-import pandas as pd
-import math
-import io
-import xlsxwriter
-from datetime import timedelta, datetime
-
-# ==========================================
-# 1. 基礎資料與設定 (2026 新制)
-# ==========================================
-
-STORE_COUNTS = {
-    "全省": "4,437店",
-    "北區": "北北基 1,649店",
-    "桃竹苗": "桃竹苗 779店",
-    "中區": "中彰投 839店",
-    "雲嘉南": "雲嘉南 499店",
-    "高屏": "高高屏 490店",
-    "東區": "宜花東 181店",
-    "新鮮視_全省": "3,124面",
-    "新鮮視_北區": "北北基 1,127面",
-    "新鮮視_桃竹苗": "桃竹苗 616面",
-    "新鮮視_中區": "中彰投 528面",
-    "新鮮視_雲嘉南": "雲嘉南 365面",
-    "新鮮視_高屏": "高高屏 405面",
-    "新鮮視_東區": "宜花東 83面",
-    "家樂福_量販": "68店",
-    "家樂福_超市": "249店"
-}
-
-REGIONS_ORDER = ["北區", "桃竹苗", "中區", "雲嘉南", "高屏", "東區"]
-DURATIONS = [5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60]
-
-# --- 價格資料庫 (List=定價, Net=實收價) 2026版 ---
-PRICING_DB = {
-    "全家廣播": {
-        "Std_Spots": 480, 
-        "Base_Sec": 30,    
-        "Day_Part": "07:00-23:00",
-        "全省": [400000, 320000], 
-        "北區": [250000, 200000], "桃竹苗": [150000, 120000],
-        "中區": [150000, 120000], "雲嘉南": [100000, 80000], 
-        "高屏": [100000, 80000], "東區": [62500, 50000]
-    },
-    "新鮮視": {
-        "Std_Spots": 504, 
-        "Base_Sec": 10,    
-        "Day_Part": "07:00-23:00",
-        "全省": [150000, 120000], 
-        "北區": [150000, 120000], "桃竹苗": [120000, 96000],
-        "中區": [90000, 72000], "雲嘉南": [75000, 60000], 
-        "高屏": [75000, 60000], "東區": [45000, 36000]
-    },
-    "家樂福": {
-        "Base_Sec": 20,
-        "量販_全省": {"List": 300000, "Net": 250000, "Std_Spots": 420, "Day_Part": "09:00-23:00"},
-        "超市_全省": {"List": 100000, "Net": 80000, "Std_Spots": 720, "Day_Part": "00:00-24:00"} 
-    }
-}
-
-# --- 秒數折扣係數 ---
-SEC_FACTORS = {
-    "全家廣播": {30: 1.0, 20: 0.85, 15: 0.65, 10: 0.5, 5: 0.25},
-    "新鮮視":   {30: 3.0, 20: 2.0, 15: 1.5, 10: 1.0, 5: 0.5},
-    "家樂福":   {30: 1.5, 20: 1.0, 15: 0.85, 10: 0.65, 5: 0.35}
-}
-
-def get_sec_factor(media_type, seconds):
-    factors = SEC_FACTORS.get(media_type, {})
-    return factors.get(seconds, 1.0) 
-
-def calculate_schedule(total_spots, days):
-    """ 
-    偶數排程演算法 (Even Distribution Strategy)
-    1. 將總檔次除以 2
-    2. 分配到每天
-    3. 結果乘以 2
-    """
-    if days == 0: return []
-    
-    if total_spots % 2 != 0: total_spots += 1
-        
-    half_spots = total_spots // 2
-    schedule = [0] * days
-    
-    base = half_spots // days
-    remaining = half_spots % days
-    
-    for i in range(days):
-        schedule[i] = base
-        if i < remaining:
-            schedule[i] += 1
-            
-    final_schedule = [x * 2 for x in schedule]
-    return final_schedule
+import time
+from datetime import datetime, timedelta
+
+from engine import (
+    REGIONS_ORDER, MEDIA_ORDER_MAP, MEDIA_PREFIX, PROD_COST,
+    plan_media, merge_plans, priced_durations, product_string, summarize, format_discount_ratio, config_to_brief,
+)
+import ratecard
+import metrics
+import ledger
+import history
+import flighting
+import schedule_export
+from cache import RESULT_CACHE, digest, plan_key, media_key
+from export_jobs import get_export, release_export, submit_export
+from render import WINDOW_MODES, iter_windows, generate_html_preview
+from playlist import DEFAULT_SEPARATION, build_playlist
+# excel_export (xlsxwriter) / scenarios / optimizer 只在按下產生、開啟情境比較 / 配置建議時才匯入，縮短冷啟動
 
 # ==========================================
 # 2. UI 設定
@@ -101,6 +26,15 @@ def calculate_schedule(total_spots, days):
 st.set_page_config(layout="wide", page_title="Cue Sheet Generator 2026 (v60.5)")
 st.title("📺 媒體 Cue 表生成器")
 
+# 效能計時: 本次 rerun 各階段耗時記入 perf_run；?profile=1 或 CUE_PROFILE=1 時整個 rerun 跑在 cProfile 下
+perf_run = metrics.begin_run("rerun")
+profiler = metrics.start_profile() if metrics.profiling_requested(st.query_params.get("profile")) else None
+if os.environ.get("CUE_METRICS_PORT"):
+    metrics.start_http_server(int(os.environ["CUE_METRICS_PORT"]))
+
+# 本次 rerun 全程使用同一份價目表 (檔案更新後下次 rerun 自動換新版)
+pricing = ratecard.current()
+
 # --- 1. 基本資料 ---
 with st.container():
     st.markdown("### 1. 基本資料設定")
@@ -116,24 +50,56 @@ with st.container():
         days_count = (end_date - start_date).days + 1
         st.info(f"📅 走期共 **{days_count}** 天")
 
+        # 檔次分配: 總檔次與金額不變，只改變每日分布 (見 flighting.py)
+        col_f1, col_f2, col_f3 = st.columns([1, 1, 2])
+        flight_preset = col_f1.selectbox("每日檔次分配", list(flighting.PRESETS), key="flight_preset")
+        flight_holidays = col_f2.checkbox("避開國定假日", key="flight_holidays")
+        flight_blackout = col_f3.text_input("停播日期 (YYYY-MM-DD，逗號分隔)", key="flight_blackout")
+        try:
+            flight_spec = flighting.parse_spec(flight_preset, flight_blackout, flight_holidays)
+        except ValueError as e:
+            st.error(str(e))
+            flight_spec = flighting.parse_spec(flight_preset, None, flight_holidays)
+
 # --- 2. 媒體設定 ---
-config_media = {}
+# 每個媒體欄是一個 fragment: 操作欄內 widget 只重跑該欄。
+# 依賴關係:
+#   全家廣播 明細 <- 全家廣播設定、總預算、天數、價目表
+#   新鮮視   明細 <- 新鮮視設定 (佔比上限 = 100 - 全家廣播佔比)、總預算、天數、價目表
+#   家樂福   明細 <- 家樂福設定 (佔比 = 100 - 全家廣播 - 新鮮視)、總預算、天數、價目表
+#   結果區       <- 三個媒體明細 + 客戶 / 日期
+# 該欄的有效設定改變時才觸發整頁 rerun (其他欄的上限 / 佔比與結果需要更新)；
+# 整頁 rerun 時各媒體明細以 media_key 快取，只有設定改變的媒體會重新計算。
 st.markdown("### 2. 媒體投放設定 (連動總和 100%)")
+if "media_cfg" not in st.session_state:
+    st.session_state["media_cfg"] = {}
+
+def publish_media(m_type, cfg):
+    """ 記下該媒體目前的設定 (未開啟為 None)；fragment 單獨重跑且設定有變時觸發整頁 rerun """
+    store = st.session_state["media_cfg"]
+    changed = store.get(m_type) != cfg
+    store[m_type] = cfg
+    if changed and not st.session_state["_app_run"]:
+        st.rerun()
+
+def media_share(m_type):
+    cfg = st.session_state["media_cfg"].get(m_type)
+    return cfg["share"] if cfg else 0
 
 col_m1, col_m2, col_m3 = st.columns(3)
-remaining_global_share = 100 
 
 # 全家廣播
-with col_m1:
+@st.fragment
+def fm_block(remaining_global_share):
     st.markdown("#### 📻 全家廣播")
     fm_act = st.checkbox("開啟", value=True, key="fm_act")
+    cfg = None
     if fm_act:
         is_nat = st.checkbox("全省聯播", value=True, key="fm_nat")
         regs = ["全省"] if is_nat else st.multiselect("區域", REGIONS_ORDER, key="fm_reg")
-        _secs_input = st.multiselect("秒數", DURATIONS, default=[20], key="fm_sec")
+        _secs_input = st.multiselect("秒數", priced_durations("全家廣播", pricing), default=[20], key="fm_sec")
         secs = sorted(_secs_input)
         share = st.slider("預算佔比%", 0, remaining_global_share, min(70, remaining_global_share), key="fm_share")
-        remaining_global_share -= share
         sec_shares = {}
         if len(secs) > 1:
             st.caption("各秒數佔比")
@@ -144,21 +110,23 @@ with col_m1:
             sec_shares[secs[-1]] = ls
             st.write(f"🔹 {secs[-1]}秒: {ls}%")
         elif secs: sec_shares[secs[0]] = 100
-        config_media["全家廣播"] = {"is_national": is_nat, "regions": regs, "seconds": secs, "share": share, "sec_shares": sec_shares}
+        cfg = {"is_national": is_nat, "regions": regs, "seconds": secs, "share": share, "sec_shares": sec_shares}
+    publish_media("全家廣播", cfg)
 
 # 新鮮視
-with col_m2:
+@st.fragment
+def fv_block(remaining_global_share):
     st.markdown("#### 📺 新鮮視")
     fv_act = st.checkbox("開啟", value=True, key="fv_act")
+    cfg = None
     if fv_act:
         is_nat = st.checkbox("全省聯播 ", value=False, key="fv_nat")
         regs = ["全省"] if is_nat else st.multiselect("區域", REGIONS_ORDER, default=["北區", "桃竹苗"], key="fv_reg")
-        _secs_input = st.multiselect("秒數", DURATIONS, default=[10], key="fv_sec")
+        _secs_input = st.multiselect("秒數", priced_durations("新鮮視", pricing), default=[10], key="fv_sec")
         secs = sorted(_secs_input)
         limit = remaining_global_share
         default_val = min(20, limit)
         share = st.slider("預算佔比% ", 0, limit, default_val, key="fv_share")
-        remaining_global_share -= share
         sec_shares = {}
         if len(secs) > 1:
             st.caption("各秒數佔比")
@@ -169,15 +137,18 @@ with col_m2:
             sec_shares[secs[-1]] = ls
             st.write(f"🔹 {secs[-1]}秒: {ls}%")
         elif secs: sec_shares[secs[0]] = 100
-        config_media["新鮮視"] = {"is_national": is_nat, "regions": regs, "seconds": secs, "share": share, "sec_shares": sec_shares}
+        cfg = {"is_national": is_nat, "regions": regs, "seconds": secs, "share": share, "sec_shares": sec_shares}
+    publish_media("新鮮視", cfg)
 
 # 家樂福
-with col_m3:
+@st.fragment
+def cf_block(remaining_global_share):
     st.markdown("#### 🛒 家樂福")
     cf_act = st.checkbox("開啟", value=True, key="cf_act")
+    cfg = None
     if cf_act:
         st.write("區域：全省")
-        _secs_input = st.multiselect("秒數", DURATIONS, default=[20], key="cf_sec")
+        _secs_input = st.multiselect("秒數", priced_durations("家樂福", pricing), default=[20], key="cf_sec")
         secs = sorted(_secs_input)
         share = remaining_global_share
         st.info(f"預算佔比: **{share}%** (自動填滿)")
@@ -192,413 +163,78 @@ with col_m3:
             sec_shares[secs[-1]] = ls
             st.write(f"🔹 {secs[-1]}秒: {ls}%")
         elif secs: sec_shares[secs[0]] = 100
-        config_media["家樂福"] = {"regions": ["全省"], "seconds": secs, "share": share, "sec_shares": sec_shares}
+        cfg = {"regions": ["全省"], "seconds": secs, "share": share, "sec_shares": sec_shares}
+    publish_media("家樂福", cfg)
+
+st.session_state["_app_run"] = True   # 整頁執行各媒體欄時為 True；fragment 單獨重跑時為 False
+try:
+    with col_m1:
+        fm_block(100)
+    with col_m2:
+        fv_block(100 - media_share("全家廣播"))
+    with col_m3:
+        cf_block(100 - media_share("全家廣播") - media_share("新鮮視"))
+finally:
+    st.session_state["_app_run"] = False   # 例外 / st.stop 也要設回，否則之後 fragment 重跑不會觸發整頁 rerun
+
+config_media = {m_type: cfg for m_type, cfg in st.session_state["media_cfg"].items() if cfg is not None}
+config_media = dict(sorted(config_media.items(), key=lambda kv: MEDIA_ORDER_MAP.get(kv[0], 99)))
 
 # ==========================================
-# 3. 計算邏輯 (核心引擎 v60.5)
+# 3. 計算邏輯 (核心引擎 v60.5, 見 engine.py)
 # ==========================================
 
-final_rows = []
-all_secs = set()
-total_list_price_accum = 0
-debug_logs = [] 
+# 各媒體明細分別快取 (只依賴該媒體設定 / 預算 / 天數 / 價目表版本)，再合併成完整結果
+def media_part(m_type, cfg):
+    key = media_key(m_type, cfg, total_budget_input, days_count, pricing.version)
+    return RESULT_CACHE.get_or_compute((key, "media"), lambda: plan_media(m_type, cfg, total_budget_input, days_count, pricing))
 
+cache_key = plan_key(config_media, total_budget_input, start_date, end_date, client_name, pricing.version)
+parts = []
 if sum(m["share"] for m in config_media.values()) > 0:
-    for m_type, cfg in config_media.items():
-        media_budget = total_budget_input * (cfg["share"] / 100.0)
-        
-        for sec, sec_share in cfg["sec_shares"].items():
-            all_secs.add(f"{sec}秒")
-            sec_budget = media_budget * (sec_share / 100.0)
-            if sec_budget <= 0: continue
-            
-            factor = get_sec_factor(m_type, sec)
-            
-            log_item = {
-                "media": m_type, "sec": sec, "budget": sec_budget, 
-                "status": "OK", "reason": "", "spots": 0, 
-                "std": 0, "factor": factor, "unit_cost": 0
-            }
-
-            if m_type in ["全家廣播", "新鮮視"]:
-                db = PRICING_DB[m_type]
-                std_spots = db["Std_Spots"]
-                day_part = db["Day_Part"]
-                
-                calc_regions = ["全省"] if cfg["is_national"] else cfg["regions"]
-                display_regions = REGIONS_ORDER if cfg["is_national"] else cfg["regions"]
-                
-                # --- Step 1: 裡子 (Net) 算檔次 ---
-                temp_net_unit_sum = 0
-                for reg in calc_regions:
-                    net_price_total = db[reg][1] # 取 Net Price
-                    unit_net = (net_price_total / std_spots) * factor
-                    temp_net_unit_sum += unit_net
-                
-                if temp_net_unit_sum == 0: continue
-                
-                # 逆推 + 懲罰 + 偶數修正
-                initial_spots = math.ceil(sec_budget / temp_net_unit_sum)
-                is_under_target = initial_spots < std_spots
-                multiplier = 1.1 if is_under_target else 1.0
-                
-                final_unit_net = temp_net_unit_sum * multiplier
-                target_spots = math.ceil(sec_budget / final_unit_net)
-                if target_spots % 2 != 0: target_spots += 1 
-                if target_spots == 0: target_spots = 2
-                
-                log_item["spots"] = target_spots
-                log_item["std"] = std_spots
-                log_item["unit_cost"] = final_unit_net
-                log_item["status"] = "未達標" if is_under_target else "達標"
-                log_item["reason"] = f"觸發 x1.1" if is_under_target else "費率正常"
-
-                daily_sch = calculate_schedule(target_spots, days_count)
-                
-                # --- Step 2: 面子 (List) 填報表 ---
-                for i, reg in enumerate(display_regions):
-                    reg_list_total = db.get(reg, [0,0])[0] if cfg["is_national"] else db[reg][0]
-                    
-                    rate_list_display = int((reg_list_total / std_spots) * factor)
-                    pkg_display_val = rate_list_display * target_spots
-                    
-                    if not cfg["is_national"]:
-                        total_list_price_accum += pkg_display_val
-                    elif cfg["is_national"] and reg == "北區":
-                        nat_list_total = db["全省"][0]
-                        total_list_price_accum += int((nat_list_total / std_spots) * factor * target_spots)
-
-                    prog_name = STORE_COUNTS.get(reg, reg)
-                    if m_type == "新鮮視": prog_name = STORE_COUNTS.get(f"新鮮視_{reg}", reg)
-                    
-                    final_rows.append({
-                        "media": m_type, "region": reg, 
-                        "location": f"{reg.replace('區', '')}區-{reg}" if m_type=="全家廣播" else f"{reg.replace('區', '')}區-{reg}",
-                        "program": prog_name, 
-                        "daypart": day_part,
-                        "seconds": sec, "schedule": daily_sch, "spots": target_spots,
-                        "rate_list": rate_list_display, 
-                        "pkg_display_val": pkg_display_val,
-                        "is_pkg_start": (cfg["is_national"] and reg == "北區"), 
-                        "is_pkg_member": cfg["is_national"]
-                    })
-
-            elif m_type == "家樂福":
-                db = PRICING_DB["家樂福"]
-                
-                # [FIX] 使用 DB 中的基準檔次，不再寫死 420/720
-                base_std_spots = db["量販_全省"]["Std_Spots"]
-                sup_std_spots = db["超市_全省"]["Std_Spots"]
-                
-                base_net = db["量販_全省"]["Net"] 
-                unit_net = (base_net / base_std_spots) * factor
-                
-                initial_spots = math.ceil(sec_budget / unit_net)
-                is_under_target = initial_spots < base_std_spots
-                multiplier = 1.1 if is_under_target else 1.0
-                
-                final_unit_net = unit_net * multiplier
-                target_spots = math.ceil(sec_budget / final_unit_net)
-                if target_spots % 2 != 0: target_spots += 1
-                if target_spots == 0: target_spots = 2
-
-                log_item["spots"] = target_spots
-                log_item["std"] = base_std_spots
-                log_item["unit_cost"] = final_unit_net
-                log_item["status"] = "未達標" if is_under_target else "達標"
-                log_item["reason"] = f"觸發 x1.1" if is_under_target else "正常"
-
-                sch = calculate_schedule(target_spots, days_count)
-                
-                # List 顯示
-                base_list = db["量販_全省"]["List"]
-                rate_list_display = int((base_list / base_std_spots) * factor)
-                pkg_list_display = rate_list_display * target_spots
-                
-                total_list_price_accum += pkg_list_display
-                
-                final_rows.append({
-                    "media": "家樂福", "region": "全省量販", "location": "全省量販", "program": STORE_COUNTS["家樂福_量販"],
-                    "daypart": db["量販_全省"]["Day_Part"], "seconds": sec, "schedule": sch, "spots": target_spots,
-                    "rate_list": rate_list_display, "pkg_display_val": pkg_list_display,
-                    "is_pkg_start": False, "is_pkg_member": False
-                })
-                
-                spots_s = int(target_spots * (sup_std_spots / base_std_spots))
-                sch_s = calculate_schedule(spots_s, days_count)
-                final_rows.append({
-                    "media": "家樂福", "region": "全省超市", "location": "全省超市", "program": STORE_COUNTS["家樂福_超市"],
-                    "daypart": db["超市_全省"]["Day_Part"], "seconds": sec, "schedule": sch_s, "spots": spots_s,
-                    "rate_list": "計量販", "pkg_display_val": "計量販",
-                    "is_pkg_start": False, "is_pkg_member": False
-                })
-            
-            debug_logs.append(log_item)
-
-media_order_map = {"全家廣播": 1, "新鮮視": 2, "家樂福": 3}
-final_rows.sort(key=lambda x: media_order_map.get(x['media'], 99))
-
-def parse_sec_int(s):
-    return int(s.replace("秒", ""))
-sorted_secs_list = sorted(list(all_secs), key=parse_sec_int)
-product_str = "、".join(sorted_secs_list)
-
-prod_cost = 10000
-vat = int(round((total_budget_input + prod_cost) * 0.05))
-grand_total = total_budget_input + prod_cost + vat
-discount_ratio_val = (total_budget_input / total_list_price_accum * 100) if total_list_price_accum > 0 else 0
-discount_ratio_str = f"{discount_ratio_val:.1f}% (約 {discount_ratio_val/10:.1f} 折)"
-
-# ==========================================
-# 4. 生成 HTML 預覽
-# ==========================================
-
-def generate_html_preview(rows, days_cnt, start_dt, c_name, products, total_list, grand_total, budget, prod):
-    used_media = sorted(list(set(r['media'] for r in rows)), key=lambda x: media_order_map.get(x, 99))
-    mediums_str = "、".join(used_media)
-
-    date_header_row1 = f"<th class='header-blue' colspan='{days_cnt}'>{start_dt.month}月</th>"
-    date_header_row2 = ""
-    date_header_row3 = ""
-    curr = start_dt
-    weekdays_map = ["一", "二", "三", "四", "五", "六", "日"]
-    for i in range(days_cnt):
-        wd = curr.weekday()
-        cls = "header-yellow" if wd >= 5 else "header-blue"
-        date_header_row2 += f"<th class='{cls}'>{curr.day}</th>"
-        date_header_row3 += f"<th class='{cls}'>{weekdays_map[wd]}</th>"
-        curr += timedelta(days=1)
-        
-    data_rows_html = ""
-    i = 0
-    while i < len(rows):
-        row = rows[i]
-        j = i + 1
-        while j < len(rows) and rows[j]['media'] == row['media'] and rows[j]['seconds'] == row['seconds']:
-            j += 1
-        group_size = j - i
-        m_name = row['media']
-        if "全家廣播" in m_name: m_name = "全家便利商店<br>通路廣播廣告"
-        if "新鮮視" in m_name: m_name = "全家便利商店<br>新鮮視廣告"
-        
-        for k in range(group_size):
-            r_data = rows[i+k]
-            tr = "<tr>"
-            if k == 0:
-                tr += f"<td rowspan='{group_size}' class='align-left'>{m_name}</td>"
-            
-            loc_txt = r_data['location']
-            if "北北基" in loc_txt and "廣播" in r_data['media']: loc_txt = "北區-北北基+東"
-            
-            tr += f"<td>{loc_txt}</td>"
-            tr += f"<td>{r_data['program']}</td>"
-            tr += f"<td>{r_data['daypart']}</td>"
-            tr += f"<td>{r_data['seconds']}秒</td>"
-            
-            rate_disp = f"{r_data['rate_list']:,}" if isinstance(r_data['rate_list'], int) else r_data['rate_list']
-            tr += f"<td class='align-right'>{rate_disp}</td>"
-            
-            pkg_disp = f"{r_data['pkg_display_val']:,}" if isinstance(r_data['pkg_display_val'], int) else r_data['pkg_display_val']
-            
-            if row['is_pkg_start']:
-                if k == 0:
-                    tr += f"<td rowspan='{group_size}' class='align-right'>{pkg_disp}</td>" 
-            elif row['is_pkg_member']:
-                pass
-            else:
-                tr += f"<td class='align-right'>{pkg_disp}</td>"
-            
-            for s_val in r_data['schedule']:
-                tr += f"<td>{s_val}</td>"
-            tr += f"<td class='cell-yellow'>{r_data['spots']}</td>"
-            tr += "</tr>"
-            data_rows_html += tr
-        i = j
-    
-    vat_val = int(round((budget + prod) * 0.05))
-    final_total = budget + prod + vat_val
-
-    css_style = """
-    <style>
-        .preview-table { width: 100%; border-collapse: collapse; font-family: "Microsoft JhengHei", "Arial", sans-serif; font-size: 13px; color: #000; min-width: 1200px; background-color: #ffffff; }
-        .preview-table th, .preview-table td { border: 1px solid #555; padding: 8px; text-align: center; vertical-align: middle; }
-        .header-blue { background-color: #2c3e50; color: white !important; font-weight: bold; }
-        .header-yellow { background-color: #f1c40f; color: #000 !important; font-weight: bold; }
-        .cell-yellow { background-color: #fff3cd; color: #000 !important; font-weight: bold; }
-        .row-total { background-color: #d4edda; color: #000 !important; font-weight: bold; }
-        .row-grand-total { background-color: #ffc107; color: #000 !important; font-weight: bold; font-size: 15px; border-top: 2px solid #000; }
-        .align-left { text-align: left; }
-        .align-right { text-align: right; }
-        tr:nth-child(even) { background-color: #f2f2f2; }
-        tr:hover { background-color: #e6f7ff; }
-    </style>
-    """
-
-    html = f"""
-    {css_style}
-    <div style="overflow-x: auto; width: 100%;">
-        <table class="preview-table">
-            <tr>
-                <td colspan="5" class="align-left" style="background-color:#fff; border:none;">
-                    <b>客戶名稱：</b> {c_name}<br><b>Product：</b> {products}<br><b>Period：</b> {start_dt.strftime('%Y. %m. %d')} - {end_date.strftime('%Y. %m. %d')}<br><b>Medium：</b> {mediums_str}
-                </td>
-                <td colspan="{days_cnt + 3}" style="background-color:#fff; border:none;"></td>
-            </tr>
-            <tr><th colspan="7" style="border:none;"></th>{date_header_row1}<th style="border:none;"></th></tr>
-            <tr>
-                <th rowspan="2" class="header-blue">Station</th><th rowspan="2" class="header-blue">Location</th><th rowspan="2" class="header-blue">Program</th>
-                <th rowspan="2" class="header-blue">Day-part</th><th rowspan="2" class="header-blue">Size</th><th rowspan="2" class="header-blue">rate (List)</th>
-                <th rowspan="2" class="header-blue">Package-cost<br>(List)</th>{date_header_row2}<th rowspan="2" class="header-blue">檔次</th>
-            </tr>
-            <tr>{date_header_row3}</tr>
-            {data_rows_html}
-            <tr class="row-total">
-                <td colspan="5" class="align-right">Total (List Price)</td>
-                <td class="align-right">{sum(r['rate_list'] for r in rows if isinstance(r['rate_list'], int)):,}</td>
-                <td class="align-right">{total_list:,}</td>
-                <td colspan="{days_cnt}"></td>
-                <td class="cell-yellow">{sum(r['spots'] for r in rows)}</td>
-            </tr>
-            <tr><td colspan="6" class="align-right">製作</td><td class="align-right">{prod:,}</td><td colspan="{days_cnt + 1}"></td></tr>
-            <tr><td colspan="6" class="align-right">專案優惠價 (Budget)</td><td class="align-right" style="color:red; font-weight:bold;">{budget:,}</td><td colspan="{days_cnt + 1}"></td></tr>
-            <tr><td colspan="6" class="align-right">5% VAT</td><td class="align-right">{vat_val:,}</td><td colspan="{days_cnt + 1}"></td></tr>
-            <tr class="row-grand-total"><td colspan="6" class="align-right">Grand Total</td><td class="align-right">{final_total:,}</td><td colspan="{days_cnt + 1}"></td></tr>
-        </table>
-    </div>
-    """
-    return html
-
-def generate_excel(rows, days_cnt, start_dt, c_name, products, total_list, grand_total, budget, prod):
-    used_media = sorted(list(set(r['media'] for r in rows)), key=lambda x: media_order_map.get(x, 99))
-    mediums = "、".join(used_media)
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-    worksheet = workbook.add_worksheet("Media Schedule")
-    
-    fmt_title = workbook.add_format({'font_size': 18, 'bold': True, 'align': 'center'})
-    fmt_header_left = workbook.add_format({'align': 'left', 'valign': 'top', 'bold': True})
-    fmt_col_header = workbook.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'bg_color': '#4472C4', 'font_color': 'white', 'text_wrap': True, 'font_size': 10})
-    fmt_date_wk = workbook.add_format({'font_size': 9, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'bg_color': '#4472C4', 'font_color': 'white'})
-    fmt_date_we = workbook.add_format({'font_size': 9, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'bg_color': '#FFD966'}) 
-    fmt_cell = workbook.add_format({'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_size': 10})
-    fmt_cell_left = workbook.add_format({'align': 'left', 'valign': 'vcenter', 'border': 1, 'font_size': 10, 'text_wrap': True})
-    fmt_num = workbook.add_format({'align': 'right', 'valign': 'vcenter', 'border': 1, 'num_format': '#,##0', 'font_size': 10})
-    fmt_spots = workbook.add_format({'align': 'center', 'valign': 'vcenter', 'border': 1, 'bold': True, 'bg_color': '#FFF2CC', 'font_size': 10})
-    fmt_total = workbook.add_format({'align': 'right', 'valign': 'vcenter', 'border': 1, 'bold': True, 'bg_color': '#E2EFDA', 'num_format': '#,##0', 'font_size': 10})
-    fmt_discount = workbook.add_format({'align': 'right', 'valign': 'vcenter', 'border': 1, 'bold': True, 'font_color': 'red', 'num_format': '#,##0', 'font_size': 10})
-    fmt_grand_total = workbook.add_format({'align': 'right', 'valign': 'vcenter', 'border': 1, 'bold': True, 'bg_color': '#FFC107', 'num_format': '#,##0', 'font_size': 10})
-
-    worksheet.merge_range('A1:AJ1', "Media Schedule", fmt_title)
-    
-    info = [("客戶名稱：", c_name), ("Product：", products), ("Period :", f"{start_dt.strftime('%Y. %m. %d')} - {end_date.strftime('%Y. %m. %d')}"), ("Medium :", mediums)]
-    for i, (label, val) in enumerate(info):
-        worksheet.write(2+i, 0, label, fmt_header_left)
-        worksheet.write(2+i, 1, val, fmt_header_left)
-
-    worksheet.write(6, 6, f"{start_dt.month}月", fmt_cell)
-    weekdays = ["一", "二", "三", "四", "五", "六", "日"]
-    curr = start_dt
-    for i in range(days_cnt):
-        col_idx = 7 + i
-        wd = curr.weekday()
-        fmt = fmt_date_we if wd >= 5 else fmt_date_wk
-        worksheet.write(7, col_idx, curr.day, fmt)
-        worksheet.write(8, col_idx, weekdays[wd], fmt)
-        curr += timedelta(days=1)
-
-    headers = ["Station", "Location", "Program", "Day-part", "Size", "rate (List)", "Package-cost\n(List)"]
-    for i, h in enumerate(headers): worksheet.write(8, i, h, fmt_col_header)
-    
-    last_col = 7 + days_cnt
-    worksheet.write(8, last_col, "檔次", fmt_col_header)
-
-    current_row = 9
-    i = 0
-    while i < len(rows):
-        row = rows[i]
-        j = i + 1
-        while j < len(rows) and rows[j]['media'] == row['media'] and rows[j]['seconds'] == row['seconds']: j += 1
-        group_size = j - i
-        m_name = row['media']
-        if "全家廣播" in m_name: m_name = "全家便利商店\n通路廣播廣告"
-        if "新鮮視" in m_name: m_name = "全家便利商店\n新鮮視廣告"
-        if group_size > 1:
-            worksheet.merge_range(current_row, 0, current_row + group_size - 1, 0, m_name, fmt_cell_left)
-        else:
-            worksheet.write(current_row, 0, m_name, fmt_cell_left)
-            
-        for k in range(group_size):
-            r_data = rows[i + k]
-            r_idx = current_row + k
-            loc_txt = r_data['location']
-            if "北北基" in loc_txt and "廣播" in r_data['media']: loc_txt = "北區-北北基+東"
-            worksheet.write(r_idx, 1, loc_txt, fmt_cell)
-            worksheet.write(r_idx, 2, r_data['program'], fmt_cell)
-            worksheet.write(r_idx, 3, r_data['daypart'], fmt_cell)
-            worksheet.write(r_idx, 4, f"{r_data['seconds']}秒", fmt_cell)
-            
-            # Rate (List)
-            if isinstance(r_data['rate_list'], int):
-                worksheet.write(r_idx, 5, r_data['rate_list'], fmt_num)
-            else:
-                worksheet.write(r_idx, 5, r_data['rate_list'], fmt_cell)
-            
-            # Package (List)
-            if r_data['is_pkg_start']:
-                 if k == 0 and group_size > 1:
-                     worksheet.merge_range(current_row, 6, current_row + group_size - 1, 6, r_data['pkg_display_val'], fmt_num)
-                 elif k == 0:
-                     worksheet.write(r_idx, 6, r_data['pkg_display_val'], fmt_num)
-            elif not r_data['is_pkg_member']:
-                 if isinstance(r_data['pkg_display_val'], int):
-                     worksheet.write(r_idx, 6, r_data['pkg_display_val'], fmt_num)
-                 else:
-                     worksheet.write(r_idx, 6, r_data['pkg_display_val'], fmt_cell)
-
-            for d_idx, s_val in enumerate(r_data['schedule']):
-                worksheet.write(r_idx, 7 + d_idx, s_val, fmt_cell)
-            worksheet.write(r_idx, last_col, r_data['spots'], fmt_spots)
-
-        current_row += group_size
-        i = j
-
-    worksheet.write(current_row, 2, "Total (List Price)", fmt_total)
-    worksheet.write(current_row, 5, sum(r['rate_list'] for r in rows if isinstance(r['rate_list'], int)), fmt_total)
-    worksheet.write(current_row, 6, total_list, fmt_total)
-    
-    total_spots_daily = [0] * days_cnt
-    for r in rows:
-        for idx, val in enumerate(r['schedule']):
-            total_spots_daily[idx] += val
-    for idx, val in enumerate(total_spots_daily):
-        worksheet.write(current_row, 7+idx, val, fmt_cell)
-    worksheet.write(current_row, last_col, sum(r['spots'] for r in rows), fmt_spots)
-    
-    current_row += 1
-    worksheet.write(current_row, 6, "製作", fmt_cell)
-    worksheet.write(current_row, 7, prod, fmt_num)
-    current_row += 1
-    worksheet.write(current_row, 6, "專案優惠價 (Budget)", fmt_cell)
-    worksheet.write(current_row, 7, budget, fmt_discount)
-    current_row += 1
-    vat_val = int(round((budget + prod) * 0.05))
-    worksheet.write(current_row, 6, "5% VAT", fmt_cell)
-    worksheet.write(current_row, 7, vat_val, fmt_num)
-    current_row += 1
-    final_total = budget + prod + vat_val
-    worksheet.write(current_row, 6, "Grand Total", fmt_grand_total)
-    worksheet.write(current_row, 7, final_total, fmt_grand_total)
-
-    worksheet.set_column('A:A', 20)
-    worksheet.set_column('B:B', 15)
-    worksheet.set_column('C:E', 12)
-    worksheet.set_column('F:G', 12)
-    worksheet.set_column(7, last_col, 4)
-    workbook.close()
-    return output
+    parts = [media_part(m_type, cfg) for m_type, cfg in config_media.items()]
+result = merge_plans(parts, pricing.version)
+applied_spec = None   # 實際套用的分配策略 (存入報價歷史，期中調整沿用)
+if not flighting.is_even(flight_spec) and result["rows"]:
+    try:
+        result = dict(result, rows=flighting.apply_flighting(result["rows"], start_date, flight_spec))
+        applied_spec = flight_spec
+        # 假日檔更新時 (避開假日才受影響) 預覽 / 下載檔案跟著失效
+        holiday_mask = flighting.calendar_index(start_date, days_count).holiday.tolist() if flight_spec.get("skip_holidays") else None
+        cache_key = digest([cache_key, "flighting", flight_spec, holiday_mask])
+    except ValueError as e:
+        st.error(f"檔次分配: {e} (改用平均分配)")
+final_rows = result["rows"]
+debug_logs = result["logs"]
+total_list_price_accum = result["total_list"]
+product_str = product_string(result["secs"])
+
+quote_key = cache_key   # 報價本身 (刪減前) 的鍵，報價歷史用
+
+# 檔期庫存: 與已成交檔期合計超過每日容量的 (日, 媒體, 區域)；庫存帳一有異動 revision 就變，結果自然重算
+book_ledger = ledger.default_ledger()
+ledger_rev = book_ledger.revision()
+overbooked = RESULT_CACHE.get_or_compute((cache_key, "overbooked", ledger_rev), lambda: ledger.check(final_rows, start_date, book_ledger, pricing))
+if not overbooked.empty and st.session_state.get("clip_overbooked"):
+    final_rows = ledger.clip(final_rows, start_date, book_ledger, pricing)
+    cache_key = digest([cache_key, "clip", ledger_rev])   # 預覽 / 下載檔案改用刪減後的明細
+
+prod_cost = PROD_COST
+totals = summarize(total_budget_input, total_list_price_accum, prod_cost)
+grand_total = totals["grand_total"]
+discount_ratio_val = totals["discount_ratio"]
+discount_ratio_str = format_discount_ratio(discount_ratio_val)
+
+# 報價歷史: 只在下載 Excel / 登錄成交時寫入 (調整設定過程中的試算不存)；相同輸入的 quote_key 相同，只寫入一次
+quote_history = history.default_history()
+
+def save_quote():
+    if result["rows"]:
+        RESULT_CACHE.get_or_compute((quote_key, "history"), lambda: quote_history.record(
+            quote_key, config_media, total_budget_input, start_date, days_count, client_name, result, totals, applied_spec))
 
 # ==========================================
-# 5. 結果顯示與下載
+# 4. 結果顯示與下載
 # ==========================================
 
 st.markdown("### 3. 計算結果摘要")
@@ -606,6 +242,19 @@ m1, m2, m3 = st.columns(3)
 m1.metric("客戶預算 (未稅)", f"{total_budget_input:,}")
 m2.metric("折扣後總金額 (含稅)", f"{grand_total:,}", help="預算 + 製作 + 稅")
 m3.metric("牌價折扣率", discount_ratio_str, delta_color="normal")
+st.caption(f"價目表版本: {result['pricing_version']}")
+if ratecard.last_error():
+    st.warning(f"價目表更新失敗，沿用 {pricing.version}: {ratecard.last_error()}")
+
+if not overbooked.empty:
+    st.warning(f"⚠️ 檔期超賣: {overbooked['date'].nunique()} 天、{len(overbooked)} 個 (日, 區域) 與已成交檔期合計超過每日容量")
+    st.toggle("超賣日自動刪減檔次 (預覽與下載檔案套用，金額不變)", key="clip_overbooked")
+    with st.expander("超賣明細 (秒數)", expanded=False):
+        st.dataframe(overbooked, hide_index=True, use_container_width=True)
+if final_rows and st.button("📌 登錄成交 (寫入檔期庫存帳)"):
+    booking_id = book_ledger.book(final_rows, start_date, quote_key, client_name, pricing.version)
+    save_quote()
+    st.success(f"已登錄成交 #{booking_id}")
 
 with st.expander("💡 系統運算邏輯說明 (本次試算詳細數據)", expanded=False):
     st.markdown("#### 1. 本次預算分配 (Waterfall)")
@@ -627,17 +276,284 @@ with st.expander("💡 系統運算邏輯說明 (本次試算詳細數據)", exp
     * **Excel 顯示**：Rate 與 Package-cost 皆顯示 **牌價 (List Price)** 以凸顯折扣
     """)
 
+    st.markdown("#### 3. 效能計時 (本次 rerun)")
+    perf_slot = st.empty()   # 頁面其餘部分跑完才知道各階段耗時，最後再填入
+
+# 情境比較 / 配置建議 / 預覽分頁皆為 fragment: 操作其中的 widget 只重跑該區塊
+@st.fragment
+def scenario_section():
+    if st.toggle("開啟情境比較", key="sc_on"):
+        from scenarios import budget_steps, two_way_splits, sweep, penalty_budgets
+        base_brief = config_to_brief(config_media, total_budget_input, days_count)
+        c1, c2, c3 = st.columns(3)
+        sc_low = c1.number_input("最低預算", value=int(total_budget_input * 0.5), step=50000, key="sc_low")
+        sc_high = c2.number_input("最高預算", value=int(total_budget_input * 1.5), step=50000, key="sc_high")
+        sc_step = c3.number_input("預算級距", value=50000, min_value=1000, step=10000, key="sc_step")
+        c4, c5, c6 = st.columns(3)
+        sc_fm = c4.text_input("全家廣播佔比% (逗號分隔)", str(base_brief.get("fm_share", 0)), key="sc_fm")
+        sc_fv = c5.text_input("新鮮視佔比% (逗號分隔)", str(base_brief.get("fv_share", 0)), key="sc_fv")
+        sc_sec_step = c6.number_input("兩種秒數時的秒數佔比級距% (0=不掃描)", value=0, min_value=0, max_value=100, step=10, key="sc_sec_step")
+
+        sec_splits = {}
+        if sc_sec_step > 0:
+            for prefix, m_type in MEDIA_PREFIX.items():
+                cfg = config_media.get(m_type)
+                if cfg and len(cfg["seconds"]) == 2:
+                    sec_splits[prefix] = two_way_splits(cfg["seconds"], int(sc_sec_step))
+        try:
+            fm_list = [float(x) for x in sc_fm.split(",") if x.strip()] if "fm_share" in base_brief else None
+            fv_list = [float(x) for x in sc_fv.split(",") if x.strip()] if "fv_share" in base_brief else None
+        except ValueError:
+            st.error("佔比請輸入以逗號分隔的數字")
+            fm_list = fv_list = None
+        budgets = budget_steps(sc_low, sc_high, sc_step)
+        sweep_key = digest([base_brief, budgets, fm_list, fv_list, sec_splits, pricing.version])
+        points = RESULT_CACHE.get_or_compute((sweep_key, "sweep"), lambda: sweep(base_brief, budgets, fm_list, fv_list, sec_splits, pricing))
+        points = points.copy()
+
+        if points.empty:
+            st.info("沒有可計算的情境 (請確認佔比總和不超過 100%)")
+        else:
+            st.caption(f"共 {len(points):,} 個情境")
+            label_cols = [c for c in points.columns if c.endswith(("_share", "_secs")) and points[c].nunique() > 1]
+            points["情境"] = points[label_cols].astype(str).agg(" / ".join, axis=1) if label_cols else "目前設定"
+            st.markdown("**總檔次**")
+            st.line_chart(points.pivot_table(index="budget", columns="情境", values="total_spots"))
+            st.markdown("**牌價折扣率 %**")
+            st.line_chart(points.pivot_table(index="budget", columns="情境", values="discount_ratio"))
+
+            st.markdown("**x1.1 觸發門檻 (目前佔比下，總預算低於此值即觸發)**")
+            for m_type, sec, threshold in penalty_budgets(base_brief, pricing):
+                st.markdown(f"* {m_type} {sec}秒: `${threshold:,.0f}`")
+            x11_cols = [c for c in points.columns if c.endswith("_x11")]
+            points["觸發 x1.1"] = points[x11_cols].any(axis=1)
+            st.dataframe(points.drop(columns=x11_cols + ["情境"]), hide_index=True, use_container_width=True)
+
+with st.expander("📈 情境比較 (預算 × 佔比一次試算)", expanded=False):
+    scenario_section()
+
+@st.fragment
+def optimizer_section():
+    if st.toggle("開啟配置建議", key="opt_on"):
+        from optimizer import OBJECTIVE_LABELS, optimize
+        o1, o2, o3 = st.columns(3)
+        opt_obj = OBJECTIVE_LABELS[o1.radio("目標", list(OBJECTIVE_LABELS), horizontal=True, key="opt_obj")]
+        opt_step = o2.selectbox("佔比級距%", [1, 2, 5, 10], index=2, key="opt_step")
+        opt_top = o3.number_input("顯示前幾名", value=10, min_value=1, max_value=50, key="opt_top")
+        min_shares, required_secs = {}, {}
+        cols = st.columns(max(len(config_media), 1))
+        for col, (m_type, cfg) in zip(cols, config_media.items()):
+            with col:
+                st.markdown(f"**{m_type}**")
+                min_shares[m_type] = st.number_input("最低佔比%", 0, 100, 0, step=5, key=f"opt_min_{m_type}")
+                required_secs[m_type] = st.multiselect("必投秒數", cfg["seconds"], key=f"opt_req_{m_type}")
+        t0 = time.perf_counter()
+        try:
+            opt_key = digest([config_media, total_budget_input, opt_obj, opt_step, int(opt_top), min_shares, required_secs, pricing.version])
+            best = RESULT_CACHE.get_or_compute((opt_key, "optimize"), lambda: optimize(config_media, total_budget_input, opt_obj, opt_step, int(opt_top), min_shares, required_secs, pricing))
+        except ValueError as e:
+            st.error(str(e))
+            best = None
+        if best is not None:
+            if best.empty:
+                st.info("找不到符合條件的配置 (請確認最低佔比總和不超過 100%，且媒體已選區域與秒數)")
+            else:
+                current = sum(r.spots for r in final_rows) if opt_obj == "spots" else total_list_price_accum
+                st.caption(f"搜尋耗時 {(time.perf_counter() - t0) * 1000:.0f} ms；目前設定: {current:,}")
+                st.dataframe(best, hide_index=True, use_container_width=True)
+
+with st.expander("🧮 自動配置建議 (搜尋佔比 / 秒數組合)", expanded=False):
+    optimizer_section()
+
 st.markdown("### 4. Cue 表網頁預覽")
 
 if final_rows:
-    html_preview = generate_html_preview(final_rows, days_count, start_date, client_name, product_str, total_list_price_accum, grand_total, total_budget_input, prod_cost)
-    st.components.v1.html(html_preview, height=600, scrolling=True)
-
-    xlsx_data = generate_excel(final_rows, days_count, start_date, client_name, product_str, total_list_price_accum, grand_total, total_budget_input, prod_cost)
-    
-    st.download_button(
-        label="📥 下載 Excel Cue表 (.xlsx)",
-        data=xlsx_data.getvalue(),
-        file_name=f"CueSheet_{client_name}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    # 長走期分頁顯示: 只輸出目前這一頁的日期欄 (換頁只重跑這個 fragment)
+    @st.fragment
+    def preview_section():
+        col_w1, col_w2 = st.columns([1, 3])
+        with col_w1:
+            window_mode = WINDOW_MODES[st.radio("顯示區間", list(WINDOW_MODES), horizontal=True, key="preview_mode")]
+        windows = iter_windows(start_date, days_count, window_mode)
+        with col_w2:
+            win_idx = st.selectbox("頁面", range(len(windows)), format_func=lambda k: windows[k][0], key="preview_page") if len(windows) > 1 else 0
+        _, win_offset, win_len = windows[min(win_idx, len(windows) - 1)]
+
+        def render_preview():
+            with metrics.stage("html_render"):
+                return generate_html_preview(final_rows, days_count, start_date, client_name, product_str, total_list_price_accum, grand_total, total_budget_input, prod_cost, window=(win_offset, win_len))
+
+        html_preview = RESULT_CACHE.get_or_compute((cache_key, "html", win_offset, win_len), render_preview)
+        metrics.payload("html", len(html_preview.encode("utf-8")))
+        st.components.v1.html(html_preview, height=600, scrolling=True)
+
+    preview_section()
+
+    # Excel 改為按需產生: 在背景 thread 建立 workbook，完成後沿用到輸入改變為止
+    def on_excel_download():
+        release_export(cache_key)   # 超過快取上限的結果只留到下載為止
+        save_quote()
+
+    # 產生中: fragment 每 0.5 秒自動重跑更新進度 (不佔住 script thread)；開始 / 結束時整頁 rerun 切換輪詢
+    export_job = get_export(cache_key)[1]
+    excel_polling = export_job is not None and export_job.status == "running"
+
+    @st.fragment(run_every=0.5 if excel_polling else None)
+    def excel_export_section():
+        xlsx_bytes, job = get_export(cache_key)
+        running = job is not None and job.status == "running"
+        if running != excel_polling:
+            st.rerun()
+        if running:
+            st.progress(job.progress, text="⏳ Excel 產生中...")
+            return
+        if xlsx_bytes is None and job is not None:
+            st.error(f"Excel 產生失敗: {job.error}")
+            release_export(cache_key)   # 錯誤已顯示，下次重新產生
+        if xlsx_bytes is None:
+            if st.button("⚙️ 產生 Excel Cue表"):
+                from excel_export import generate_excel
+                submit_export(cache_key, lambda progress: generate_excel(
+                    final_rows, days_count, start_date, client_name, product_str,
+                    total_list_price_accum, grand_total, total_budget_input, prod_cost, progress=progress
+                ).getvalue())
+                st.rerun()
+            return
+        st.download_button(
+            label="📥 下載 Excel Cue表 (.xlsx)",
+            data=xlsx_bytes,
+            file_name=f"CueSheet_{client_name}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            on_click=on_excel_download
+        )
+
+    excel_export_section()
+
+    # 播放清單: 每日檔次展開到時段內的分鐘 / 小時，給播放廠商
+    @st.fragment
+    def playlist_export_section():
+        res_label = st.radio("播放清單精度", ["分鐘 (每檔一列)", "小時 (每小時檔次)"], horizontal=True, key="pl_res")
+        resolution = "minute" if res_label.startswith("分鐘") else "hour"
+        playlist = RESULT_CACHE.get_or_compute((cache_key, "playlist"), lambda: build_playlist(final_rows))
+        bad = playlist.violations(DEFAULT_SEPARATION)
+        if bad:
+            st.warning(f"⚠️ 有 {bad} 個 (素材, 日) 同素材兩檔間隔不足 {DEFAULT_SEPARATION} 分鐘 (當日檔次超過時段容量)")
+        # CSV 在按下下載時才產生 (Streamlit 另開 thread 執行)，rerun 不必先轉出整份清單
+        st.download_button(
+            label=f"📥 下載播放清單 (.csv，{len(playlist):,} 檔)",
+            data=lambda: RESULT_CACHE.get_or_compute((cache_key, "playlist_csv", resolution), lambda: playlist.to_csv(start_date, resolution)),
+            file_name=f"Playlist_{client_name}_{resolution}.csv",
+            mime="text/csv"
+        )
+
+    playlist_export_section()
+
+    # 機器可讀排程 (播放 / 帳務系統匯入): 與 schedule_export.py / POST /schedule 相同格式，按下下載時才產生
+    @st.fragment
+    def schedule_export_section():
+        fmt = st.radio("排程匯出格式", list(schedule_export.FORMATS), horizontal=True, key="sched_fmt",
+                       format_func=lambda f: {"csv": "CSV (每列一行)", "jsonl": "JSON Lines", "long": "長表 (日 × 列)"}[f])
+        campaign = {"campaign": 1, "client": client_name, "start_date": start_date, "rows": final_rows}
+        st.download_button(
+            label="📥 下載排程資料",
+            data=lambda: RESULT_CACHE.get_or_compute((cache_key, "schedule", fmt), lambda: "".join(
+                text for text, _ in schedule_export.iter_export([campaign], fmt, days_count)).encode("utf-8")),
+            file_name=f"Schedule_{client_name}.{'jsonl' if fmt == 'jsonl' else 'csv'}",
+            mime=schedule_export.CONTENT_TYPES[fmt].split(";")[0]
+        )
+
+    schedule_export_section()
+
+st.markdown("### 5. 報價歷史")
+
+# 重新開啟舊報價: 直接還原存下的計算結果，不重新計算
+@st.fragment
+def history_section():
+    if not st.toggle("開啟報價搜尋", key="hist_on"):
+        return
+    h1, h2, h3 = st.columns([2, 2, 1])
+    q_client = h1.text_input("客戶名稱 (開頭符合)", key="hist_client")
+    q_range = h2.date_input("走期重疊區間", value=(), key="hist_range")
+    q_media = h3.selectbox("媒體", ["全部"] + list(MEDIA_ORDER_MAP), key="hist_media")
+    q_start, q_end = (q_range[0], q_range[-1]) if len(q_range) else (None, None)
+    found = quote_history.search(q_client.strip() or None, q_start, q_end, None if q_media == "全部" else q_media)
+    if found.empty:
+        st.info("沒有符合的報價")
+        return
+    st.dataframe(found, hide_index=True, use_container_width=True)
+    quote_id = st.selectbox("開啟報價", found["id"].tolist(),
+                            format_func=lambda i: f"#{i} {found.loc[found['id'] == i, 'client'].iloc[0]}", key="hist_open")
+    stored = quote_history.get(quote_id)
+    if stored is None:
+        return
+    inputs, old = stored
+    old_totals = summarize(inputs["budget"], old["total_list"], PROD_COST)
+    st.caption(f"#{quote_id} {inputs['client']}｜{inputs['start_date']} 起 {inputs['days']} 天｜價目表 {old['pricing_version']}｜"
+               f"預算 {inputs['budget']:,}｜含稅 {old_totals['grand_total']:,}｜牌價折扣率 {format_discount_ratio(old_totals['discount_ratio'])}")
+    old_html = RESULT_CACHE.get_or_compute((inputs["quote_key"], "history_html"), lambda: generate_html_preview(
+        old["rows"], inputs["days"], inputs["start_date"], inputs["client"], product_string(old["secs"]), old["total_list"],
+        old_totals["grand_total"], inputs["budget"], PROD_COST, window=(0, min(inputs["days"], 31))))
+    st.components.v1.html(old_html, height=400, scrolling=True)
+    if st.button("⚙️ 產生此報價的 Excel", key="hist_xlsx"):
+        from excel_export import generate_excel
+        data = RESULT_CACHE.get_or_compute((inputs["quote_key"], "xlsx"), lambda: generate_excel(
+            old["rows"], inputs["days"], inputs["start_date"], inputs["client"], product_string(old["secs"]),
+            old["total_list"], old_totals["grand_total"], inputs["budget"], PROD_COST).getvalue())
+        st.download_button("📥 下載 Excel Cue表 (.xlsx)", data, file_name=f"CueSheet_{inputs['client']}_{quote_id}.xlsx",
+                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="hist_dl")
+
+    # 期中調整: 已播日子以實際播出為準，只重排剩餘日子 (見 replan.py)
+    if not st.toggle("期中調整 (延長 / 追加預算 / 補檔)", key="rp_on"):
+        return
+    import replan
+    end_old = inputs["start_date"] + timedelta(days=inputs["days"] - 1)
+    r1, r2, r3 = st.columns(3)
+    as_of = r1.date_input("第一個未播日", value=min(max(datetime.now().date(), inputs["start_date"]), end_old),
+                          min_value=inputs["start_date"], key="rp_as_of")
+    end_new = r2.date_input("結束日", value=end_old, min_value=inputs["start_date"], key="rp_end")
+    budget_new = r3.number_input("總預算", min_value=0, value=int(inputs["budget"]), step=10000, key="rp_budget")
+    aired_file = st.file_uploader("已播檔次 (long 表 CSV；未提供時視為照原排程播出)", type=["csv"], key="rp_aired")
+    try:
+        aired = replan.load_aired(aired_file, old["rows"], inputs["start_date"], as_of) if aired_file else None
+        out = replan.replan_quote(inputs, old, as_of, aired, int(budget_new), end_new)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+    changed = out["summary"][out["summary"]["status"] != "不變"]
+    st.caption(f"{len(out['changes']):,} 個 (日, 列) 變動，{len(changed)} 列受影響｜含稅 {out['totals']['grand_total']:,}")
+    if len(changed):
+        st.dataframe(changed, hide_index=True, use_container_width=True)
+        st.download_button("📥 下載逐日差異 (.csv)", data=lambda: out["changes"].to_csv(index=False).encode("utf-8-sig"),
+                           file_name=f"Replan_{inputs['client']}_{quote_id}.csv", mime="text/csv", key="rp_diff")
+
+with st.expander("🗂️ 搜尋 / 重新開啟報價", expanded=False):
+    history_section()
+
+# 圖表 (altair) 首次匯入約需半秒，開啟時才載入
+@st.fragment
+def stats_section():
+    if not st.toggle("開啟報價統計", key="stats_on"):
+        return
+    spend = quote_history.monthly_spend()
+    if spend.empty:
+        st.info("尚無報價紀錄")
+    else:
+        st.bar_chart(spend)
+        st.dataframe(quote_history.monthly_summary(), hide_index=True, use_container_width=True)
+
+with st.expander("📊 報價統計 (各媒體每月預算、平均牌價折扣率)", expanded=False):
+    stats_section()
+
+# --- 效能計時結果 (填回 "系統運算邏輯說明") ---
+with perf_slot.container():
+    stage_secs = sum(sec for _, _, sec in perf_run.stages)
+    total_secs = perf_run.total()
+    xlsx_bytes_done = get_export(cache_key)[0]
+    st.dataframe(perf_run.rows() or [{"階段": "全部命中快取", "耗時 (ms)": 0.0}], hide_index=True, use_container_width=True)
+    st.caption(f"本次 rerun 腳本總耗時 {total_secs * 1000:.1f} ms，其中引擎 / 預覽 {stage_secs * 1000:.1f} ms，"
+               f"其餘為 Streamlit 元件與快取查詢"
+               + (f"；Excel {len(xlsx_bytes_done):,} bytes" if xlsx_bytes_done else ""))
+    if profiler is not None:
+        prof_stats, prof_text = metrics.stop_profile(profiler)
+        st.download_button("📥 下載 cProfile 統計 (.prof)", prof_stats, file_name="cue_rerun.prof", mime="application/octet-stream")
+        st.code(prof_text)
@@ -0,0 +1,178 @@
+"""
+批次產生 Cue 表
+
+    python batch.py briefs.xlsx --out cue_sheets/
+    python batch.py briefs.csv --zip cue_sheets.zip --workers 8
+    python batch.py briefs.csv --portfolio portfolio.xlsx     (全部案子寫成一本，含彙總表)
+
+Brief 表欄位 (一列一個案子):
+    client, budget, start_date, end_date (或 days)
+    fm_share, fm_regions, fm_secs       全家廣播
+    fv_share, fv_regions, fv_secs       新鮮視
+    cf_share, cf_secs                   家樂福
+    regions: "全省" 或 "北區,桃竹苗"；secs: "20" 或 "10:40,20:60" (秒數:佔比%)
+    flighting, blackout, skip_holidays  檔次分配 (選填，見 flighting.py):
+        flighting: 平均分配 / 週末加重 / 上檔衝刺 / weekday:1,1,1,1,1,2,2 / burst:3:7
+        blackout: "2025-02-01,2025-02-02"；skip_holidays: 1 / true 避開國定假日
+"""
+import os
+import re
+import sys
+import time
+import zipfile
+import argparse
+import tempfile
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import ratecard
+import flighting
+from engine import plan, plan_many, brief_to_config, brief_days, product_string, summarize
+from excel_export import write_excel, write_portfolio
+
+SUMMARY_COLUMNS = ["client", "budget", "start_date", "end_date", "days", "total_spots", "total_list",
+                   "grand_total", "discount_ratio", "under_target_lines", "pricing_version", "file"]
+
+# worker 使用的價目表: 由主 process 傳入，整批報價同一版本
+_card = None
+
+def _init_worker(card):
+    global _card
+    _card = card
+
+def read_briefs(path):
+    """ 讀取 brief 表 (.xlsx / .xls 用 openpyxl，其餘視為 CSV) """
+    if path.lower().endswith((".xlsx", ".xlsm", ".xls")):
+        briefs = pd.read_excel(path, engine="openpyxl")
+    else:
+        briefs = pd.read_csv(path)
+    briefs.columns = [str(c).strip() for c in briefs.columns]
+    if "client" not in briefs:
+        briefs["client"] = [f"brief{i + 1}" for i in range(len(briefs))]
+    briefs["client"] = briefs["client"].fillna("").astype(str)
+    briefs["start_date"] = pd.to_datetime(briefs["start_date"]).dt.date
+    briefs["days"] = brief_days(briefs)
+    briefs["end_date"] = [s + timedelta(days=int(d) - 1) for s, d in zip(briefs["start_date"], briefs["days"])]
+    return briefs
+
+def sheet_filename(client, used):
+    """ CueSheet_<client>.xlsx，去除檔名不合法字元；同名客戶加序號 """
+    safe = re.sub(r'[\\/:*?"<>|\s]+', "_", client).strip("_") or "client"
+    name = f"CueSheet_{safe}.xlsx"
+    n = 2
+    while name in used:
+        name = f"CueSheet_{safe}_{n}.xlsx"
+        n += 1
+    used.add(name)
+    return name
+
+def export_brief(job):
+    """ worker: 計算單一 brief 並以 constant_memory 模式寫出 xlsx，回傳 (檔名, 耗時秒數) """
+    brief, path = job
+    t0 = time.perf_counter()
+    days = int(brief["days"])
+    result = plan(brief_to_config(brief), brief["budget"], days, _card)
+    rows = flighting.apply_flighting(result["rows"], brief["start_date"], flighting.brief_spec(brief))
+    totals = summarize(brief["budget"], result["total_list"])
+    write_excel(path, rows, days, brief["start_date"], brief["client"], product_string(result["secs"]),
+                result["total_list"], totals["grand_total"], brief["budget"], totals["prod_cost"])
+    return os.path.basename(path), time.perf_counter() - t0
+
+def run_batch(briefs, out_dir, workers=None):
+    """ 向量化算出摘要後，用 process pool 平行輸出每張 Cue 表；回傳 (摘要 DataFrame, worker 累計秒數) """
+    card = ratecard.current()
+    _init_worker(card)
+    _, summary = plan_many(briefs, card=card)
+    used = set()
+    files = [sheet_filename(c, used) for c in briefs["client"]]
+    summary["start_date"] = briefs["start_date"].to_numpy()
+    summary["end_date"] = briefs["end_date"].to_numpy()
+    summary["file"] = files
+
+    jobs = [(b, os.path.join(out_dir, f)) for b, f in zip(briefs.to_dict("records"), files)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        timings = [export_brief(job)[1] for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(card,)) as pool:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            timings = [t for _, t in pool.map(export_brief, jobs, chunksize=chunksize)]
+    return summary[SUMMARY_COLUMNS], sum(timings)
+
+def run_portfolio(briefs, path, progress=None):
+    """ 全部 brief 寫成一本 workbook (彙總表 + 每案一張)，單一 process 串流寫出；回傳摘要 DataFrame """
+    card = ratecard.current()
+    _, summary = plan_many(briefs, card=card)
+    campaigns = []
+    for b in briefs.to_dict("records"):
+        days = int(b["days"])
+        result = plan(brief_to_config(b), b["budget"], days, card)
+        result = dict(result, rows=flighting.apply_flighting(result["rows"], b["start_date"], flighting.brief_spec(b)))
+        campaigns.append({"name": b["client"], "client": b["client"], "start_date": b["start_date"], "days": days,
+                          "products": product_string(result["secs"]), "result": result, "budget": b["budget"],
+                          "prod": summarize(b["budget"], result["total_list"])["prod_cost"]})
+    write_portfolio(path, campaigns, progress=progress)
+    summary["start_date"] = briefs["start_date"].to_numpy()
+    summary["end_date"] = briefs["end_date"].to_numpy()
+    summary["file"] = os.path.basename(path)
+    return summary[SUMMARY_COLUMNS]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批次產生 Cue 表 (xlsx) 與摘要 CSV")
+    parser.add_argument("briefs", help="brief 表 (.xlsx 或 .csv)")
+    parser.add_argument("--out", default="cue_sheets", help="輸出資料夾 (預設 cue_sheets/)")
+    parser.add_argument("--zip", help="改為輸出單一 zip 檔")
+    parser.add_argument("--portfolio", help="改為輸出單一 xlsx (第一張為組合彙總，之後每案一張)")
+    parser.add_argument("--summary", help="摘要 CSV 路徑 (預設 <out>/summary.csv)")
+    parser.add_argument("--workers", type=int, default=None, help="process 數 (預設 CPU 核心數)")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    briefs = read_briefs(args.briefs)
+    try:
+        plan_many(briefs)
+        for b in briefs.to_dict("records"):   # 分配策略格式 / 全部停播先檢查，不要到 worker 才失敗
+            spec = flighting.brief_spec(b)
+            if spec:
+                flighting.day_weights(spec, flighting.calendar_index(b["start_date"], int(b["days"])))
+    except ValueError as e:   # 含 ratecard.UnpricedError
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    if args.portfolio:
+        summary = run_portfolio(briefs, args.portfolio)
+        worker_secs = time.perf_counter() - t0
+        summary_path = args.summary or os.path.splitext(args.portfolio)[0] + "_summary.csv"
+        summary.to_csv(summary_path, index=False, encoding="utf-8-sig")
+        target = args.portfolio
+    elif args.zip:
+        with tempfile.TemporaryDirectory() as tmp:
+            summary, worker_secs = run_batch(briefs, tmp, args.workers)
+            summary_path = args.summary or os.path.join(tmp, "summary.csv")
+            summary.to_csv(summary_path, index=False, encoding="utf-8-sig")
+            # xlsx 本身已壓縮，zip 內直接存放
+            with zipfile.ZipFile(args.zip, "w", zipfile.ZIP_STORED) as zf:
+                for name in summary["file"]:
+                    zf.write(os.path.join(tmp, name), name)
+                if not args.summary:
+                    zf.write(summary_path, "summary.csv")
+        target = args.zip
+    else:
+        os.makedirs(args.out, exist_ok=True)
+        summary, worker_secs = run_batch(briefs, args.out, args.workers)
+        summary_path = args.summary or os.path.join(args.out, "summary.csv")
+        summary.to_csv(summary_path, index=False, encoding="utf-8-sig")
+        target = args.out
+
+    elapsed = time.perf_counter() - t0
+    n = len(briefs)
+    print(f"✅ {n} 張 Cue 表 -> {target}")
+    print(f"   耗時 {elapsed:.2f}s, {n / elapsed if elapsed > 0 else 0:.1f} 張/秒"
+          f" (每張平均 {worker_secs / n * 1000 if n else 0:.1f} ms"
+          + (")" if args.portfolio else f", {args.workers or os.cpu_count()} workers)"))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+效能基準測試 (不經過 Streamlit)
+
+    python bench.py --out bench.json                       # 跑完整組合並存成 JSON
+    python bench.py --quick --filter 365d                   # 只跑部分案例、較少重複
+    python bench.py --out new.json --compare bench.json     # 與基準比較，退步超過門檻時 exit 1
+    python bench.py --startup --out startup.json            # app 冷啟動 / rerun 耗時 (AppTest，獨立 process)
+
+案例組合: 走期天數 × 媒體組合 (各媒體單獨、全省 / 多區、三媒體全開) × 秒數數量
+每個案例量測 engine (plan)、schedule (calculate_schedule)、html (generate_html_preview)、
+excel (generate_excel)、playlist (build_playlist) 的耗時 (多次重複取中位數) 與峰值記憶體 (tracemalloc)
+--startup: 每輪開一個新 process 以 AppTest 執行 app.py，量測 streamlit 匯入、首次執行 (含 app 模組匯入) 與 rerun
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import argparse
+import platform
+import statistics
+import tracemalloc
+from datetime import date
+
+import numpy as np
+import xlsxwriter
+
+import ratecard
+from engine import plan, calculate_schedule, product_string, summarize
+from render import generate_html_preview
+from excel_export import generate_excel
+from playlist import build_playlist
+
+DAYS = [1, 31, 90, 365]
+SECS = {1: [20], 2: [10, 20], 3: [10, 15, 20]}
+START = date(2025, 1, 1)
+BUDGET = 1000000
+
+def _media_cfg(m_type, secs, national, share):
+    sec_shares = {s: 100 // len(secs) for s in secs}
+    sec_shares[secs[-1]] += 100 - sum(sec_shares.values())
+    cfg = {"seconds": secs, "share": share, "sec_shares": sec_shares}
+    if m_type == "家樂福":
+        cfg["regions"] = ["全省"]
+    else:
+        cfg["is_national"] = national
+        cfg["regions"] = ["全省"] if national else ["北區", "桃竹苗", "中區"]
+    return cfg
+
+# 媒體組合: 名稱 -> [(媒體, 全省聯播, 佔比)]
+COMBOS = {
+    "fm-nat": [("全家廣播", True, 100)],
+    "fm-3reg": [("全家廣播", False, 100)],
+    "fv-nat": [("新鮮視", True, 100)],
+    "fv-3reg": [("新鮮視", False, 100)],
+    "cf": [("家樂福", True, 100)],
+    "all-nat": [("全家廣播", True, 60), ("新鮮視", True, 25), ("家樂福", True, 15)],
+    "all-3reg": [("全家廣播", False, 60), ("新鮮視", False, 25), ("家樂福", True, 15)],
+}
+
+def cases(filter_text=None):
+    """ [(案例名稱, config_media, days)] """
+    out = []
+    for days in DAYS:
+        for combo, media in COMBOS.items():
+            for n_secs, secs in SECS.items():
+                name = f"{combo}/{n_secs}sec/{days}d"
+                if filter_text and filter_text not in name:
+                    continue
+                config = {m: _media_cfg(m, secs, nat, share) for m, nat, share in media}
+                out.append((name, config, days))
+    return out
+
+def _stage_calls(config, days):
+    """ 每個階段一個無參數函式 (html / excel 使用預先算好的 plan 結果) """
+    result = plan(config, BUDGET, days)
+    totals = summarize(BUDGET, result["total_list"])
+    products = product_string(result["secs"])
+    spots = [log["spots"] for log in result["logs"]]
+    args = (result["rows"], days, START, "Bench", products, result["total_list"], totals["grand_total"], BUDGET, totals["prod_cost"])
+    return {
+        "engine": lambda: plan(config, BUDGET, days),
+        "schedule": lambda: [calculate_schedule(s, days).to_list() for s in spots],
+        "html": lambda: generate_html_preview(*args),
+        "excel": lambda: generate_excel(*args).getvalue(),
+        "playlist": lambda: build_playlist(result["rows"]),
+    }, len(result["rows"])
+
+def _time(fn, repeat, min_time):
+    """ 每輪自動決定呼叫次數 (總長至少 min_time 秒)，回傳每輪的單次平均秒數 """
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if dt <= 0 else max(2, min(10, int(min_time / dt) + 1))
+    samples = [dt / loops]
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - t0) / loops)
+    return samples
+
+def _peak(fn):
+    """ 單次呼叫的 tracemalloc 峰值 (KiB) """
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+def run(filter_text=None, stages=None, repeat=5, min_time=0.05, progress=None):
+    results = []
+    todo = cases(filter_text)
+    for i, (name, config, days) in enumerate(todo):
+        calls, n_rows = _stage_calls(config, days)
+        for stage_name, fn in calls.items():
+            if stages and stage_name not in stages:
+                continue
+            fn()   # warm-up
+            samples = _time(fn, repeat, min_time)
+            results.append({
+                "case": name, "stage": stage_name, "days": days, "rows": n_rows,
+                "median_s": statistics.median(samples), "min_s": min(samples),
+                "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+                "peak_kib": round(_peak(fn), 1),
+            })
+        if progress:
+            progress(i + 1, len(todo), name)
+    return results
+
+# 子 process: 印出 JSON {import_s, first_run_s, rerun_s: [...], errors: [...]}
+_STARTUP_SCRIPT = """
+import sys, json, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=300)
+at.run()
+t2 = time.perf_counter()
+reruns = []
+for _ in range(int(sys.argv[2])):
+    t = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - t)
+print(json.dumps({"import_s": t1 - t0, "first_run_s": t2 - t1, "rerun_s": reruns, "errors": [str(e.value) for e in at.exception]}))
+"""
+
+def startup(repeat=5, reruns=5, progress=None):
+    """
+    app 冷啟動: 每輪一個新 process (模組未載入)，回傳與 run() 相同格式的結果
+    stage: st_import (streamlit)、first_run (首次執行，含 app 模組匯入與計算)、rerun (相同輸入再跑，吃快取)
+    庫存帳 / 報價歷史寫到暫存資料夾
+    """
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    samples = {"st_import": [], "first_run": [], "rerun": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, CUE_LEDGER=os.path.join(tmp, "ledger.sqlite3"), CUE_HISTORY=os.path.join(tmp, "history.sqlite3"))
+        for i in range(repeat):
+            out = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT, app_path, str(reruns)], env=env,
+                                 capture_output=True, text=True, check=True)
+            doc = json.loads(out.stdout.strip().splitlines()[-1])
+            if doc["errors"]:
+                raise RuntimeError(f"app.py 執行失敗: {doc['errors'][0]}")
+            samples["st_import"].append(doc["import_s"])
+            samples["first_run"].append(doc["first_run_s"])
+            samples["rerun"].append(statistics.median(doc["rerun_s"]))
+            if progress:
+                progress(i + 1, repeat, "app/startup")
+    return [{"case": "app/startup", "stage": stage_name, "days": None, "rows": None,
+             "median_s": statistics.median(v), "min_s": min(v),
+             "stdev_s": statistics.stdev(v) if len(v) > 1 else 0.0, "peak_kib": 0.0}
+            for stage_name, v in samples.items()]
+
+def meta():
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "xlsxwriter": xlsxwriter.__version__,
+        "pricing_version": ratecard.current().version,
+    }
+
+def compare(current, baseline, threshold=0.2, floor_s=5e-5):
+    """
+    與基準比較中位數: 變慢超過 threshold (比例) 且差距超過 floor_s 秒視為退步
+    回傳 [(case, stage, 基準秒數, 目前秒數, 比例, 是否退步)]
+    """
+    base = {(r["case"], r["stage"]): r for r in baseline}
+    rows = []
+    for r in current:
+        b = base.get((r["case"], r["stage"]))
+        if b is None:
+            continue
+        ratio = r["median_s"] / b["median_s"] if b["median_s"] > 0 else float("inf")
+        regressed = ratio > 1 + threshold and r["median_s"] - b["median_s"] > floor_s
+        rows.append((r["case"], r["stage"], b["median_s"], r["median_s"], ratio, regressed))
+    return rows
+
+def _fmt(sec):
+    return f"{sec * 1000:9.3f} ms"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cue 表效能基準測試")
+    parser.add_argument("--out", help="結果 JSON 路徑")
+    parser.add_argument("--compare", help="基準 JSON，退步時 exit 1")
+    parser.add_argument("--threshold", type=float, default=0.2, help="退步門檻比例 (預設 0.2 = 慢 20%%)")
+    parser.add_argument("--filter", help="只跑名稱含此字串的案例，例如 365d 或 all-nat")
+    parser.add_argument("--stages", help="只跑指定階段，逗號分隔: engine,schedule,html,excel,playlist")
+    parser.add_argument("--repeat", type=int, default=5, help="重複輪數 (預設 5)")
+    parser.add_argument("--min-time", type=float, default=0.05, help="每輪最少秒數 (預設 0.05)")
+    parser.add_argument("--quick", action="store_true", help="快速模式: 3 輪、每輪 0.01 秒")
+    parser.add_argument("--startup", action="store_true", help="改為量測 app 冷啟動與 rerun (每輪一個新 process)")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.repeat, args.min_time = 3, 0.01
+    stages = set(args.stages.split(",")) if args.stages else None
+
+    def progress(i, n, name):
+        print(f"\r  [{i}/{n}] {name:<24}", end="", file=sys.stderr, flush=True)
+
+    if args.startup:
+        results = startup(args.repeat, progress=progress)
+    else:
+        results = run(args.filter, stages, args.repeat, args.min_time, progress)
+    print(file=sys.stderr)
+    doc = {"meta": meta(), "results": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=1)
+
+    for r in results:
+        print(f"{r['case']:<22} {r['stage']:<9} {_fmt(r['median_s'])}  ±{r['stdev_s'] * 1000:7.3f}  {r['peak_kib']:9.1f} KiB")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, args.threshold)
+        regressions = [r for r in rows if r[5]]
+        print(f"\n與 {args.compare} 比較 ({len(rows)} 項，門檻 +{args.threshold:.0%}):")
+        for case, stage_name, b, c, ratio, bad in sorted(rows, key=lambda r: -r[4])[:15]:
+            print(f"{'❌' if bad else '  '} {case:<22} {stage_name:<9} {_fmt(b)} -> {_fmt(c)}  x{ratio:.2f}")
+        if regressions:
+            print(f"❌ {len(regressions)} 項退步")
+            return 1
+        print("✅ 無退步")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
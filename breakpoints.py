@@ -0,0 +1,293 @@
+"""
+預算斷點索引: 明細線 (媒體, 區域組合, 秒數) 的檔次 / x1.1 / 牌價只在少數預算斷點改變
+
+    python breakpoints.py --verify                       # 全部組合逐一與 plan_media 比對
+    python breakpoints.py --edges 全家廣播 全省 20 --high 600000
+
+同一價目表版本只建一次 (價目表更新後自動重建)；查詢為每個組合一次 searchsorted
+"""
+import sys
+import time
+import argparse
+import itertools
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import ratecard
+from engine import REGIONS_ORDER, line_constants, line_spots, plan_media
+
+# ==========================================
+# 斷點
+# ==========================================
+# 明細線預算 b 的結果 (與 plan_media 相同的浮點運算):
+#   b <= P          未達標: 檔次 = ceil(b / (net × 1.1)) 進位成偶數
+#   b >  P          達標:   檔次 = ceil(b / net) 進位成偶數
+#   P = ceil(b / net) <= Std_Spots - 1 的最大 b (x1.1 門檻)
+# 每一段內檔次固定，段落右端點 = ceil(b / unit) <= 2j 的最大浮點數 b (以 nextafter 修正到逐位元精確)
+# 表格只建到 TABLE_STD_MULTIPLE × Std_Spots 檔；再往上只剩規律的偶數進位 (每 2 × net 一階)，
+# 超出表格的預算改用 line_spots 直接計算
+
+TABLE_STD_MULTIPLE = 2
+EDGE_COLUMNS = ["budget_to", "spots", "under_target", "unit_cost"]
+
+# 查詢用的陣列 (依組合編號索引)；補建組合時整組換掉，查詢端讀一次 self.arrays 即得一致的快照
+Arrays = namedtuple("Arrays", ["net_unit", "std", "nat_rate", "list_rate", "rows", "super_ratio",
+                               "penalty", "n_low", "offsets", "edges", "spots"])
+
+def _edge(unit, n):
+    """ ceil(b / unit) <= n 的最大浮點數 b (unit, n 可為陣列) """
+    unit = np.asarray(unit, dtype=float)
+    n = np.asarray(n, dtype=float)
+    e = n * unit
+    while True:
+        over = np.ceil(e / unit) > n
+        if not over.any():
+            break
+        e = np.where(over, np.nextafter(e, -np.inf), e)
+    while True:
+        nxt = np.nextafter(e, np.inf)
+        ok = np.ceil(nxt / unit) <= n
+        if not ok.any():
+            break
+        e = np.where(ok, nxt, e)
+    return e
+
+def _segments(net_unit, std):
+    """ 單一組合的 (右端點, 檔次, 未達標段數, x1.1 門檻)；最後一段為表格上限 """
+    if net_unit <= 0:   # 未選區域: plan() 略過此明細線
+        return np.zeros(0), np.zeros(0, dtype=np.int64), 0, 0.0
+    top = max(int(std) * TABLE_STD_MULTIPLE, 2)
+    penalty = float(_edge(net_unit, std - 1)) if std > 1 else 0.0
+    under_unit = net_unit * 1.1
+    # 未達標段: 右端點小於 P 的偶數階，最後一段截在 P
+    j = np.arange(1, top // 2 + 1)
+    low = _edge(under_unit, 2 * j)
+    n_low = int(np.searchsorted(low, penalty, side="left")) + 1 if penalty > 0 else 0
+    low_edges = np.append(low[:n_low - 1], penalty) if n_low else low[:0]
+    low_spots = 2 * j[:n_low]
+    # 達標段: 第一個右端點超過 P 的偶數階起，到表格上限
+    high = _edge(net_unit, 2 * j)
+    keep = high > penalty
+    return (np.concatenate([low_edges, high[keep]]), np.concatenate([low_spots, 2 * j[keep]]).astype(np.int64),
+            n_low, penalty)
+
+def _combos(card):
+    """ 價目表上所有 (媒體, 全省聯播, 區域組合, 秒數)；區域組合依 REGIONS_ORDER 排列 """
+    for m_type in ("全家廣播", "新鮮視"):
+        subsets = [(True, ("全省",))] + [(False, regs) for n in range(1, len(REGIONS_ORDER) + 1)
+                                        for regs in itertools.combinations(REGIONS_ORDER, n)]
+        for sec in card.priced_seconds(m_type):
+            for is_nat, regions in subsets:
+                yield (m_type, is_nat, regions, sec)
+    for sec in card.priced_seconds("家樂福"):
+        yield ("家樂福", True, ("全省",), sec)
+
+class BreakpointIndex:
+    """
+    單一價目表版本的斷點表
+    各組合的斷點串接成一個陣列 (offsets 為各組合的起點)，常數 (net_unit / std / 牌價 ...) 依組合編號索引
+    查詢不加鎖: 補建組合時先建好新的 Arrays 再一次換上，之後才登記組合編號
+    """
+
+    def __init__(self, card):
+        self.card = card
+        self.version = card.version
+        self.consts = []     # (media, net_unit, std, nat_rate, list_rate, rows, super_ratio)
+        self.tables = []     # (edges, spots, n_low, penalty)
+        self.lock = threading.Lock()
+        self.ids = {}
+        for key in _combos(card):
+            try:
+                self.ids[key] = self._add(key)
+            except ratecard.UnpricedError:
+                continue
+        self.arrays = self._pack()
+
+    def _add(self, key):
+        """ 計算並附加一個組合，回傳其編號 (尚未換上 arrays / 登記 ids) """
+        m_type, is_nat, regions, sec = key
+        consts = (m_type,) + line_constants(m_type, is_nat, list(regions), sec, self.card)
+        self.tables.append(_segments(consts[1], consts[2]))
+        self.consts.append(consts)
+        return len(self.consts) - 1
+
+    def _pack(self):
+        cols = list(zip(*self.consts))
+        sizes = [len(t[0]) for t in self.tables]
+        return Arrays(
+            net_unit=np.array(cols[1], dtype=float),
+            std=np.array(cols[2], dtype=float),
+            nat_rate=np.array(cols[3], dtype=float),
+            list_rate=np.array(cols[4], dtype=np.int64),
+            rows=np.array(cols[5], dtype=np.int64),
+            super_ratio=np.array(cols[6], dtype=float),
+            penalty=np.array([t[3] for t in self.tables]),
+            n_low=np.array([t[2] for t in self.tables], dtype=np.int64),
+            offsets=np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+            edges=np.concatenate([t[0] for t in self.tables]),
+            spots=np.concatenate([t[1] for t in self.tables]),
+        )
+
+    def key_id(self, m_type, is_national, regions, sec):
+        """
+        組合編號；區域順序與 REGIONS_ORDER 不同時 (net_unit 加總順序不同，浮點結果可能差一位)
+        第一次查詢時補建該組合
+        """
+        key = (m_type, True, ("全省",), sec) if m_type == "家樂福" or is_national else (m_type, False, tuple(regions), sec)
+        cid = self.ids.get(key)
+        if cid is None:
+            with self.lock:
+                cid = self.ids.get(key)
+                if cid is None:
+                    cid = self._add(key)
+                    self.arrays = self._pack()
+                    self.ids[key] = cid   # 換上新陣列之後才讓其他 thread 查到此編號
+        return cid
+
+    def penalty_budget(self, cid):
+        """ 明細線預算 <= 此值時觸發 x1.1 """
+        return float(self.arrays.penalty[cid])
+
+    def table(self, cid):
+        """ 該組合的斷點表: 每段的右端點預算、檔次、是否未達標、單位成本 """
+        a = self.arrays
+        lo, hi = a.offsets[cid], a.offsets[cid + 1]
+        under = np.arange(hi - lo) < a.n_low[cid]
+        return pd.DataFrame({
+            "budget_to": a.edges[lo:hi], "spots": a.spots[lo:hi], "under_target": under,
+            "unit_cost": np.where(under, a.net_unit[cid] * 1.1, a.net_unit[cid]),
+        }, columns=EDGE_COLUMNS)
+
+    def lookup(self, cids, budgets):
+        """
+        明細線查詢 (cids 與 budgets 等長)，結果與 plan_media / plan_many 相同
+        回傳 dict: spots, under_target, unit_cost, list_value, super_spots, rows
+        (預算 <= 0 或未選區域的線與 plan() 一樣略過，檔次為 0)
+        """
+        a = self.arrays
+        cids = np.asarray(cids, dtype=np.int64)
+        budgets = np.asarray(budgets, dtype=float)
+        spots = np.zeros(len(budgets), dtype=np.int64)
+        seg = np.zeros(len(budgets), dtype=np.int64)
+        valid = (budgets > 0) & (a.net_unit[cids] > 0)
+        order = np.flatnonzero(valid)
+        order = order[np.argsort(cids[order], kind="stable")]
+        bounds = np.flatnonzero(np.diff(cids[order])) + 1
+        for idx in np.split(order, bounds):
+            if not len(idx):
+                continue
+            c = cids[idx[0]]
+            lo, hi = a.offsets[c], a.offsets[c + 1]
+            seg[idx] = np.searchsorted(a.edges[lo:hi], budgets[idx], side="left")
+            inside = seg[idx] < hi - lo
+            spots[idx[inside]] = a.spots[lo + seg[idx[inside]]]
+            # 超出表格: 已在達標區，直接計算
+            out = idx[~inside]
+            if len(out):
+                spots[out] = line_spots(budgets[out], a.net_unit[c], a.std[c])[0]
+        under = valid & (seg < a.n_low[cids])
+        list_value = np.where(a.nat_rate[cids] > 0, np.floor(a.nat_rate[cids] * spots),
+                              a.list_rate[cids] * spots).astype(np.int64)
+        return {
+            "spots": spots, "under_target": under,
+            "unit_cost": a.net_unit[cids] * np.where(under, 1.1, 1.0),
+            "list_value": list_value, "super_spots": (spots * a.super_ratio[cids]).astype(np.int64),
+            "rows": a.rows[cids],
+        }
+
+    def quote(self, m_type, is_national, regions, sec, line_budget):
+        """ 單一明細線: (檔次, 是否未達標, 牌價) """
+        out = self.lookup([self.key_id(m_type, is_national, regions, sec)], [line_budget])
+        return int(out["spots"][0]), bool(out["under_target"][0]), int(out["list_value"][0])
+
+@lru_cache(maxsize=2)
+def _build(card):
+    return BreakpointIndex(card)
+
+def index(card=None):
+    """ 目前價目表的斷點索引 (同一版本共用，價目表更新後重建) """
+    return _build(card or ratecard.current())
+
+# ==========================================
+# 驗證: 每個組合的每個斷點與其右側一個浮點數，逐一與 plan_media 比對
+# ==========================================
+
+def _reference(key, budget, card):
+    """ plan_media 的結果 (整個預算給單一明細線): (檔次, 是否未達標, 牌價, 超市檔次) """
+    m_type, is_nat, regions, sec = key
+    cfg = {"is_national": is_nat, "regions": list(regions), "seconds": [sec], "share": 100, "sec_shares": {sec: 100}}
+    part = plan_media(m_type, cfg, budget, 1, card)
+    log = part["logs"][0]
+    super_spots = part["rows"][1].spots if m_type == "家樂福" else 0
+    return log["spots"], log["status"] == "未達標", part["total_list"], super_spots
+
+def verify(card=None, beyond=8, progress=None, keys=None):
+    """
+    回傳不一致的 [(組合, 預算, 索引結果, plan_media 結果)]
+    每個組合檢查: 全部斷點、斷點右側一個浮點數、表格上限之後 beyond 個點
+    keys: 只檢查這些 (媒體, 全省聯播, 區域組合, 秒數) (預設為價目表上全部組合；區域順序不同的會補建)
+    """
+    card = card or ratecard.current()
+    idx = BreakpointIndex(card)
+    bad = []
+    keys = list(idx.ids) if keys is None else list(keys)
+    for n, key in enumerate(keys, start=1):
+        cid = idx.key_id(*key)
+        a = idx.arrays
+        edges = a.edges[a.offsets[cid]:a.offsets[cid + 1]]
+        extra = edges[-1] + a.net_unit[cid] * np.linspace(0.5, 50, beyond)
+        budgets = np.concatenate([edges, np.nextafter(edges, np.inf), extra])
+        got = idx.lookup(np.full(len(budgets), cid), budgets)
+        for i, b in enumerate(budgets.tolist()):
+            ours = (int(got["spots"][i]), bool(got["under_target"][i]), int(got["list_value"][i]), int(got["super_spots"][i]))
+            ref = _reference(key, b, card)
+            if ours != tuple(ref):
+                bad.append((key, b, ours, ref))
+        if progress:
+            progress(n, len(keys))
+    return bad
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="預算斷點索引: 驗證 / 列出斷點")
+    parser.add_argument("--verify", action="store_true", help="全部組合的每個斷點與 plan_media 比對")
+    parser.add_argument("--edges", nargs=3, metavar=("MEDIA", "REGIONS", "SEC"), help="列出斷點 (REGIONS: 全省 或 北區,中區)")
+    parser.add_argument("--high", type=float, help="只列出預算不超過此值的斷點")
+    args = parser.parse_args(argv)
+
+    card = ratecard.current()
+    t0 = time.perf_counter()
+    idx = index(card)
+    print(f"價目表 {idx.version}: {len(idx.ids):,} 個組合, {len(idx.arrays.edges):,} 個斷點, 建立 {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    if args.edges:
+        m_type, regions, sec = args.edges
+        regions = [r.strip() for r in regions.split(",") if r.strip()]
+        try:
+            cid = idx.key_id(m_type, regions == ["全省"], regions, int(sec))
+        except (KeyError, ValueError) as e:   # 含 UnpricedError
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+        table = idx.table(cid)
+        if args.high:
+            table = table[table["budget_to"] <= args.high]
+        print(f"x1.1 門檻: 明細線預算 <= {idx.penalty_budget(cid):,.2f}")
+        print(table.to_string(index=False))
+
+    if args.verify:
+        t0 = time.perf_counter()
+        bad = verify(card, progress=lambda n, total: print(f"\r   {n}/{total}", end="", file=sys.stderr))
+        print(file=sys.stderr)
+        if bad:
+            for key, b, ours, ref in bad[:20]:
+                print(f"❌ {key} 預算 {b!r}: 索引 {ours} / plan_media {ref}")
+            print(f"❌ {len(bad):,} 個不一致")
+            return 1
+        print(f"✅ 全部一致 ({time.perf_counter() - t0:.1f}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
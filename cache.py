@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import ratecard
+import metrics
+
+# ==========================================
+# 計算結果快取 (跨 rerun / 跨 session 共用)
+# ==========================================
+# Streamlit 每次 rerun 只重新執行 app.py，已 import 的模組會保留，
+# 因此模組層級的 RESULT_CACHE 由同一個 server 上所有使用者共用。
+
+def digest(payload):
+    """ 任意可 JSON 化的輸入正規化後取 SHA-256 (dict 欄位順序不影響結果) """
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def plan_key(config_media, budget, start_date, end_date, client_name, version=None):
+    """
+    將會影響輸出的輸入正規化後取 SHA-256，欄位順序不影響結果
+    version: 價目表版本 (預設為目前生效版本)，價目表一換舊結果自然失效
+    """
+    return digest({
+        "media": config_media,
+        "budget": budget,
+        "start": str(start_date),
+        "end": str(end_date),
+        "client": client_name,
+        "version": version or ratecard.current().version,
+    })
+
+def media_key(m_type, cfg, budget, days, version):
+    """ 單一媒體明細 (engine.plan_media) 的快取鍵: 只含它依賴的輸入，客戶名稱 / 開始日改變不影響 """
+    return digest({"media": m_type, "cfg": cfg, "budget": budget, "days": days, "version": version})
+
+_SCALAR_BYTES = 8
+_OBJECT_BYTES = 64   # 容器 / 物件本身的固定開銷
+_SCALARS = (type(None), bool, int, float)
+
+def estimate_bytes(value, _seen=None):
+    """
+    估計快取項目大小 (不序列化): bytes / str 取長度，numpy 陣列取 nbytes，DataFrame 取 memory_usage，
+    容器與物件 (dataclass / __slots__，如 CueRow、Schedule) 為各欄位加總再加固定開銷；
+    同一物件只算一次 (全省聯播各區共用的 Schedule)
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, _SCALARS):
+        return _SCALAR_BYTES
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True, deep=True)))
+    if isinstance(value, dict):
+        return _OBJECT_BYTES + _sum_bytes(value.keys(), seen) + _sum_bytes(value.values(), seen)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return _OBJECT_BYTES + _sum_bytes(value, seen)
+    slots = getattr(type(value), "__slots__", None)
+    if slots:
+        return _OBJECT_BYTES + _sum_bytes([getattr(value, s, None) for s in slots], seen)
+    if hasattr(value, "__dict__"):
+        return _OBJECT_BYTES + _sum_bytes(vars(value).values(), seen)
+    return sys.getsizeof(value)
+
+def _sum_bytes(values, seen):
+    """ 純量 / 字串就地累加，其餘遞迴 (CueRow 大多數欄位是純量) """
+    total = 0
+    for v in values:
+        if isinstance(v, _SCALARS):
+            total += _SCALAR_BYTES
+        elif isinstance(v, str):
+            total += len(v)   # 中文以字元數計，只是估計
+        else:
+            total += estimate_bytes(v, seen)
+    return total
+
+class ResultCache:
+    """
+    執行緒安全的 LRU 快取
+    同時限制筆數 (max_entries) 與總位元組數 (max_bytes)，超過即從最久未使用的開始淘汰
+    """
+
+    def __init__(self, max_bytes, max_entries):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._data = OrderedDict()   # key -> (value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, nbytes=None):
+        nbytes = estimate_bytes(value) if nbytes is None else nbytes
+        if nbytes > self.max_bytes:
+            return value   # 單筆超過上限就不快取
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, nbytes)
+            self._bytes += nbytes
+            while self._data and (self._bytes > self.max_bytes or len(self._data) > self.max_entries):
+                _, (_, freed) = self._data.popitem(last=False)
+                self._bytes -= freed
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute):
+        """ 命中直接回傳；否則在鎖外計算 (避免阻塞其他 session) 後寫入 """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+        return self.put(key, compute())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data), "bytes": self._bytes,
+                "max_entries": self.max_entries, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            }
+
+RESULT_CACHE = ResultCache(
+    max_bytes=int(os.environ.get("CUE_CACHE_MAX_MB", "256")) * 1024 * 1024,
+    max_entries=int(os.environ.get("CUE_CACHE_MAX_ENTRIES", "512")),
+)
+
+metrics.register_collector(lambda: {f"cue_cache_{k}": v for k, v in RESULT_CACHE.stats().items()})
@@ -0,0 +1,616 @@
+import math
+import time
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+import ratecard
+import metrics
+
+# ==========================================
+# 1. 基礎資料與設定 (2026 新制)
+# ==========================================
+
+REGIONS_ORDER = ["北區", "桃竹苗", "中區", "雲嘉南", "高屏", "東區"]
+DURATIONS = [5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60]
+
+# 價格 (List=定價, Net=實收價)、秒數係數、店數改由 ratecards/ratecard.json 載入 (見 ratecard.py)
+# 每次計算開頭取一次 ratecard.current()，整筆報價使用同一版本
+
+MEDIA_ORDER_MAP = {"全家廣播": 1, "新鮮視": 2, "家樂福": 3}
+PROD_COST = 10000
+
+# Brief 表欄位前綴 (與 UI widget key 相同: fm_share / fv_regions / cf_secs ...)
+MEDIA_PREFIX = {"fm": "全家廣播", "fv": "新鮮視", "cf": "家樂福"}
+
+def get_sec_factor(media_type, seconds, card=None):
+    """ 秒數係數；價目表未定價的秒數丟出 ratecard.UnpricedError """
+    return (card or ratecard.current()).factor(media_type, seconds)
+
+def priced_durations(media_type, card=None):
+    """ DURATIONS 中該媒體有定價的秒數 (UI 選單只提供這些) """
+    priced = set((card or ratecard.current()).priced_seconds(media_type))
+    return [d for d in DURATIONS if d in priced]
+
+class Schedule:
+    """
+    偶數排程的封閉形式: 前 remainder 天每天 2*(base+1) 檔，其餘每天 2*base 檔
+    只存 (base, remainder, days) 三個整數，要顯示 / 輸出時才展開成每日檔次
+    """
+    __slots__ = ("base", "remainder", "days")
+
+    def __init__(self, base, remainder, days):
+        self.base = base
+        self.remainder = remainder
+        self.days = days
+
+    def __len__(self):
+        return self.days
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.window(*_slice_bounds(idx, self.days))
+        if idx < 0: idx += self.days
+        if not 0 <= idx < self.days: raise IndexError("schedule index out of range")
+        return 2 * (self.base + 1) if idx < self.remainder else 2 * self.base
+
+    def __eq__(self, other):
+        if isinstance(other, Schedule):
+            return (self.base, self.remainder, self.days) == (other.base, other.remainder, other.days)
+        return self.to_list() == list(other)
+
+    def __repr__(self):
+        return f"Schedule(base={self.base}, remainder={self.remainder}, days={self.days})"
+
+    def __getstate__(self):
+        return (self.base, self.remainder, self.days)
+
+    def __setstate__(self, state):
+        self.base, self.remainder, self.days = state
+
+    @property
+    def total(self):
+        return 2 * (self.base * self.days + self.remainder)
+
+    def window(self, offset, length):
+        """ 第 offset 天起 length 天的每日檔次 (list) """
+        end = min(offset + length, self.days)
+        offset = max(offset, 0)
+        if end <= offset: return []
+        hi = max(min(self.remainder, end) - offset, 0)
+        return [2 * (self.base + 1)] * hi + [2 * self.base] * (end - offset - hi)
+
+    def window_total(self, offset, length):
+        """ 第 offset 天起 length 天的檔次合計 (不展開) """
+        end = min(offset + length, self.days)
+        offset = max(offset, 0)
+        if end <= offset: return 0
+        return 2 * (self.base * (end - offset) + max(min(self.remainder, end) - offset, 0))
+
+    def to_list(self):
+        return self.window(0, self.days)
+
+    def as_array(self):
+        arr = np.full(self.days, 2 * self.base, dtype=np.int64)
+        arr[:self.remainder] += 2
+        return arr
+
+def _slice_bounds(idx, days):
+    start, stop, step = idx.indices(days)
+    if step != 1: raise ValueError("schedule slices must be contiguous")
+    return start, max(stop - start, 0)
+
+def calculate_schedule(total_spots, days):
+    """
+    偶數排程演算法 (Even Distribution Strategy)
+    1. 將總檔次除以 2
+    2. 分配到每天
+    3. 結果乘以 2
+    以 (base, remainder) 封閉形式表示，不逐日迴圈
+    """
+    if days <= 0: return Schedule(0, 0, 0)
+
+    if total_spots % 2 != 0: total_spots += 1
+
+    half_spots = total_spots // 2
+    return Schedule(half_spots // days, half_spots % days, days)
+
+class DailySchedule:
+    """
+    任意每日檔次 (陣列)；容量刪減等無法以 (base, remainder) 表示的排程使用
+    介面與 Schedule 相同 (window / window_total / to_list / as_array / total)
+    """
+    __slots__ = ("counts",)
+
+    def __init__(self, counts):
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    @property
+    def days(self):
+        return len(self.counts)
+
+    def __len__(self):
+        return self.days
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.window(*_slice_bounds(idx, self.days))
+        return int(self.counts[idx])
+
+    def __eq__(self, other):
+        return self.to_list() == list(other)
+
+    def __repr__(self):
+        return f"DailySchedule(days={self.days}, total={self.total})"
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def window(self, offset, length):
+        offset = max(offset, 0)
+        return self.counts[offset:offset + max(length, 0)].tolist()
+
+    def window_total(self, offset, length):
+        offset = max(offset, 0)
+        return int(self.counts[offset:offset + max(length, 0)].sum())
+
+    def to_list(self):
+        return self.counts.tolist()
+
+    def as_array(self):
+        return self.counts.copy()
+
+def daily_totals(schedules, days):
+    """ 多條排程的每日合計 (NumPy 陣列)，Schedule 只用 base / remainder 計算 """
+    closed = [s for s in schedules if isinstance(s, Schedule)]
+    totals = np.full(max(days, 0), 2 * sum(s.base for s in closed), dtype=np.int64)
+    if days > 0 and closed:
+        # 第 i 天 remainder > i 的排程各多 2 檔
+        rem_counts = np.bincount([min(s.remainder, days) for s in closed], minlength=days + 1)
+        totals += 2 * (len(closed) - np.cumsum(rem_counts)[:days])
+    for s in schedules:
+        if not isinstance(s, Schedule):
+            totals[:min(s.days, days)] += s.counts[:days]
+    return totals
+
+@dataclass(slots=True)
+class CueRow:
+    """ Cue 表一列；全省聯播的 6 個區域列共用同一個 Schedule 物件 (刪減後為 DailySchedule) """
+    media: str
+    region: str
+    location: str
+    program: str
+    daypart: str
+    seconds: int
+    schedule: Schedule
+    spots: int
+    rate_list: object          # int，或家樂福超市列的 "計量販"
+    pkg_display_val: object
+    is_pkg_start: bool
+    is_pkg_member: bool
+
+# ==========================================
+# 2. 單一方案計算 (核心引擎 v60.5)
+# ==========================================
+
+def plan_media(m_type, cfg, total_budget_input, days_count, card=None):
+    """
+    單一媒體區塊的明細 (plan() 逐媒體呼叫後以 merge_plans 合併)
+    結果只取決於 (該媒體設定, 總預算, 天數, 價目表)，其他媒體改變時可直接沿用快取
+    回傳 dict: rows, logs, secs, total_list, media, budget (rows 尚未排序)
+    """
+    card = card or ratecard.current()
+    final_rows = []
+    all_secs = set()
+    total_list_price_accum = 0
+    debug_logs = []
+    sched_secs = 0.0
+    t_media = time.perf_counter()
+    media_budget = total_budget_input * (cfg["share"] / 100.0)
+
+    for sec, sec_share in cfg["sec_shares"].items():
+        all_secs.add(f"{sec}秒")
+        sec_budget = media_budget * (sec_share / 100.0)
+        if sec_budget <= 0: continue
+
+        factor = card.factor(m_type, sec)
+
+        log_item = {
+            "media": m_type, "sec": sec, "budget": sec_budget,
+            "status": "OK", "reason": "", "spots": 0,
+            "std": 0, "factor": factor, "unit_cost": 0
+        }
+
+        if m_type in ["全家廣播", "新鮮視"]:
+            db = card.pricing[m_type]
+            std_spots = db["Std_Spots"]
+            day_part = db["Day_Part"]
+
+            calc_regions = ["全省"] if cfg["is_national"] else cfg["regions"]
+            display_regions = REGIONS_ORDER if cfg["is_national"] else cfg["regions"]
+
+            # --- Step 1: 裡子 (Net) 算檔次 ---
+            temp_net_unit_sum = 0
+            for reg in calc_regions:
+                unit_net = card.net_unit(m_type, reg, sec) # (Net / Std) × 係數，查表
+                temp_net_unit_sum += unit_net
+
+            if temp_net_unit_sum == 0: continue
+
+            # 逆推 + 懲罰 + 偶數修正
+            initial_spots = math.ceil(sec_budget / temp_net_unit_sum)
+            is_under_target = initial_spots < std_spots
+            multiplier = 1.1 if is_under_target else 1.0
+
+            final_unit_net = temp_net_unit_sum * multiplier
+            target_spots = math.ceil(sec_budget / final_unit_net)
+            if target_spots % 2 != 0: target_spots += 1
+            if target_spots == 0: target_spots = 2
+
+            log_item["spots"] = target_spots
+            log_item["std"] = std_spots
+            log_item["unit_cost"] = final_unit_net
+            log_item["status"] = "未達標" if is_under_target else "達標"
+            log_item["reason"] = f"觸發 x1.1" if is_under_target else "費率正常"
+
+            t_sch = time.perf_counter()
+            daily_sch = calculate_schedule(target_spots, days_count)
+            sched_secs += time.perf_counter() - t_sch
+
+            # --- Step 2: 面子 (List) 填報表 ---
+            for i, reg in enumerate(display_regions):
+                rate_list_display = int(card.list_unit(m_type, reg, sec))
+                pkg_display_val = rate_list_display * target_spots
+
+                if not cfg["is_national"]:
+                    total_list_price_accum += pkg_display_val
+                elif cfg["is_national"] and reg == "北區":
+                    total_list_price_accum += int(card.list_unit(m_type, "全省", sec) * target_spots)
+
+                prog_name = card.store_counts.get(reg, reg)
+                if m_type == "新鮮視": prog_name = card.store_counts.get(f"新鮮視_{reg}", reg)
+
+                final_rows.append(CueRow(
+                    media=m_type, region=reg,
+                    location=f"{reg.replace('區', '')}區-{reg}" if m_type=="全家廣播" else f"{reg.replace('區', '')}區-{reg}",
+                    program=prog_name,
+                    daypart=day_part,
+                    seconds=sec, schedule=daily_sch, spots=target_spots,
+                    rate_list=rate_list_display,
+                    pkg_display_val=pkg_display_val,
+                    is_pkg_start=(cfg["is_national"] and reg == "北區"),
+                    is_pkg_member=cfg["is_national"]
+                ))
+
+        elif m_type == "家樂福":
+            db = card.pricing["家樂福"]
+
+            # [FIX] 使用 DB 中的基準檔次，不再寫死 420/720
+            base_std_spots = db["量販_全省"]["Std_Spots"]
+            sup_std_spots = db["超市_全省"]["Std_Spots"]
+
+            unit_net = card.net_unit("家樂福", "量販_全省", sec)
+
+            initial_spots = math.ceil(sec_budget / unit_net)
+            is_under_target = initial_spots < base_std_spots
+            multiplier = 1.1 if is_under_target else 1.0
+
+            final_unit_net = unit_net * multiplier
+            target_spots = math.ceil(sec_budget / final_unit_net)
+            if target_spots % 2 != 0: target_spots += 1
+            if target_spots == 0: target_spots = 2
+
+            log_item["spots"] = target_spots
+            log_item["std"] = base_std_spots
+            log_item["unit_cost"] = final_unit_net
+            log_item["status"] = "未達標" if is_under_target else "達標"
+            log_item["reason"] = f"觸發 x1.1" if is_under_target else "正常"
+
+            t_sch = time.perf_counter()
+            sch = calculate_schedule(target_spots, days_count)
+            sched_secs += time.perf_counter() - t_sch
+
+            # List 顯示
+            rate_list_display = int(card.list_unit("家樂福", "量販_全省", sec))
+            pkg_list_display = rate_list_display * target_spots
+
+            total_list_price_accum += pkg_list_display
+
+            final_rows.append(CueRow(
+                media="家樂福", region="全省量販", location="全省量販", program=card.store_counts["家樂福_量販"],
+                daypart=db["量販_全省"]["Day_Part"], seconds=sec, schedule=sch, spots=target_spots,
+                rate_list=rate_list_display, pkg_display_val=pkg_list_display,
+                is_pkg_start=False, is_pkg_member=False
+            ))
+
+            spots_s = int(target_spots * (sup_std_spots / base_std_spots))
+            t_sch = time.perf_counter()
+            sch_s = calculate_schedule(spots_s, days_count)
+            sched_secs += time.perf_counter() - t_sch
+            final_rows.append(CueRow(
+                media="家樂福", region="全省超市", location="全省超市", program=card.store_counts["家樂福_超市"],
+                daypart=db["超市_全省"]["Day_Part"], seconds=sec, schedule=sch_s, spots=spots_s,
+                rate_list="計量販", pkg_display_val="計量販",
+                is_pkg_start=False, is_pkg_member=False
+            ))
+
+        debug_logs.append(log_item)
+
+    metrics.record("engine", time.perf_counter() - t_media, media=m_type)
+    metrics.record("schedule", sched_secs, media=m_type)
+    return {"rows": final_rows, "logs": debug_logs, "secs": all_secs, "total_list": total_list_price_accum,
+            "media": m_type, "budget": media_budget}
+
+def merge_plans(parts, pricing_version):
+    """ 依序合併各媒體的 plan_media 結果，列依媒體順序穩定排序 (與 plan() 相同) """
+    final_rows = [r for part in parts for r in part["rows"]]
+    final_rows.sort(key=lambda x: MEDIA_ORDER_MAP.get(x.media, 99))
+    return {
+        "rows": final_rows,
+        "logs": [log for part in parts for log in part["logs"]],
+        "secs": set().union(*(part["secs"] for part in parts)),
+        "total_list": sum(part["total_list"] for part in parts),
+        "pricing_version": pricing_version,
+        # 各媒體預算 / 牌價 / 檔次 (組合報表的媒體折扣率用)
+        "by_media": {part["media"]: {"budget": part["budget"], "list": part["total_list"],
+                                     "spots": sum(r.spots for r in part["rows"])} for part in parts},
+    }
+
+def plan(config_media, total_budget_input, days_count, card=None):
+    """
+    依媒體設定計算 Cue 表明細
+    card: 使用的價目表 (預設為目前生效版本)
+    回傳 dict: rows (報表列), logs (預算分配紀錄), secs (使用秒數), total_list (牌價總額), pricing_version,
+              by_media (媒體 -> budget / list / spots)
+    """
+    card = card or ratecard.current()
+    parts = []
+    if sum(m["share"] for m in config_media.values()) > 0:
+        parts = [plan_media(m_type, cfg, total_budget_input, days_count, card) for m_type, cfg in config_media.items()]
+    return merge_plans(parts, card.version)
+
+def parse_sec_int(s):
+    return int(s.replace("秒", ""))
+
+def product_string(all_secs):
+    return "、".join(sorted(list(all_secs), key=parse_sec_int))
+
+def summarize(total_budget_input, total_list_price_accum, prod_cost=PROD_COST):
+    """ 製作費 / 稅 / 總價 / 牌價折扣率 """
+    vat = int(round((total_budget_input + prod_cost) * 0.05))
+    grand_total = total_budget_input + prod_cost + vat
+    discount_ratio_val = (total_budget_input / total_list_price_accum * 100) if total_list_price_accum > 0 else 0
+    return {"prod_cost": prod_cost, "vat": vat, "grand_total": grand_total, "discount_ratio": discount_ratio_val}
+
+def format_discount_ratio(discount_ratio_val):
+    return f"{discount_ratio_val:.1f}% (約 {discount_ratio_val/10:.1f} 折)"
+
+# ==========================================
+# 3. 批次報價 (向量化 plan_many)
+# ==========================================
+# Brief 表一列一個案子，欄位:
+#   budget, days (或 start_date + end_date), client (選填)
+#   fm_share / fv_share / cf_share      預算佔比 %
+#   fm_regions / fv_regions             "全省" 或 "北區,桃竹苗"
+#   fm_secs / fv_secs / cf_secs         "20" 或 "10:50,20:50" (秒數:佔比%)
+
+def parse_regions(text):
+    """ "全省" -> (True, ["全省"]); "北區,桃竹苗" -> (False, ["北區", "桃竹苗"]) """
+    regs = [r.strip() for r in str(text).replace("、", ",").split(",") if r.strip()]
+    if not regs or regs == ["全省"]:
+        return True, ["全省"]
+    return False, regs
+
+def parse_sec_shares(text):
+    """ "20" -> {20: 100}; "10:40,20:60" -> {10: 40, 20: 60} (依秒數排序) """
+    items = [p.strip() for p in str(text).replace("、", ",").split(",") if p.strip()]
+    if not items:
+        return {}
+    if len(items) == 1 and ":" not in items[0]:
+        return {int(float(items[0])): 100}
+    sec_shares = {}
+    for p in items:
+        sec, _, share = p.partition(":")
+        sec_shares[int(float(sec))] = float(share) if share else 0
+    return dict(sorted(sec_shares.items()))
+
+def _is_blank(v):
+    return v is None or (isinstance(v, float) and math.isnan(v)) or str(v).strip() == ""
+
+def brief_to_config(brief):
+    """ Brief 表單列 (dict / Series) -> UI 相同格式的 config_media """
+    config_media = {}
+    for prefix, m_type in MEDIA_PREFIX.items():
+        share = brief.get(f"{prefix}_share")
+        secs = brief.get(f"{prefix}_secs")
+        if _is_blank(share) or _is_blank(secs):
+            continue
+        sec_shares = parse_sec_shares(secs)
+        cfg = {"seconds": list(sec_shares), "share": float(share), "sec_shares": sec_shares}
+        if m_type == "家樂福":
+            cfg["regions"] = ["全省"]
+        else:
+            regions = brief.get(f"{prefix}_regions")
+            cfg["is_national"], cfg["regions"] = parse_regions("全省" if _is_blank(regions) else regions)
+        config_media[m_type] = cfg
+    return config_media
+
+def config_to_brief(config_media, total_budget_input, days_count):
+    """ UI 的 config_media -> brief 表單列 (brief_to_config 的反向) """
+    brief = {"budget": total_budget_input, "days": days_count}
+    for prefix, m_type in MEDIA_PREFIX.items():
+        cfg = config_media.get(m_type)
+        if not cfg or (m_type != "家樂福" and not cfg.get("is_national") and not cfg["regions"]):
+            continue   # 未選區域: plan() 也不會產生任何明細線
+        brief[f"{prefix}_share"] = cfg["share"]
+        brief[f"{prefix}_secs"] = ",".join(f"{sec}:{share}" for sec, share in cfg["sec_shares"].items())
+        if m_type != "家樂福":
+            brief[f"{prefix}_regions"] = "全省" if cfg.get("is_national") else ",".join(cfg["regions"])
+    return brief
+
+def brief_days(briefs):
+    """ 走期天數: 優先使用 days 欄，否則由 start_date / end_date 推算 """
+    if "days" in briefs:
+        return briefs["days"].fillna(0).to_numpy(dtype=np.int64)
+    start = pd.to_datetime(briefs["start_date"])
+    end = pd.to_datetime(briefs["end_date"])
+    return ((end - start).dt.days + 1).to_numpy(dtype=np.int64)
+
+def line_constants(m_type, is_national, regions, sec, card):
+    """
+    單一 (媒體, 區域組合, 秒數) 的定價常數，由價目表查表加總，順序與 plan() 相同以確保浮點結果一致
+    回傳 (net_unit, std, nat_list_rate, list_rate_int, n_rows, super_ratio)
+    """
+    if m_type == "家樂福":
+        base_std = card.std_spots("家樂福", "量販_全省")
+        net_unit = card.net_unit("家樂福", "量販_全省", sec)
+        list_rate = int(card.list_unit("家樂福", "量販_全省", sec))
+        return net_unit, base_std, 0.0, list_rate, 1, card.std_spots("家樂福", "超市_全省") / base_std
+
+    std_spots = card.std_spots(m_type)
+    calc_regions = ["全省"] if is_national else regions
+    net_unit = 0
+    for reg in calc_regions:
+        net_unit += card.net_unit(m_type, reg, sec)
+    if is_national:
+        return net_unit, std_spots, card.list_unit(m_type, "全省", sec), 0, len(REGIONS_ORDER), 0.0
+    list_rate = sum(int(card.list_unit(m_type, reg, sec)) for reg in regions)
+    return net_unit, std_spots, 0.0, list_rate, len(regions), 0.0
+
+def line_spots(sec_budget, net_unit, std):
+    """
+    向量版 逆推 + 懲罰 + 偶數修正 (與 plan() 逐筆計算結果相同)
+    回傳 (spots, under_target, final_unit_net)
+    """
+    initial_spots = np.ceil(sec_budget / net_unit)
+    under_target = initial_spots < std
+    final_unit_net = net_unit * np.where(under_target, 1.1, 1.0)
+    spots = np.ceil(sec_budget / final_unit_net).astype(np.int64)
+    spots += spots % 2
+    spots[spots == 0] = 2
+    return spots, under_target, final_unit_net
+
+def plan_many(briefs, prod_cost=PROD_COST, card=None):
+    """
+    批次報價: 一次計算整張 brief 表 (逆推檔次 + x1.1 懲罰 + 偶數修正)，全部以 NumPy 向量運算
+    結果與逐筆呼叫 plan() 相同
+    回傳 (lines, summary)
+      lines:   每個 案子 × 媒體 × 秒數 一列 (budget, unit_cost, std, spots, under_target, list_value, rows, super_spots)
+      summary: 每個案子一列 (total_spots, total_list, vat, grand_total, discount_ratio, under_target_lines, pricing_version)
+    """
+    card = card or ratecard.current()
+    briefs = briefs.reset_index(drop=True)
+    n = len(briefs)
+    budget_col = pd.to_numeric(briefs["budget"], errors="coerce").fillna(0)
+    budgets = budget_col.to_numpy(dtype=float)
+
+    # 定價常數表: 每個 (媒體, 區域組合, 秒數) 只算一次，明細線以 combo 編號索引
+    combos = {}
+    consts = []
+    line_brief, line_combo, line_budget = [], [], []
+    for prefix, m_type in MEDIA_PREFIX.items():
+        share_col, secs_col = f"{prefix}_share", f"{prefix}_secs"
+        if share_col not in briefs or secs_col not in briefs or n == 0:
+            continue
+        share = pd.to_numeric(briefs[share_col], errors="coerce").fillna(0).to_numpy(dtype=float)
+        media_budget = budgets * (share / 100.0)
+
+        secs_codes, secs_uniq = pd.factorize(briefs[secs_col].fillna("").astype(str))
+        secs_parsed = [parse_sec_shares(s) for s in secs_uniq]
+        reg_col = f"{prefix}_regions"
+        if m_type != "家樂福" and reg_col in briefs:
+            reg_codes, reg_uniq = pd.factorize(briefs[reg_col].fillna("全省").astype(str))
+            reg_parsed = [parse_regions(r) for r in reg_uniq]
+        else:
+            reg_codes, reg_parsed = np.zeros(n, dtype=np.int64), [(True, ["全省"])]
+
+        # 依 (秒數設定, 區域設定) 分組，每組一次取出所有案子
+        pair_codes, pair_uniq = pd.factorize(secs_codes * len(reg_parsed) + reg_codes)
+        order = np.argsort(pair_codes, kind="stable")
+        groups = np.split(order, np.cumsum(np.bincount(pair_codes))[:-1])
+        for pair, idx in zip(pair_uniq, groups):
+            s_code, r_code = divmod(int(pair), len(reg_parsed))
+            is_nat, regions = reg_parsed[r_code]
+            for sec, sec_share in secs_parsed[s_code].items():
+                key = (m_type, is_nat, tuple(regions), sec)
+                if key not in combos:
+                    combos[key] = len(consts)
+                    consts.append((m_type,) + line_constants(m_type, is_nat, regions, sec, card))
+                line_brief.append(idx)
+                line_combo.append(np.full(len(idx), combos[key], dtype=np.int64))
+                line_budget.append(media_budget[idx] * (sec_share / 100.0))
+
+    if line_brief:
+        brief_idx = np.concatenate(line_brief)
+        combo_idx = np.concatenate(line_combo)
+        sec_budget = np.concatenate(line_budget)
+    else:
+        brief_idx = combo_idx = np.zeros(0, dtype=np.int64)
+        sec_budget = np.zeros(0)
+    const_cols = list(zip(*consts)) if consts else [()] * 7
+    dtypes = (object, float, float, float, np.int64, np.int64, float)
+    names = ("media", "net_unit", "std", "nat_rate", "list_rate", "rows", "super_ratio")
+    table = {name: np.array(col, dtype=dt) for name, col, dt in zip(names, const_cols, dtypes)}
+    table["seconds"] = np.array([k[3] for k in combos], dtype=np.int64)
+
+    # 預算 <= 0 或區域未選 (單價為 0) 的明細線略過，與 plan() 相同
+    keep = (sec_budget > 0) & (table["net_unit"][combo_idx] != 0)
+    brief_idx, combo_idx, sec_budget = brief_idx[keep], combo_idx[keep], sec_budget[keep]
+    arr = {name: col[combo_idx] for name, col in table.items()}
+
+    net_unit = arr["net_unit"]
+    std = arr["std"]
+    spots, under_target, final_unit_net = line_spots(sec_budget, net_unit, std)
+
+    # 牌價: 全省聯播以全省牌價計一次，其餘為各區 int(牌價單價) 加總
+    list_value = np.where(arr["nat_rate"] > 0,
+                          np.floor(arr["nat_rate"] * spots),
+                          arr["list_rate"] * spots).astype(np.int64)
+    super_spots = (spots * arr["super_ratio"]).astype(np.int64)
+    rows = arr["rows"]
+
+    lines = pd.DataFrame({
+        "brief": brief_idx,
+        "media": arr["media"],
+        "seconds": arr["seconds"],
+        "budget": sec_budget,
+        "unit_cost": final_unit_net,
+        "std": std.astype(np.int64),
+        "spots": spots,
+        "under_target": under_target,
+        "list_value": list_value,
+        "rows": rows,
+        "super_spots": super_spots,
+    })
+
+    b = brief_idx
+    total_list = np.bincount(b, weights=list_value, minlength=n).astype(np.int64)
+    total_spots = np.bincount(b, weights=spots * rows + super_spots, minlength=n).astype(np.int64)
+    under_lines = np.bincount(b, weights=under_target, minlength=n).astype(np.int64)
+
+    vat = np.round((budgets + prod_cost) * 0.05).astype(np.int64)
+    safe_list = np.where(total_list > 0, total_list, 1)
+    summary = pd.DataFrame({
+        "budget": budget_col.to_numpy(),
+        "days": brief_days(briefs) if ("days" in briefs or "start_date" in briefs) else 0,
+        "total_spots": total_spots,
+        "total_list": total_list,
+        "vat": vat,
+        "grand_total": budget_col.to_numpy() + prod_cost + vat,
+        "discount_ratio": np.where(total_list > 0, budgets / safe_list * 100, 0.0),
+        "under_target_lines": under_lines,
+        "pricing_version": card.version,
+    })
+    if "client" in briefs:
+        summary.insert(0, "client", briefs["client"].to_numpy())
+
+    media_rank = lines["media"].map(MEDIA_ORDER_MAP).to_numpy()
+    lines = lines.iloc[np.lexsort((media_rank, lines["brief"].to_numpy()))].reset_index(drop=True)
+    return lines, summary
@@ -0,0 +1,323 @@
+import io
+import re
+from datetime import timedelta
+from functools import lru_cache
+
+import xlsxwriter
+
+import numpy as np
+
+from engine import MEDIA_ORDER_MAP, daily_totals, summarize
+
+# ==========================================
+# Excel Cue 表輸出
+# ==========================================
+# generate_excel: 記憶體內產生 (BytesIO)，給 Streamlit 下載使用
+# write_excel:    constant_memory 模式直接串流寫檔，逐列寫出後即釋放，
+#                 記憶體用量與列寬 (天數) 有關、與總列數無關，適合批次 / 大型檔案
+#                 (串流寫入無法回頭合併已輸出的列，媒體 / 套裝價欄不合併儲存格，其餘內容與格式相同)
+# write_portfolio: 多個案子一本 workbook (彙總表 + 每案一張 Media Schedule)，同樣 constant_memory
+
+# --- 格式登錄表: 樣式只定義一次，每本 workbook 依此順序建立 (順序固定，輸出穩定) ---
+FORMAT_SPECS = {
+    "title": {'font_size': 18, 'bold': True, 'align': 'center'},
+    "header_left": {'align': 'left', 'valign': 'top', 'bold': True},
+    "col_header": {'bold': True, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'bg_color': '#4472C4', 'font_color': 'white', 'text_wrap': True, 'font_size': 10},
+    "date_wk": {'font_size': 9, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'bg_color': '#4472C4', 'font_color': 'white'},
+    "date_we": {'font_size': 9, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'bg_color': '#FFD966'},
+    "cell": {'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_size': 10},
+    "cell_left": {'align': 'left', 'valign': 'vcenter', 'border': 1, 'font_size': 10, 'text_wrap': True},
+    "num": {'align': 'right', 'valign': 'vcenter', 'border': 1, 'num_format': '#,##0', 'font_size': 10},
+    "spots": {'align': 'center', 'valign': 'vcenter', 'border': 1, 'bold': True, 'bg_color': '#FFF2CC', 'font_size': 10},
+    "total": {'align': 'right', 'valign': 'vcenter', 'border': 1, 'bold': True, 'bg_color': '#E2EFDA', 'num_format': '#,##0', 'font_size': 10},
+    "discount": {'align': 'right', 'valign': 'vcenter', 'border': 1, 'bold': True, 'font_color': 'red', 'num_format': '#,##0', 'font_size': 10},
+    "grand_total": {'align': 'right', 'valign': 'vcenter', 'border': 1, 'bold': True, 'bg_color': '#FFC107', 'num_format': '#,##0', 'font_size': 10},
+}
+
+WEEKDAYS_ZH = ["一", "二", "三", "四", "五", "六", "日"]
+COL_HEADERS = ["Station", "Location", "Program", "Day-part", "Size", "rate (List)", "Package-cost\n(List)"]
+
+def register_formats(workbook):
+    """ xlsxwriter 的 Format 綁定在單一 workbook，依 FORMAT_SPECS 建立並回傳 name -> Format """
+    return {name: workbook.add_format(spec) for name, spec in FORMAT_SPECS.items()}
+
+def _merge_rows(worksheet, first_row, last_row, col, value, cell_format, merge=True):
+    """
+    合併同一欄的 first_row ~ last_row (在寫 first_row 時呼叫)，其餘列的空白格由呼叫端逐列寫入
+    merge=False (constant_memory) 只寫第一格: merge_range 會先寫後面幾列的空白格，之後回頭寫的列會被丟棄
+    """
+    if merge:
+        worksheet.merge_range(first_row, col, last_row, col, value, cell_format)
+    else:
+        worksheet.write(first_row, col, value, cell_format)
+
+@lru_cache(maxsize=1024)
+def sheet_template(start_dt, days_cnt):
+    """
+    只依 (起始日, 天數) 決定的表頭內容，算一次後重複使用 (批次 / 服務大量輸出時)
+    回傳 dict: period, month, last_col, runs = [(起始欄, [日], [星期], 是否週末)]
+    """
+    end_dt = start_dt + timedelta(days=days_cnt - 1)
+    days = [start_dt + timedelta(days=i) for i in range(days_cnt)]
+    runs = []
+    i = 0
+    while i < days_cnt:
+        is_we = days[i].weekday() >= 5
+        j = i + 1
+        while j < days_cnt and (days[j].weekday() >= 5) == is_we: j += 1
+        runs.append((7 + i, tuple(d.day for d in days[i:j]), tuple(WEEKDAYS_ZH[d.weekday()] for d in days[i:j]), is_we))
+        i = j
+    return {
+        "period": f"{start_dt.strftime('%Y. %m. %d')} - {end_dt.strftime('%Y. %m. %d')}",
+        "month": f"{start_dt.month}月",
+        "last_col": 7 + days_cnt,
+        "runs": tuple(runs),
+    }
+
+def _write_sheet(workbook, worksheet, rows, days_cnt, start_dt, c_name, products, total_list, budget, prod, progress=None, formats=None, merge=True):
+    """
+    依列序 (row-major) 寫出整張 Media Schedule，同時適用一般與 constant_memory 模式
+    formats: 同一本 workbook 多張表共用的 register_formats() 結果
+    merge: 是否合併媒體 / 全省聯播套裝價欄 (constant_memory 模式需為 False)
+    """
+    f = formats or register_formats(workbook)
+    tpl = sheet_template(start_dt, days_cnt)
+    used_media = sorted(list(set(r.media for r in rows)), key=lambda x: MEDIA_ORDER_MAP.get(x, 99))
+    mediums = "、".join(used_media)
+
+    worksheet.merge_range('A1:AJ1', "Media Schedule", f["title"])
+
+    info = [("客戶名稱：", c_name), ("Product：", products), ("Period :", tpl["period"]), ("Medium :", mediums)]
+    for i, (label, val) in enumerate(info):
+        worksheet.write_row(2+i, 0, (label, val), f["header_left"])
+
+    worksheet.write(6, 6, tpl["month"], f["cell"])
+
+    # 日期列: 同格式的連續日期一次寫入
+    last_col = tpl["last_col"]
+    for col, day_nums, _, is_we in tpl["runs"]:
+        worksheet.write_row(7, col, day_nums, f["date_we"] if is_we else f["date_wk"])
+    for col, _, weekdays, is_we in tpl["runs"]:
+        worksheet.write_row(8, col, weekdays, f["date_we"] if is_we else f["date_wk"])
+    worksheet.write_row(8, 0, COL_HEADERS, f["col_header"])
+    worksheet.write(8, last_col, "檔次", f["col_header"])
+
+    current_row = 9
+    i = 0
+    while i < len(rows):
+        row = rows[i]
+        j = i + 1
+        while j < len(rows) and rows[j].media == row.media and rows[j].seconds == row.seconds: j += 1
+        group_size = j - i
+        m_name = row.media
+        if "全家廣播" in m_name: m_name = "全家便利商店\n通路廣播廣告"
+        if "新鮮視" in m_name: m_name = "全家便利商店\n新鮮視廣告"
+        last_row = current_row + group_size - 1
+        pkg_merged = row.is_pkg_start and group_size > 1
+
+        for k in range(group_size):
+            r_data = rows[i + k]
+            r_idx = current_row + k
+            if k == 0 and group_size > 1:
+                _merge_rows(worksheet, r_idx, last_row, 0, m_name, f["cell_left"], merge)
+            elif k == 0:
+                worksheet.write(r_idx, 0, m_name, f["cell_left"])
+            else:
+                worksheet.write_blank(r_idx, 0, "", f["cell_left"])
+
+            loc_txt = r_data.location
+            if "北北基" in loc_txt and "廣播" in r_data.media: loc_txt = "北區-北北基+東"
+            worksheet.write_row(r_idx, 1, (loc_txt, r_data.program, r_data.daypart, f"{r_data.seconds}秒"), f["cell"])
+
+            # Rate (List)
+            worksheet.write(r_idx, 5, r_data.rate_list, f["num"] if isinstance(r_data.rate_list, int) else f["cell"])
+
+            # Package (List)
+            if pkg_merged:
+                if k == 0:
+                    _merge_rows(worksheet, r_idx, last_row, 6, row.pkg_display_val, f["num"], merge)
+                else:
+                    worksheet.write_blank(r_idx, 6, "", f["num"])
+            elif r_data.is_pkg_start:
+                if k == 0:
+                    worksheet.write(r_idx, 6, r_data.pkg_display_val, f["num"])
+            elif not r_data.is_pkg_member:
+                worksheet.write(r_idx, 6, r_data.pkg_display_val, f["num"] if isinstance(r_data.pkg_display_val, int) else f["cell"])
+
+            worksheet.write_row(r_idx, 7, r_data.schedule.to_list(), f["cell"])
+            worksheet.write(r_idx, last_col, r_data.spots, f["spots"])
+
+        current_row += group_size
+        i = j
+        if progress: progress(0.9 * j / len(rows))
+
+    worksheet.write(current_row, 2, "Total (List Price)", f["total"])
+    worksheet.write(current_row, 5, sum(r.rate_list for r in rows if isinstance(r.rate_list, int)), f["total"])
+    worksheet.write(current_row, 6, total_list, f["total"])
+
+    total_spots_daily = daily_totals([r.schedule for r in rows], days_cnt).tolist()
+    worksheet.write_row(current_row, 7, total_spots_daily, f["cell"])
+    worksheet.write(current_row, last_col, sum(r.spots for r in rows), f["spots"])
+
+    vat_val = int(round((budget + prod) * 0.05))
+    final_total = budget + prod + vat_val
+    footer = [("製作", prod, f["num"]), ("專案優惠價 (Budget)", budget, f["discount"]),
+              ("5% VAT", vat_val, f["num"])]
+    for label, val, fmt in footer:
+        current_row += 1
+        worksheet.write(current_row, 6, label, f["cell"])
+        worksheet.write(current_row, 7, val, fmt)
+    current_row += 1
+    worksheet.write_row(current_row, 6, ("Grand Total", final_total), f["grand_total"])
+
+    worksheet.set_column('A:A', 20)
+    worksheet.set_column('B:B', 15)
+    worksheet.set_column('C:E', 12)
+    worksheet.set_column('F:G', 12)
+    worksheet.set_column(7, last_col, 4)
+
+def generate_excel(rows, days_cnt, start_dt, c_name, products, total_list, grand_total, budget, prod, progress=None):
+    """ 記憶體內產生 xlsx，回傳 BytesIO；progress: 選填 callback(0.0~1.0) """
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    worksheet = workbook.add_worksheet("Media Schedule")
+    _write_sheet(workbook, worksheet, rows, days_cnt, start_dt, c_name, products, total_list, budget, prod, progress)
+    workbook.close()
+    return output
+
+def write_excel(path, rows, days_cnt, start_dt, c_name, products, total_list, grand_total, budget, prod, progress=None, tmpdir=None):
+    """
+    constant_memory 串流模式: 每寫完一列就輸出到暫存檔，最後壓縮成 path
+    大型 / 批次輸出使用，峰值記憶體不隨檔案大小成長；不合併儲存格 (見 _merge_rows)
+    """
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'tmpdir': tmpdir})
+    worksheet = workbook.add_worksheet("Media Schedule")
+    _write_sheet(workbook, worksheet, rows, days_cnt, start_dt, c_name, products, total_list, budget, prod, progress, merge=False)
+    workbook.close()
+    return path
+
+# ==========================================
+# 多案組合 (portfolio): 彙總表 + 每個案子一張 Media Schedule
+# ==========================================
+
+PORTFOLIO_SHEET = "Portfolio"
+CAMPAIGN_HEADERS = ["#", "Sheet", "客戶名稱", "Period", "Days", "Budget", "Total (List)", "Grand Total", "檔次", "牌價折扣率 %"]
+MEDIUM_HEADERS = ["Medium", "Budget", "Total (List)", "檔次", "牌價折扣率 %"]
+PORTFOLIO_DAY_COL = len(CAMPAIGN_HEADERS)   # 彙總表每日檔次從摘要欄之後開始，欄寬互不影響
+
+def sheet_names(names):
+    """ Excel 工作表名稱: 去除不合法字元、最長 31 字、不重複 (不分大小寫)，並避開彙總表名稱 """
+    used = {PORTFOLIO_SHEET.lower()}
+    out = []
+    for i, name in enumerate(names, start=1):
+        base = re.sub(r"[\[\]:*?/\\']+", "_", str(name)).strip() or f"Campaign {i}"
+        cand, n = base[:31], 2
+        while cand.lower() in used:
+            suffix = f" ({n})"
+            cand, n = base[:31 - len(suffix)] + suffix, n + 1
+        used.add(cand.lower())
+        out.append(cand)
+    return out
+
+def portfolio_rollup(campaigns):
+    """
+    組合彙總: 全部走期聯集上的每日檔次 (依媒體與合計) 與各媒體預算 / 牌價 / 檔次
+    每個案子以 daily_totals 算出每日合計，再依起始日位移後以一次 bincount 累加 (不逐日迴圈)
+    回傳 dict: start, days, daily {媒體 / "合計": 陣列}, media {媒體: {budget, list, spots}}
+    """
+    start = min(c["start_date"] for c in campaigns)
+    end = max(c["start_date"] + timedelta(days=c["days"] - 1) for c in campaigns)
+    n_days = (end - start).days + 1
+    idx, vals, media = {}, {}, {}
+    for c in campaigns:
+        offset = (c["start_date"] - start).days
+        by_media = {}
+        for r in c["result"]["rows"]:
+            by_media.setdefault(r.media, []).append(r.schedule)
+        for m_type, schedules in by_media.items():
+            idx.setdefault(m_type, []).append(np.arange(offset, offset + c["days"]))
+            vals.setdefault(m_type, []).append(daily_totals(schedules, c["days"]))
+        for m_type, t in c["result"]["by_media"].items():
+            agg = media.setdefault(m_type, {"budget": 0, "list": 0, "spots": 0})
+            for k in agg:
+                agg[k] += t[k]
+    order = sorted(idx, key=lambda m: MEDIA_ORDER_MAP.get(m, 99))
+    daily = {m: np.bincount(np.concatenate(idx[m]), weights=np.concatenate(vals[m]), minlength=n_days).astype(np.int64)
+             for m in order}
+    daily["合計"] = sum(daily.values()) if daily else np.zeros(n_days, dtype=np.int64)
+    media = {m: media[m] for m in sorted(media, key=lambda m: MEDIA_ORDER_MAP.get(m, 99))}
+    return {"start": start, "days": n_days, "daily": daily, "media": media}
+
+def _discount(budget, list_total):
+    return round(summarize(budget, list_total)["discount_ratio"], 2)
+
+def _write_portfolio_sheet(worksheet, f, campaigns, names, rollup):
+    """ 彙總表: 各案摘要、各媒體折扣率、全部走期的每日檔次 (列序寫出，constant_memory 可用) """
+    worksheet.merge_range(0, 0, 0, 9, "Portfolio Summary", f["title"])
+    worksheet.write_row(2, 0, CAMPAIGN_HEADERS, f["col_header"])
+    row = 3
+    for i, (c, name) in enumerate(zip(campaigns, names), start=1):
+        res = c["result"]
+        totals = summarize(c["budget"], res["total_list"], c["prod"])
+        end = c["start_date"] + timedelta(days=c["days"] - 1)
+        worksheet.write_row(row, 0, (i, name, c["client"], f"{c['start_date']:%Y.%m.%d} - {end:%Y.%m.%d}", c["days"]), f["cell"])
+        worksheet.write_row(row, 5, (c["budget"], res["total_list"], totals["grand_total"]), f["num"])
+        worksheet.write(row, 8, sum(r.spots for r in res["rows"]), f["spots"])
+        worksheet.write(row, 9, round(totals["discount_ratio"], 2), f["cell"])
+        row += 1
+
+    row += 1
+    worksheet.write_row(row, 0, MEDIUM_HEADERS, f["col_header"])
+    total = {"budget": 0, "list": 0, "spots": 0}
+    for m_type, t in list(rollup["media"].items()) + [("合計", total)]:
+        row += 1
+        worksheet.write(row, 0, m_type, f["cell_left"])
+        worksheet.write_row(row, 1, (t["budget"], t["list"]), f["total" if m_type == "合計" else "num"])
+        worksheet.write(row, 3, t["spots"], f["spots"])
+        worksheet.write(row, 4, _discount(t["budget"], t["list"]), f["cell"])
+        if m_type != "合計":
+            for k in total:
+                total[k] += t[k]
+
+    # 每日檔次: 日期 / 星期兩列表頭 + 每個媒體一列 + 合計；標籤在最後一個摘要欄，第 1 天在 PORTFOLIO_DAY_COL
+    row += 2
+    tpl = sheet_template(rollup["start"], rollup["days"])
+    label_col, shift = PORTFOLIO_DAY_COL - 1, PORTFOLIO_DAY_COL - 7   # sheet_template 的第 1 天在第 7 欄
+    worksheet.write(row, label_col, f"{rollup['start']:%Y.%m}", f["cell"])
+    for col, day_nums, _, is_we in tpl["runs"]:
+        worksheet.write_row(row, col + shift, day_nums, f["date_we"] if is_we else f["date_wk"])
+    row += 1
+    worksheet.write(row, label_col, "每日檔次", f["col_header"])
+    for col, _, weekdays, is_we in tpl["runs"]:
+        worksheet.write_row(row, col + shift, weekdays, f["date_we"] if is_we else f["date_wk"])
+    for m_type, arr in rollup["daily"].items():
+        row += 1
+        worksheet.write(row, label_col, m_type, f["cell_left"])
+        worksheet.write_row(row, PORTFOLIO_DAY_COL, arr.tolist(), f["spots" if m_type == "合計" else "cell"])
+
+    worksheet.set_column(0, 0, 20)
+    worksheet.set_column(1, 2, 24)
+    worksheet.set_column(3, 3, 24)
+    worksheet.set_column(4, 9, 13)
+    worksheet.set_column(PORTFOLIO_DAY_COL, PORTFOLIO_DAY_COL + rollup["days"] - 1, 4)
+
+def write_portfolio(path, campaigns, tmpdir=None, progress=None):
+    """
+    多個案子寫成一本 xlsx (constant_memory 串流，一次寫完)
+    campaigns: [{name, client, start_date, days, products, result (plan() 結果), budget, prod}]
+    第一張為彙總表，之後每個案子一張 Media Schedule；峰值記憶體與案子數量無關
+    """
+    if not campaigns:
+        raise ValueError("組合至少需要一個案子")
+    names = sheet_names(c.get("name") or c["client"] for c in campaigns)
+    rollup = portfolio_rollup(campaigns)
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'tmpdir': tmpdir})
+    f = register_formats(workbook)
+    _write_portfolio_sheet(workbook.add_worksheet(PORTFOLIO_SHEET), f, campaigns, names, rollup)
+    for i, (c, name) in enumerate(zip(campaigns, names), start=1):
+        res = c["result"]
+        _write_sheet(workbook, workbook.add_worksheet(name), res["rows"], c["days"], c["start_date"], c["client"],
+                     c["products"], res["total_list"], c["budget"], c["prod"], formats=f, merge=False)
+        if progress: progress(i / len(campaigns))
+    workbook.close()
+    return path
@@ -0,0 +1,97 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from cache import RESULT_CACHE
+
+# ==========================================
+# Excel 背景匯出 (按下按鈕才產生，在 worker thread 執行)
+# ==========================================
+# 完成後 bytes 寫入 RESULT_CACHE[(cache_key, "xlsx")]，輸入不變就一直沿用；
+# 輸入一變 cache_key 不同，自然需要重新產生。
+# 超過快取上限 (不會進快取) 的結果與失敗的工作留在 _jobs，直到下載 / 顯示錯誤後呼叫 release_export；
+# 沒有 session 回來取用的，RETAIN_SECS 秒後清掉
+
+EXPORT_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("CUE_EXPORT_WORKERS", "2")),
+    thread_name_prefix="cue-export",
+)
+RETAIN_SECS = float(os.environ.get("CUE_EXPORT_RETAIN_SECS", "600"))
+
+class ExportJob:
+    """ 單一匯出工作的狀態: running / done / error，progress 為 0.0 ~ 1.0 """
+
+    def __init__(self, key):
+        self.key = key
+        self.status = "running"
+        self.progress = 0.0
+        self.error = ""
+        self.data = None
+        self.future = None
+        self.elapsed = 0.0   # 產生耗時 (秒)
+        self.finished = None  # 結束時間 (time.monotonic)
+
+    def set_progress(self, fraction):
+        self.progress = min(max(fraction, 0.0), 1.0)
+
+_jobs = {}
+_lock = threading.Lock()
+
+def _sweep(now):
+    """ 移除逾時未取用的已結束工作 (呼叫端持有 _lock) """
+    for key in [k for k, job in _jobs.items() if job.finished is not None and now - job.finished > RETAIN_SECS]:
+        del _jobs[key]
+
+def get_export(cache_key):
+    """ 回傳 (xlsx bytes 或 None, 進行中/失敗的 ExportJob 或 None)；不超過快取上限的結果從快取取 """
+    data = RESULT_CACHE.get((cache_key, "xlsx"))
+    with _lock:
+        _sweep(time.monotonic())
+        job = _jobs.get(cache_key)
+    if job is not None and job.status == "done":
+        return (data if data is not None else job.data), None
+    return data, job
+
+def release_export(cache_key):
+    """ 結果已下載 / 錯誤已顯示: 移除已結束的工作 (進行中的不受影響) """
+    with _lock:
+        job = _jobs.get(cache_key)
+        if job is not None and job.status != "running":
+            del _jobs[cache_key]
+
+def submit_export(cache_key, build):
+    """
+    排入背景產生 xlsx，同一組輸入同時只會有一個工作
+    build(progress) -> bytes，progress 為回報進度的 callback
+    """
+    with _lock:
+        job = _jobs.get(cache_key)
+        if job is not None and job.status != "error":
+            return job   # 進行中，或已完成但超過快取上限、尚未下載
+        job = ExportJob(cache_key)
+        _jobs[cache_key] = job
+
+    def run():
+        try:
+            t0 = time.perf_counter()
+            data = build(job.set_progress)
+            job.elapsed = time.perf_counter() - t0
+            metrics.record("xlsx_build", job.elapsed)
+            metrics.payload("xlsx", len(data))
+            job.data = data
+            RESULT_CACHE.put((cache_key, "xlsx"), data)
+            job.progress = 1.0
+            job.finished = time.monotonic()
+            job.status = "done"
+            if len(data) <= RESULT_CACHE.max_bytes:
+                with _lock:   # 已在快取；超過上限的留著 (get_export 從 job 取)，直到 release_export
+                    _jobs.pop(cache_key, None)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.finished = time.monotonic()
+            job.status = "error"
+
+    job.future = EXPORT_POOL.submit(run)
+    return job
@@ -0,0 +1,201 @@
+import os
+import csv
+from dataclasses import replace
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+
+from engine import DailySchedule
+
+# ==========================================
+# 檔次分配策略 (flighting): 總檔次不變，依日曆權重重新分配到每一天 (每日維持偶數)
+# ==========================================
+# 策略函式依日曆索引算出每日權重 w[d] >= 0，再套上停播日 / 國定假日遮罩 (權重設為 0)
+# 每日「對數」(檔次 / 2) = floor(half · w / Σw)，剩下的對數依小數部分由大到小補上 (同分取前面的日期)
+# 權重全相同時結果與 calculate_schedule 相同 (餘數前置)，平均分配即為特例
+#
+# 日曆索引 (序數日 / 星期 / 假日) 依 (起始日, 天數, 假日檔) 快取並共用，
+# 批次報價數千個案子時不重複建立；多列一起以 2 維陣列分配，不逐列 / 逐日迴圈
+#
+# 策略設定 (spec) 為可 JSON 化的 dict，例如:
+#   {"strategy": "weekday", "weights": [1, 1, 1, 1, 1, 2, 2], "skip_holidays": true}
+#   {"strategy": "burst", "factor": 3, "half_life": 7, "blackout": ["2025-02-01"]}
+
+HOLIDAYS_PATH = os.environ.get("CUE_HOLIDAYS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "calendars", "tw_holidays.csv"))
+
+# 假日檔: date, name (依行政院人事行政總處每年公告的辦公日曆表更新)
+@lru_cache(maxsize=8)
+def _read_holidays(path, mtime):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        days = [date.fromisoformat(rec["date"].strip()).toordinal() for rec in csv.DictReader(f) if rec.get("date")]
+    return np.unique(np.array(days, dtype=np.int64))
+
+def holidays(path=HOLIDAYS_PATH):
+    """ 假日序數日 (排序後的陣列)；檔案修改後自動重讀，檔案不存在時為空 """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return np.zeros(0, dtype=np.int64)
+    return _read_holidays(path, mtime)
+
+class Calendar:
+    """ 走期的日曆索引 (唯讀陣列，快取後共用): ordinal 序數日、weekday 星期 (0=一)、holiday 是否為假日 """
+    __slots__ = ("start", "days", "ordinal", "weekday", "holiday")
+
+    def __init__(self, start, days, holiday_days):
+        self.start = start
+        self.days = days
+        self.ordinal = np.arange(start.toordinal(), start.toordinal() + days, dtype=np.int64)
+        self.weekday = (self.ordinal - 1) % 7   # 序數日 1 (0001-01-01) 為星期一
+        self.holiday = np.isin(self.ordinal, holiday_days)
+        for arr in (self.ordinal, self.weekday, self.holiday):
+            arr.setflags(write=False)
+
+@lru_cache(maxsize=4096)
+def _calendar(start_date, days, path, mtime):
+    return Calendar(start_date, days, holidays(path))
+
+def calendar_index(start_date, days, path=HOLIDAYS_PATH):
+    """ 依 (起始日, 天數, 假日檔版本) 快取的 Calendar """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    return _calendar(start_date, days, path, mtime)
+
+# ==========================================
+# 策略: (Calendar, **參數) -> 每日權重
+# ==========================================
+
+WEEKEND_HEAVY = (1, 1, 1, 1, 1.2, 2, 2)
+
+def even_weights(cal):
+    return np.ones(cal.days)
+
+def weekday_weights(cal, weights=WEEKEND_HEAVY):
+    """ 星期一 ~ 日各一個權重 """
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (7,):
+        raise ValueError("weekday 策略需要 7 個權重 (星期一 ~ 日)")
+    return weights[cal.weekday]
+
+def burst_weights(cal, factor=3.0, half_life=7.0):
+    """ 上檔衝刺: 第一天為平常的 factor 倍，之後每 half_life 天差距減半 """
+    if factor < 1 or half_life <= 0:
+        raise ValueError("burst 策略需要 factor >= 1、half_life > 0")
+    return 1 + (factor - 1) * 0.5 ** (np.arange(cal.days) / half_life)
+
+STRATEGIES = {"even": even_weights, "weekday": weekday_weights, "burst": burst_weights}
+
+# UI / brief 表的預設選項
+PRESETS = {
+    "平均分配": {"strategy": "even"},
+    "週末加重": {"strategy": "weekday", "weights": list(WEEKEND_HEAVY)},
+    "上檔衝刺": {"strategy": "burst", "factor": 3, "half_life": 7},
+}
+_MASK_KEYS = ("strategy", "blackout", "skip_holidays")
+WEIGHT_SCALE = 1_000_000
+
+def is_even(spec):
+    """ 沒有設定或平均分配且無停播 / 假日遮罩 (排程維持原樣) """
+    return not spec or (spec.get("strategy", "even") == "even" and not spec.get("blackout") and not spec.get("skip_holidays"))
+
+def day_weights(spec, cal):
+    """ 策略權重 × 停播 / 假日遮罩；全部為 0 時丟出 ValueError """
+    name = spec.get("strategy", "even")
+    if name not in STRATEGIES:
+        raise ValueError(f"未知的分配策略: {name} (可用: {', '.join(STRATEGIES)})")
+    weights = np.array(STRATEGIES[name](cal, **{k: v for k, v in spec.items() if k not in _MASK_KEYS}), dtype=float)
+    if weights.shape != (cal.days,) or not np.isfinite(weights).all() or (weights < 0).any():
+        raise ValueError(f"{name} 策略的權重需為 {cal.days} 個非負數")
+    if spec.get("skip_holidays"):
+        weights[cal.holiday] = 0
+    if spec.get("blackout"):
+        idx = np.array([date.fromisoformat(str(d)).toordinal() for d in spec["blackout"]], dtype=np.int64) - cal.ordinal[0]
+        weights[idx[(idx >= 0) & (idx < cal.days)]] = 0
+    if not (weights > 0).any():
+        raise ValueError("走期內沒有可排播的日期 (全部停播)")
+    return weights
+
+def allocate(totals, weights):
+    """
+    每列總檔次依權重分到每天 (每日偶數)，回傳 [列, 日] int64 陣列
+    totals 為奇數時與 calculate_schedule 相同進位成偶數；權重先換成整數 (最大值 = WEIGHT_SCALE)，
+    分配全程整數運算，總數不受浮點誤差影響
+    """
+    half = (np.asarray(totals, dtype=np.int64) + 1) // 2
+    w = np.rint(weights / weights.max() * WEIGHT_SCALE).astype(np.int64)
+    num = np.multiply.outer(half, w)
+    pairs, frac = np.divmod(num, w.sum())
+    left = half - pairs.sum(axis=1)
+    # 餘數大的先補；stable 排序讓同分時前面的日期優先
+    rank = np.argsort(np.argsort(-frac, axis=1, kind="stable"), axis=1)
+    pairs += rank < left[:, None]
+    return 2 * pairs
+
+def apply_flighting(rows, start_date, spec, path=HOLIDAYS_PATH):
+    """
+    rows 的排程依策略重新分配 (各列總檔次與金額不變)，回傳新的 rows
+    共用同一排程的列 (全省聯播) 分配後仍共用同一個 DailySchedule
+    """
+    if is_even(spec) or not rows:
+        return rows
+    days = max(r.schedule.days for r in rows)
+    weights = day_weights(spec, calendar_index(start_date, days, path))
+    shared = {}
+    for r in rows:
+        shared.setdefault(id(r.schedule), r.schedule)
+    counts = allocate([s.total for s in shared.values()], weights)
+    new = {key: DailySchedule(c) for key, c in zip(shared, counts)}
+    return [replace(r, schedule=new[id(r.schedule)]) for r in rows]
+
+def parse_spec(text, blackout=None, skip_holidays=False):
+    """
+    brief 表 / 文字設定 -> spec
+    text: 預設名稱 (平均分配 / 週末加重 / 上檔衝刺)、even、weekday:1,1,1,1,1,2,2、burst:3:7
+    blackout: "2025-02-01,2025-02-02" 或日期 list
+    """
+    text = str(text or "").strip()
+    if text in PRESETS:
+        spec = dict(PRESETS[text])
+    else:
+        name, _, args = text.partition(":")
+        name = name.strip() or "even"
+        spec = {"strategy": name}
+        try:
+            if name == "weekday" and args:
+                spec["weights"] = [float(x) for x in args.split(",")]
+            elif name == "burst" and args:
+                factor, _, half_life = args.partition(":")
+                spec["factor"] = float(factor)
+                if half_life:
+                    spec["half_life"] = float(half_life)
+        except ValueError:
+            raise ValueError(f"分配策略格式錯誤: {text}")
+        if name not in STRATEGIES:
+            raise ValueError(f"未知的分配策略: {name} (可用: {', '.join(list(STRATEGIES) + list(PRESETS))})")
+    if isinstance(blackout, str):
+        blackout = [d.strip() for d in blackout.split(",") if d.strip()]
+    if blackout:
+        try:
+            spec["blackout"] = sorted({date.fromisoformat(str(d)[:10]).isoformat() for d in blackout})
+        except ValueError:
+            raise ValueError(f"停播日期需為 YYYY-MM-DD: {blackout}")
+    if skip_holidays:
+        spec["skip_holidays"] = True
+    return spec
+
+def brief_spec(brief):
+    """ brief 表的 flighting / blackout / skip_holidays 欄 -> spec (皆空白時為 None) """
+    def cell(key):
+        v = brief.get(key)
+        return None if v is None or (isinstance(v, float) and np.isnan(v)) else v
+    text, blackout, skip = cell("flighting"), cell("blackout"), cell("skip_holidays")
+    if isinstance(skip, (bool, int, float, np.number)):
+        skip = bool(skip)
+    else:
+        skip = str(skip or "").strip().lower() in ("1", "true", "yes", "y", "是")
+    if text is None and not blackout and not skip:
+        return None
+    return parse_spec(text, blackout, skip)
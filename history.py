@@ -0,0 +1,212 @@
+import os
+import json
+import zlib
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from engine import MEDIA_ORDER_MAP, CueRow, DailySchedule, calculate_schedule
+
+# ==========================================
+# 報價歷史 (append-only): 每份產生過的報價存下輸入、摘要與計算結果
+# ==========================================
+# quotes        一份報價一筆，quote_key (plan_key) 唯一，相同輸入只存一次；
+#               result 為 plan() 結果 (JSON + zlib: 列欄位 + 每日檔次，不依賴引擎類別)，重新開啟時直接還原，不必重算
+# quote_media   每份報價 × 媒體一筆 (預算 / 檔次)，媒體條件搜尋用
+# agg_media_month / agg_month
+#               管理報表彙總: 新增報價時在同一個 transaction 內累加，讀取不掃描歷史
+#               媒體預算依走期天數分攤到各月份；報價數 / 平均折扣率計在走期起始月份
+
+HISTORY_PATH = os.environ.get("CUE_HISTORY", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY, quote_key TEXT NOT NULL UNIQUE, created TEXT NOT NULL, client TEXT NOT NULL,
+    start_day INTEGER NOT NULL, end_day INTEGER NOT NULL, budget REAL NOT NULL, total_spots INTEGER NOT NULL,
+    total_list INTEGER NOT NULL, grand_total INTEGER NOT NULL, discount_ratio REAL NOT NULL,
+    pricing_version TEXT, inputs TEXT NOT NULL, result BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS quotes_client ON quotes (client, start_day);
+CREATE INDEX IF NOT EXISTS quotes_start ON quotes (start_day, end_day);
+CREATE TABLE IF NOT EXISTS quote_media (
+    quote_id INTEGER NOT NULL REFERENCES quotes(id), media TEXT NOT NULL, start_day INTEGER NOT NULL,
+    budget REAL NOT NULL, spots INTEGER NOT NULL, PRIMARY KEY (media, start_day, quote_id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agg_media_month (
+    media TEXT NOT NULL, month TEXT NOT NULL, spend REAL NOT NULL, spots INTEGER NOT NULL,
+    PRIMARY KEY (media, month)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agg_month (
+    month TEXT PRIMARY KEY, quotes INTEGER NOT NULL, budget REAL NOT NULL, discount_sum REAL NOT NULL) WITHOUT ROWID;
+"""
+
+SEARCH_COLUMNS = ["id", "created", "client", "start_date", "end_date", "budget", "total_spots",
+                  "total_list", "grand_total", "discount_ratio", "pricing_version"]
+
+def month_shares(start_date, days):
+    """ 走期各月份的天數比例: [("2025-01", 0.5), ...] """
+    out = []
+    d, left = start_date, days
+    while left > 0:
+        nxt = (d.replace(day=1) + timedelta(days=32)).replace(day=1)
+        n = min((nxt - d).days, left)
+        out.append((d.strftime("%Y-%m"), n / days))
+        d, left = nxt, left - n
+    return out
+
+# ==========================================
+# 計算結果序列化: 只存基本型別，引擎類別日後改名 / 改欄位時舊紀錄仍可讀取
+# ==========================================
+# rows 的 schedule 存成 schedules 清單的索引 (全省聯播共用的排程還原後仍共用同一物件)
+
+ROW_FIELDS = ("media", "region", "location", "program", "daypart", "seconds", "spots",
+              "rate_list", "pkg_display_val", "is_pkg_start", "is_pkg_member")
+
+def dump_result(result):
+    """ plan() 結果 -> zlib 壓縮的 JSON """
+    schedules, rows, seen = [], [], {}
+    for r in result["rows"]:
+        if id(r.schedule) not in seen:
+            seen[id(r.schedule)] = len(schedules)
+            schedules.append(r.schedule.to_list())
+        rows.append(dict({k: getattr(r, k) for k in ROW_FIELDS}, schedule=seen[id(r.schedule)]))
+    doc = {"rows": rows, "schedules": schedules, "logs": result.get("logs", []), "secs": sorted(result.get("secs", ())),
+           "total_list": result["total_list"], "pricing_version": result.get("pricing_version"),
+           "by_media": result.get("by_media", {})}
+    return zlib.compress(json.dumps(doc, ensure_ascii=False, separators=(",", ":"), default=int).encode("utf-8"))
+
+def _schedule(counts):
+    """ 每日檔次 -> 平均分配的 Schedule (封閉形式)，其餘 (分配策略 / 刪減) 為 DailySchedule """
+    closed = calculate_schedule(sum(counts), len(counts))
+    return closed if closed.to_list() == counts else DailySchedule(counts)
+
+def load_result(blob):
+    """ dump_result 的反向 """
+    doc = json.loads(zlib.decompress(blob))
+    schedules = [_schedule(c) for c in doc.pop("schedules")]
+    doc["rows"] = [CueRow(schedule=schedules[r.pop("schedule")], **r) for r in doc["rows"]]
+    doc["secs"] = set(doc["secs"])
+    return doc
+
+class History:
+    """ 報價歷史 (執行緒安全；WAL 模式) """
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, quote_key, config_media, budget, start_date, days, client, result, totals, flighting=None):
+        """
+        存一份報價 (相同 quote_key 已存在時略過)，同時累加彙總表
+        totals: engine.summarize() 結果；flighting: 套用的檔次分配 spec (期中調整沿用)；回傳 quote id
+        """
+        spots_by_media = {}
+        for r in result["rows"]:   # 與 plan_many / service 相同: 各列檔次加總
+            spots_by_media[r.media] = spots_by_media.get(r.media, 0) + r.spots
+        total_spots = sum(spots_by_media.values())
+        start_day = start_date.toordinal()
+        inputs = json.dumps({"config_media": config_media, "budget": budget, "start_date": start_date.isoformat(),
+                             "days": days, "client": client, "flighting": flighting}, ensure_ascii=False, default=str)
+        blob = dump_result(result)
+        with self.lock, self.conn:
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO quotes (quote_key, created, client, start_day, end_day, budget, total_spots, total_list,"
+                " grand_total, discount_ratio, pricing_version, inputs, result) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (quote_key, datetime.now().isoformat(timespec="seconds"), client, start_day, start_day + days - 1, budget,
+                 total_spots, result["total_list"], totals["grand_total"], totals["discount_ratio"],
+                 result.get("pricing_version"), inputs, blob))
+            if cur.rowcount == 0:
+                return self.conn.execute("SELECT id FROM quotes WHERE quote_key = ?", (quote_key,)).fetchone()[0]
+            quote_id = cur.lastrowid
+            media_rows, agg_rows = [], []
+            for m_type, cfg in config_media.items():
+                m_budget = budget * cfg["share"] / 100.0
+                spots = spots_by_media.get(m_type, 0)
+                media_rows.append((quote_id, m_type, start_day, m_budget, spots))
+                agg_rows += [(m_type, month, m_budget * share, round(spots * share)) for month, share in month_shares(start_date, days)]
+            self.conn.executemany("INSERT INTO quote_media VALUES (?, ?, ?, ?, ?)", media_rows)
+            self.conn.executemany(
+                "INSERT INTO agg_media_month VALUES (?, ?, ?, ?) ON CONFLICT (media, month) "
+                "DO UPDATE SET spend = spend + excluded.spend, spots = spots + excluded.spots", agg_rows)
+            self.conn.execute(
+                "INSERT INTO agg_month VALUES (?, 1, ?, ?) ON CONFLICT (month) "
+                "DO UPDATE SET quotes = quotes + 1, budget = budget + excluded.budget, discount_sum = discount_sum + excluded.discount_sum",
+                (start_date.strftime("%Y-%m"), budget, totals["discount_ratio"]))
+        return quote_id
+
+    def search(self, client=None, start_date=None, end_date=None, media=None, limit=200):
+        """
+        client: 客戶名稱前綴；start_date / end_date: 走期與此區間重疊；media: 含此媒體
+        回傳 DataFrame (SEARCH_COLUMNS)，新的在前
+        """
+        where, params = [], []
+        if client:
+            where.append("client >= ? AND client < ?")
+            params += [client, client + "\U0010ffff"]
+        if start_date is not None:
+            where.append("end_day >= ?")
+            params.append(start_date.toordinal())
+        if end_date is not None:
+            where.append("start_day <= ?")
+            params.append(end_date.toordinal())
+        if media:
+            where.append("id IN (SELECT quote_id FROM quote_media WHERE media = ?)")
+            params.append(media)
+        sql = ("SELECT id, created, client, start_day, end_day, budget, total_spots, total_list, grand_total,"
+               " discount_ratio, pricing_version FROM quotes"
+               + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id DESC LIMIT ?")
+        with self.lock:
+            rows = self.conn.execute(sql, params + [limit]).fetchall()
+        df = pd.DataFrame(rows, columns=SEARCH_COLUMNS)
+        df["start_date"] = df["start_date"].map(date.fromordinal)
+        df["end_date"] = df["end_date"].map(date.fromordinal)
+        return df
+
+    def get(self, quote_id):
+        """ 還原一份報價: (inputs dict, plan() 結果)；不存在時回傳 None """
+        with self.lock:
+            row = self.conn.execute("SELECT quote_key, inputs, result FROM quotes WHERE id = ?", (quote_id,)).fetchone()
+        if row is None:
+            return None
+        inputs = json.loads(row[1])
+        inputs["start_date"] = date.fromisoformat(inputs["start_date"])
+        for cfg in inputs["config_media"].values():   # JSON 物件的鍵為字串，秒數還原成 int (可直接重跑 plan)
+            cfg["sec_shares"] = {int(s): v for s, v in cfg["sec_shares"].items()}
+        inputs.setdefault("flighting", None)   # 較早的紀錄沒有此欄
+        inputs["quote_key"] = row[0]
+        return inputs, load_result(row[2])
+
+    def monthly_spend(self):
+        """ 各媒體每月預算 (依走期天數分攤): DataFrame index=month, columns=媒體 """
+        with self.lock:
+            rows = self.conn.execute("SELECT month, media, spend FROM agg_media_month").fetchall()
+        df = pd.DataFrame(rows, columns=["month", "media", "spend"])
+        if df.empty:
+            return df
+        pivot = df.pivot_table(index="month", columns="media", values="spend", aggfunc="sum", fill_value=0)
+        return pivot[sorted(pivot.columns, key=lambda m: MEDIA_ORDER_MAP.get(m, 99))]
+
+    def monthly_summary(self):
+        """ 每月 (走期起始月份) 報價數、總預算、平均牌價折扣率 """
+        with self.lock:
+            rows = self.conn.execute("SELECT month, quotes, budget, discount_sum FROM agg_month ORDER BY month").fetchall()
+        df = pd.DataFrame(rows, columns=["month", "quotes", "budget", "discount_sum"])
+        df["avg_discount_ratio"] = df["discount_sum"] / df["quotes"].where(df["quotes"] > 0)
+        return df.drop(columns="discount_sum")
+
+_default = None
+_default_lock = threading.Lock()
+
+def default_history():
+    """ 預設路徑的 History (同一 process 共用一個連線) """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = History(HISTORY_PATH)
+        return _default
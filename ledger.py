@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import threading
+from dataclasses import replace
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import ratecard
+from engine import DailySchedule
+from playlist import parse_daypart
+
+# ==========================================
+# 檔期庫存帳 (booking ledger): 已成交檔期的每日佔用，報價時檢查是否超賣
+# ==========================================
+# 容量: 每個 (媒體, 區域) 每日可播秒數 = Std_Spots × Base_Sec × CAPACITY_FACTOR，且不超過 Day_Part 時段總秒數
+#       (Std_Spots 為 Day_Part 時段內的每日標準檔數，平均約每小時 30 檔；
+#        家樂福量販 09:00-23:00 只有 14 小時，超市 00:00-24:00 為 24 小時)
+# 佔用: 檔次 × 秒數，不同秒數的素材可以互相比較
+#
+# SQLite 資料表:
+#   bookings       一筆成交 (campaign / client / 走期)
+#   booking_lines  每個 Cue 表列一筆 (series = 媒體 × 區域)，counts 為每日檔次 (int32 bytes)
+#   line_index     R*Tree 區間索引 (日期區間 × series)，查某區某週有哪些檔期重疊
+#   daily_load     每 (series, 日) 已佔用秒數，成交 / 取消時增減；報價檢查只讀這張表，
+#                  查詢成本只和走期天數有關，與重疊檔期數量無關
+
+LEDGER_PATH = os.environ.get("CUE_LEDGER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ledger.sqlite3"))
+CAPACITY_FACTOR = float(os.environ.get("CUE_CAPACITY_FACTOR", "1.0"))
+
+# 家樂福的 Cue 表區域 -> 價目表鍵
+_CF_KEYS = {"全省量販": "量販_全省", "全省超市": "超市_全省"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY, media TEXT NOT NULL, region TEXT NOT NULL, UNIQUE (media, region));
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY, campaign TEXT NOT NULL, client TEXT, pricing_version TEXT,
+    start_day INTEGER NOT NULL, end_day INTEGER NOT NULL, created TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS booking_lines (
+    id INTEGER PRIMARY KEY, booking_id INTEGER NOT NULL REFERENCES bookings(id),
+    series INTEGER NOT NULL, seconds INTEGER NOT NULL, start_day INTEGER NOT NULL, counts BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS booking_lines_booking ON booking_lines (booking_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS line_index USING rtree_i32(id, start_day, end_day, series_lo, series_hi);
+CREATE TABLE IF NOT EXISTS daily_load (
+    series INTEGER NOT NULL, day INTEGER NOT NULL, secs INTEGER NOT NULL, PRIMARY KEY (series, day)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('revision', 0);
+"""
+
+def capacity_secs(media, region, card=None):
+    """ 每日可播秒數 (Day_Part 時段內) """
+    card = card or ratecard.current()
+    db = card.pricing[media]
+    info = db[_CF_KEYS[region]] if media == "家樂福" else db
+    lo, hi = parse_daypart(info["Day_Part"])
+    return int(min(info["Std_Spots"] * db["Base_Sec"] * CAPACITY_FACTOR, (hi - lo) * 60))
+
+class Ledger:
+    """ 單一 SQLite 檔的庫存帳 (執行緒安全；多 process 以 WAL 模式共用) """
+
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._series = dict(((m, r), i) for i, m, r in self.conn.execute("SELECT id, media, region FROM series"))
+
+    def close(self):
+        self.conn.close()
+
+    def _series_id(self, media, region, create=False):
+        """ (媒體, 區域) 的編號；其他 process 新增的也查得到 (呼叫端持有 lock) """
+        sid = self._series.get((media, region))
+        if sid is None:
+            if create:
+                self.conn.execute("INSERT OR IGNORE INTO series (media, region) VALUES (?, ?)", (media, region))
+            row = self.conn.execute("SELECT id FROM series WHERE media = ? AND region = ?", (media, region)).fetchone()
+            if row is not None:
+                sid = self._series[(media, region)] = row[0]
+        return sid
+
+    def revision(self):
+        """ 每次成交 / 取消加 1 (報價快取鍵用) """
+        with self.lock:
+            return self.conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def _apply(self, series, start_day, secs, sign):
+        nz = np.flatnonzero(secs)
+        self.conn.executemany(
+            "INSERT INTO daily_load VALUES (?, ?, ?) ON CONFLICT (series, day) DO UPDATE SET secs = secs + excluded.secs",
+            [(series, start_day + int(d), sign * int(secs[d])) for d in nz])
+
+    def book(self, rows, start_date, campaign, client="", pricing_version=""):
+        """ 登錄一份 Cue 表 (plan() 的 rows)；回傳 booking id """
+        start_day = start_date.toordinal()
+        days = max((r.schedule.days for r in rows), default=0)
+        with self.lock, self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO bookings (campaign, client, pricing_version, start_day, end_day, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (campaign, client, pricing_version, start_day, start_day + days - 1, datetime.now().isoformat(timespec="seconds")))
+            booking_id = cur.lastrowid
+            for r in rows:
+                counts = r.schedule.as_array()
+                if not counts.any():
+                    continue
+                series = self._series_id(r.media, r.region, create=True)
+                line = self.conn.execute(
+                    "INSERT INTO booking_lines (booking_id, series, seconds, start_day, counts) VALUES (?, ?, ?, ?, ?)",
+                    (booking_id, series, r.seconds, start_day, counts.astype(np.int32).tobytes())).lastrowid
+                nz = np.flatnonzero(counts)
+                self.conn.execute("INSERT INTO line_index VALUES (?, ?, ?, ?, ?)",
+                                  (line, start_day + int(nz[0]), start_day + int(nz[-1]), series, series))
+                self._apply(series, start_day, counts * r.seconds, 1)
+            self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+        return booking_id
+
+    def cancel(self, booking_id):
+        """ 取消成交，扣回每日佔用；回傳是否存在 """
+        with self.lock, self.conn:
+            lines = self.conn.execute("SELECT id, series, seconds, start_day, counts FROM booking_lines WHERE booking_id = ?",
+                                      (booking_id,)).fetchall()
+            for line, series, seconds, start_day, blob in lines:
+                self._apply(series, start_day, np.frombuffer(blob, dtype=np.int32).astype(np.int64) * seconds, -1)
+                self.conn.execute("DELETE FROM line_index WHERE id = ?", (line,))
+            self.conn.execute("DELETE FROM booking_lines WHERE booking_id = ?", (booking_id,))
+            found = self.conn.execute("DELETE FROM bookings WHERE id = ?", (booking_id,)).rowcount > 0
+            self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+        return found
+
+    def load(self, media, region, start_date, days):
+        """ 已佔用秒數 (長度 days 的陣列) """
+        out = np.zeros(max(days, 0), dtype=np.int64)
+        lo = start_date.toordinal()
+        with self.lock:
+            series = self._series_id(media, region)
+            if series is None or days <= 0:
+                return out
+            rows = self.conn.execute("SELECT day, secs FROM daily_load WHERE series = ? AND day BETWEEN ? AND ?",
+                                     (series, lo, lo + days - 1)).fetchall()
+        if rows:
+            arr = np.array(rows, dtype=np.int64)
+            out[arr[:, 0] - lo] = arr[:, 1]
+        return out
+
+    def overlapping(self, media, region, start_date, end_date):
+        """ 與期間重疊的成交 (R*Tree 區間查詢): DataFrame [booking_id, campaign, client, seconds, start_date, spots] """
+        cols = ["booking_id", "campaign", "client", "seconds", "start_date", "spots"]
+        with self.lock:
+            series = self._series_id(media, region)
+            if series is None:
+                return pd.DataFrame(columns=cols)
+            rows = self.conn.execute(
+                "SELECT b.id, b.campaign, b.client, l.seconds, l.start_day, l.counts FROM line_index i "
+                "JOIN booking_lines l ON l.id = i.id JOIN bookings b ON b.id = l.booking_id "
+                "WHERE i.start_day <= ? AND i.end_day >= ? AND i.series_lo <= ? AND i.series_hi >= ?",
+                (end_date.toordinal(), start_date.toordinal(), series, series)).fetchall()
+        return pd.DataFrame([(bid, c, cl, sec, date.fromordinal(sd), int(np.frombuffer(blob, dtype=np.int32).sum()))
+                             for bid, c, cl, sec, sd, blob in rows], columns=cols)
+
+# ==========================================
+# 報價檢查 / 刪減
+# ==========================================
+
+def _walk(rows, start_date, ledger, card):
+    """ 依列序累計: yield (列, 容量, 已佔用 + 本報價前面各列的佔用) """
+    days = max((r.schedule.days for r in rows), default=0)
+    used = {}
+    for r in rows:
+        key = (r.media, r.region)
+        if key not in used:
+            used[key] = ledger.load(r.media, r.region, start_date, days)
+        yield r, capacity_secs(r.media, r.region, card), used[key]
+
+def check(rows, start_date, ledger, card=None):
+    """
+    超賣的 (日, 媒體, 區域): DataFrame [date, media, region, capacity_secs, booked_secs, quote_secs, over_secs]
+    空表代表全部可排
+    """
+    card = card or ratecard.current()
+    quote = {}
+    caps = {}
+    booked = {}
+    for r, cap, used in _walk(rows, start_date, ledger, card):
+        key = (r.media, r.region)
+        caps[key], booked[key] = cap, used
+        quote[key] = quote.get(key, 0) + r.schedule.as_array() * r.seconds
+    frames = []
+    for key, q in quote.items():
+        over = booked[key] + q - caps[key]
+        idx = np.flatnonzero(over > 0)
+        if len(idx):
+            frames.append(pd.DataFrame({
+                "date": [start_date + timedelta(days=int(d)) for d in idx], "media": key[0], "region": key[1],
+                "capacity_secs": caps[key], "booked_secs": booked[key][idx], "quote_secs": q[idx], "over_secs": over[idx]}))
+    if not frames:
+        return pd.DataFrame(columns=["date", "media", "region", "capacity_secs", "booked_secs", "quote_secs", "over_secs"])
+    return pd.concat(frames, ignore_index=True).sort_values(["date", "media", "region"], kind="stable", ignore_index=True)
+
+def clip(rows, start_date, ledger, card=None):
+    """
+    超賣日的檔次刪到剩餘容量內 (維持每日偶數檔)，回傳新的 rows (未超賣的列原樣沿用)
+    只改排程與檔次；金額欄位 (套裝價 / 全省聯播套裝總價) 維持報價原值，與 Total (List) / 總金額一致
+    """
+    card = card or ratecard.current()
+    out = []
+    for r, cap, used in _walk(rows, start_date, ledger, card):
+        counts = r.schedule.as_array()
+        room = np.maximum(cap - used, 0) // r.seconds // 2 * 2
+        clipped = np.minimum(counts, room)
+        used += clipped * r.seconds
+        if (clipped == counts).all():
+            out.append(r)
+            continue
+        out.append(replace(r, schedule=DailySchedule(clipped), spots=int(clipped.sum())))
+    return out
+
+_default = None
+_default_lock = threading.Lock()
+
+def default_ledger():
+    """ 預設路徑的 Ledger (同一 process 共用一個連線) """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Ledger(LEDGER_PATH)
+        return _default
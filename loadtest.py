@@ -0,0 +1,148 @@
+"""
+報價服務壓力測試
+
+    python loadtest.py --spawn                       # 自行啟動 service.py 再測
+    python loadtest.py --url http://127.0.0.1:8765 --concurrency 16 --requests 5000 --unique 200
+
+每個 client thread 使用一條 keep-alive 連線連續送出請求；
+--unique 控制不同報價組合的數量 (越少快取命中率越高)，--xlsx 為附帶 xlsx 的請求比例
+輸出 req/s 與 p50 / p95 / p99 延遲
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlparse
+
+REGIONS = ["北區", "桃竹苗", "中區", "雲嘉南", "高屏", "東區"]
+
+def random_payload(rng, xlsx=False):
+    """ 隨機報價請求 (秒數只用各媒體都有定價的 10 / 20 / 30) """
+    fm = rng.choice([0, 30, 50, 70])
+    fv = rng.choice([0, 10, 20, 30])
+    media = {
+        "全家廣播": {"is_national": rng.random() < 0.5, "regions": rng.sample(REGIONS, rng.randint(1, 3)),
+                 "share": fm, "sec_shares": {str(rng.choice([10, 20, 30])): 100}},
+        "新鮮視": {"regions": rng.sample(REGIONS, rng.randint(1, 3)), "share": fv,
+                "sec_shares": {"10": 50, "20": 50}},
+        "家樂福": {"share": 100 - fm - fv, "sec_shares": {"20": 100}},
+    }
+    return {"client": f"load{rng.randint(0, 9999)}", "budget": rng.choice([300000, 1000000, 2500000]),
+            "start_date": "2025-01-01", "days": rng.choice([14, 31, 62]), "media": media, "xlsx": xlsx}
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+def _client(host, port, bodies, counter, lock, total, latencies, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    local = []
+    while True:
+        with lock:
+            i = counter[0]
+            if i >= total:
+                break
+            counter[0] += 1
+        body = bodies[i % len(bodies)]
+        t0 = time.perf_counter()
+        try:
+            conn.request("POST", "/quote", body=body, headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+        local.append(time.perf_counter() - t0)
+    conn.close()
+    with lock:
+        latencies.extend(local)
+
+def run(url, concurrency, requests, unique, xlsx_ratio, seed=0):
+    """ 回傳結果 dict (requests, seconds, rps, p50_ms, p95_ms, p99_ms, errors) """
+    rng = random.Random(seed)
+    bodies = [json.dumps(random_payload(rng, rng.random() < xlsx_ratio), ensure_ascii=False).encode("utf-8")
+              for _ in range(max(1, unique))]
+    order = [rng.randrange(len(bodies)) for _ in range(requests)]
+    bodies = [bodies[k] for k in order]
+    u = urlparse(url)
+    counter, lock, latencies, errors = [0], threading.Lock(), [], []
+    threads = [threading.Thread(target=_client, args=(u.hostname, u.port, bodies, counter, lock, requests, latencies, errors))
+               for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - t0
+    lat = sorted(latencies)
+    return {
+        "requests": requests, "seconds": elapsed, "rps": requests / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(lat, 50) * 1000, "p95_ms": percentile(lat, 95) * 1000,
+        "p99_ms": percentile(lat, 99) * 1000, "errors": len(errors),
+    }
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="報價服務壓力測試 (req/s 與 p99 延遲)")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--spawn", action="store_true", help="在隨機 port 啟動 service.py 後再測")
+    parser.add_argument("--workers", type=int, default=4, help="--spawn 時 service 的 worker 數")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時連線數 (預設 8)")
+    parser.add_argument("--requests", type=int, default=2000, help="總請求數 (預設 2000)")
+    parser.add_argument("--unique", type=int, default=100, help="不同報價組合數 (預設 100)")
+    parser.add_argument("--xlsx", type=float, default=0.0, help="附帶 xlsx 的請求比例 0~1")
+    parser.add_argument("--warmup", type=int, default=0, help="正式計時前先送的請求數")
+    args = parser.parse_args(argv)
+
+    proc = None
+    url = args.url
+    if args.spawn:
+        port = _free_port()
+        proc = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "service.py"), "--port", str(port), "--workers", str(args.workers)],
+                                stdout=subprocess.DEVNULL)
+        url = f"http://127.0.0.1:{port}"
+        if not _wait_ready("127.0.0.1", port):
+            proc.kill()
+            print("❌ service 未能啟動", file=sys.stderr)
+            return 1
+    try:
+        if args.warmup:
+            run(url, args.concurrency, args.warmup, args.unique, args.xlsx)
+        r = run(url, args.concurrency, args.requests, args.unique, args.xlsx)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    print(f"✅ {r['requests']} requests / {r['seconds']:.2f}s = {r['rps']:.0f} req/s "
+          f"(concurrency {args.concurrency}, unique {args.unique}, xlsx {args.xlsx:.0%})")
+    print(f"   latency p50 {r['p50_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms, p99 {r['p99_ms']:.1f} ms, errors {r['errors']}")
+    return 0 if r["errors"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+逐店 / 逐面播放 manifest (串流輸出)
+
+    python manifest.py quote.json --out manifest.csv.gz
+    python manifest.py quote.json --out manifest.jsonl --format jsonl --registry stores.csv --split 1000000
+
+quote.json 與 POST /quote 的 body 相同格式 (見 service.py)
+Cue 表每一列 (區域層級) 依門市清冊展開成 每店 × 每日 一列:
+    date, store_id, store_name, media, region, seconds, daypart, spots
+
+門市清冊 (--registry) 為 CSV: store_id, media, region, name
+    media 為 全家廣播 / 新鮮視 / 家樂福；region 與 Cue 表區域相同 (家樂福為 全省量販 / 全省超市)
+未指定時依價目表 store_counts 的店數 / 面數產生虛擬編號 (FM-北區-0001 ...)
+
+整條流程為 generator: 每次只組出 chunk_rows 列的文字區塊寫出，不會一次產生全部資料；
+檔名以 .gz 結尾時以 gzip 壓縮；--split N 每 N 列換下一個檔案 (name_0001.csv.gz ...)
+"""
+import os
+import re
+import sys
+import csv
+import json
+import time
+import argparse
+import tracemalloc
+from datetime import timedelta
+
+import ratecard
+from engine import plan
+from quote_request import parse_request
+from textstream import CHUNK_ROWS, csv_field, iter_chunks, open_text
+
+COLUMNS = ["date", "store_id", "store_name", "media", "region", "seconds", "daypart", "spots"]
+FORMATS = ("csv", "jsonl")
+
+# 虛擬清冊: (媒體, Cue 表區域) 對應的 store_counts 鍵與編號前綴
+_STORE_PREFIX = {"全家廣播": "FM", "新鮮視": "FV"}
+_CF_SITES = {"全省量販": ("家樂福_量販", "CF-HM"), "全省超市": ("家樂福_超市", "CF-SM")}
+
+def _count(text):
+    """ "北北基 1,649店" -> 1649 """
+    nums = re.findall(r"\d[\d,]*", str(text))
+    if not nums:
+        raise ValueError(f"無法解析店數: {text}")
+    return int(nums[-1].replace(",", ""))
+
+def synthetic_registry(card=None):
+    """ 依 store_counts 產生虛擬清冊: {(媒體, 區域): [(store_id, name)]} """
+    card = card or ratecard.current()
+    registry = {}
+    for m_type, prefix in _STORE_PREFIX.items():
+        for reg in _regions(card, m_type):
+            key = f"新鮮視_{reg}" if m_type == "新鮮視" else reg
+            n = _count(card.store_counts[key])
+            registry[(m_type, reg)] = [(f"{prefix}-{reg}-{i:04d}", f"{reg} #{i}") for i in range(1, n + 1)]
+    for reg, (key, prefix) in _CF_SITES.items():
+        n = _count(card.store_counts[key])
+        registry[("家樂福", reg)] = [(f"{prefix}-{i:04d}", f"{reg} #{i}") for i in range(1, n + 1)]
+    return registry
+
+def _regions(card, m_type):
+    """ 價目表中該媒體的實際區域 (不含 全省) """
+    return [r for r, v in card.pricing[m_type].items() if isinstance(v, list) and r != "全省"]
+
+def load_registry(path):
+    """ 讀取門市清冊 CSV -> {(媒體, 區域): [(store_id, name)]} """
+    registry = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for rec in csv.DictReader(f):
+            registry.setdefault((rec["media"].strip(), rec["region"].strip()), []).append(
+                (rec["store_id"].strip(), (rec.get("name") or "").strip()))
+    return registry
+
+# ==========================================
+# generator pipeline: 列 -> (店, 日) 記錄 -> 文字區塊 -> 檔案
+# ==========================================
+
+def _row_parts(row, fmt):
+    """ 每列固定不變的欄位先格式化一次 (media, region, seconds, daypart) """
+    if fmt == "csv":
+        return "," + ",".join(csv_field(v) for v in (row.media, row.region, row.seconds, row.daypart)) + ","
+    return "".join(f',"{k}":{json.dumps(v, ensure_ascii=False)}' for k, v in
+                   (("media", row.media), ("region", row.region), ("seconds", row.seconds), ("daypart", row.daypart))) + ',"spots":'
+
+def iter_lines(rows, start_date, registry, fmt="csv"):
+    """
+    逐店產生文字: 每次 yield 一家店在一列的所有日期 (多行字串)，以及行數
+    日期與每日檔次每列只算一次，店家之間只替換 store_id / name
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format 需為 {FORMATS}")
+    dates = None
+    for row in rows:
+        stores = registry.get((row.media, row.region))
+        if stores is None:
+            raise ValueError(f"門市清冊缺少 {row.media} / {row.region}")
+        if dates is None:
+            dates = [(start_date + timedelta(days=d)).isoformat() for d in range(row.schedule.days)]
+        days = [(dates[d], n) for d, n in enumerate(row.schedule.to_list()) if n > 0]
+        if not days:
+            continue
+        mid = _row_parts(row, fmt)
+        if fmt == "csv":
+            tails = [f"{mid}{n}\n" for _, n in days]
+            for store_id, name in stores:
+                head = f",{csv_field(store_id)},{csv_field(name)}"
+                yield "".join([d + head + t for (d, _), t in zip(days, tails)]), len(days)
+        else:
+            heads = [f'{{"date":"{d}"' for d, _ in days]
+            tails = [f"{mid}{n}}}\n" for _, n in days]
+            for store_id, name in stores:
+                sid = f',"store_id":{json.dumps(store_id, ensure_ascii=False)},"store_name":{json.dumps(name, ensure_ascii=False)}'
+                yield "".join([h + sid + t for h, t in zip(heads, tails)]), len(days)
+
+def _part_path(path, part):
+    """ manifest.csv.gz -> manifest_0001.csv.gz """
+    base, ext = path, ""
+    for suffix in (".gz", ".csv", ".jsonl"):
+        if base.endswith(suffix):
+            base, ext = base[:-len(suffix)], suffix + ext
+    return f"{base}_{part:04d}{ext}"
+
+def write_manifest(chunks, path, fmt="csv", split=None):
+    """
+    寫出區塊；split 為每個檔案的列數上限 (區塊不切開，實際列數可能略多)
+    回傳 {"rows", "bytes" (未壓縮), "files"}
+    """
+    files, rows, nbytes = [], 0, 0
+    out, in_file = None, 0
+    try:
+        for text, count in chunks:
+            if out is None or (split and in_file >= split):
+                if out is not None:
+                    out.close()
+                target = _part_path(path, len(files) + 1) if split else path
+                out = open_text(target)
+                files.append(target)
+                in_file = 0
+                if fmt == "csv":
+                    out.write(",".join(COLUMNS) + "\n")
+            out.write(text)
+            in_file += count
+            rows += count
+            nbytes += len(text.encode("utf-8"))
+    finally:
+        if out is not None:
+            out.close()
+    return {"rows": rows, "bytes": nbytes, "files": files}
+
+def export_manifest(rows, start_date, path, registry=None, fmt="csv", split=None, chunk_rows=CHUNK_ROWS):
+    """ 計算明細列的 manifest 並寫檔；回傳 write_manifest 的結果加上 seconds / rows_per_sec """
+    registry = registry if registry is not None else synthetic_registry()
+    t0 = time.perf_counter()
+    stats = write_manifest(iter_chunks(iter_lines(rows, start_date, registry, fmt), chunk_rows), path, fmt, split)
+    stats["seconds"] = time.perf_counter() - t0
+    stats["rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="逐店 / 逐面播放 manifest 串流輸出")
+    parser.add_argument("quote", help="報價 JSON (與 POST /quote 相同格式)")
+    parser.add_argument("--out", required=True, help="輸出路徑，.gz 結尾時壓縮")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="csv / jsonl (預設依副檔名)")
+    parser.add_argument("--registry", help="門市清冊 CSV (預設依店數產生虛擬清冊)")
+    parser.add_argument("--split", type=int, default=None, help="每個檔案最多幾列")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help=f"每次寫出的列數 (預設 {CHUNK_ROWS})")
+    parser.add_argument("--no-trace", action="store_true", help="不量測峰值記憶體 (tracemalloc 會拖慢約 1 倍)")
+    args = parser.parse_args(argv)
+    fmt = args.format or ("jsonl" if ".jsonl" in args.out else "csv")
+
+    try:
+        with open(args.quote, encoding="utf-8") as f:
+            config_media, budget, start, days, _ = parse_request(json.load(f))
+        result = plan(config_media, budget, days)
+        registry = load_registry(args.registry) if args.registry else synthetic_registry()
+        if not args.no_trace:
+            tracemalloc.start()
+        stats = export_manifest(result["rows"], start, args.out, registry, fmt, args.split, args.chunk_rows)
+        peak = tracemalloc.get_traced_memory()[1] if not args.no_trace else None
+    except (OSError, ValueError) as e:   # 含 BadRequest / UnpricedError / 清冊缺區域
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        tracemalloc.stop()
+
+    size = sum(os.path.getsize(p) for p in stats["files"])
+    print(f"✅ {stats['rows']:,} 列 -> {', '.join(stats['files'])} ({size / 1e6:.1f} MB on disk)")
+    print(f"   耗時 {stats['seconds']:.2f}s, {stats['rows_per_sec']:,.0f} 列/秒, "
+          f"{stats['bytes'] / 1e6 / stats['seconds'] if stats['seconds'] > 0 else 0:.1f} MB/s (未壓縮)"
+          + (f", 峰值記憶體 {peak / 1024 / 1024:.1f} MiB" if peak is not None else ""))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import io
+import os
+import json
+import time
+import pstats
+import logging
+import cProfile
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================
+# 分段計時 / 結構化 log / Prometheus 文字格式 / cProfile
+# ==========================================
+# with stage("html_render"): ...      計時一段程式，同時:
+#   1. 記入目前這次執行的 Run (collect() 內，UI 顯示本次 rerun 各階段耗時)
+#   2. 累計到全域 histogram (prometheus_text() / /metrics 輸出)
+#   3. 以 JSON 寫一行 log (logger "cue.metrics"，CUE_METRICS_LOG=1 時輸出到 stderr)
+# payload("xlsx", n) 記錄下載內容大小 (bytes)
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+logger = logging.getLogger("cue.metrics")
+if os.environ.get("CUE_METRICS_LOG", "0") not in ("", "0"):
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+class Run:
+    """ 單次執行 (一次 rerun / 一個請求) 的各階段紀錄 """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages = []     # [(stage, labels, seconds)]
+        self.payloads = []   # [(kind, bytes)]
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def rows(self):
+        """ 給 st.dataframe 顯示: 同名階段 (例如每個媒體) 各自一列 """
+        out = [{"階段": s + ("" if not labels else " " + " ".join(f"{v}" for v in labels.values())),
+                "耗時 (ms)": round(sec * 1000, 3)} for s, labels, sec in self.stages]
+        out += [{"階段": f"{kind} 大小", "耗時 (ms)": None, "大小 (bytes)": n} for kind, n in self.payloads]
+        return out
+
+_current = contextvars.ContextVar("cue_metrics_run", default=None)
+
+@contextmanager
+def collect(name="run"):
+    """ 收集區塊內所有 stage / payload 紀錄，yield Run """
+    run = Run(name)
+    token = _current.set(run)
+    try:
+        yield run
+    finally:
+        _current.reset(token)
+
+def begin_run(name="run"):
+    """ 之後的 stage / payload 記入新的 Run (Streamlit 腳本無法整段包在 with 內時使用) """
+    run = Run(name)
+    _current.set(run)
+    return run
+
+class _Registry:
+    """ 全域累計: stage histogram 與 payload 大小 (執行緒安全) """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hist = {}       # (stage, labels) -> [bucket counts..., count, sum]
+        self.bytes = {}      # kind -> [count, sum, last]
+        self.collectors = []
+
+    def observe(self, stage_name, labels, seconds):
+        key = (stage_name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.hist.get(key)
+            if h is None:
+                h = self.hist[key] = [0] * (len(BUCKETS) + 2)
+            for i, b in enumerate(BUCKETS):
+                if seconds <= b:
+                    h[i] += 1
+            h[-2] += 1
+            h[-1] += seconds
+
+    def observe_bytes(self, kind, n):
+        with self.lock:
+            b = self.bytes.setdefault(kind, [0, 0, 0])
+            b[0] += 1
+            b[1] += n
+            b[2] = n
+
+REGISTRY = _Registry()
+
+def record(stage_name, seconds, **labels):
+    """ 記錄一段已量好的耗時 (秒) """
+    run = _current.get()
+    if run is not None:
+        run.stages.append((stage_name, labels, seconds))
+    REGISTRY.observe(stage_name, labels, seconds)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": "stage", "stage": stage_name, "ms": round(seconds * 1000, 3),
+                                "run": run.name if run else None, **labels}, ensure_ascii=False))
+
+@contextmanager
+def stage(stage_name, **labels):
+    """ 計時 with 區塊 """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage_name, time.perf_counter() - t0, **labels)
+
+def payload(kind, n):
+    """ 記錄輸出內容大小 (bytes) """
+    run = _current.get()
+    if run is not None:
+        run.payloads.append((kind, n))
+    REGISTRY.observe_bytes(kind, n)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": "payload", "kind": kind, "bytes": n, "run": run.name if run else None},
+                               ensure_ascii=False))
+
+def register_collector(fn):
+    """ fn() -> {metric 名稱: 數值}，輸出 /metrics 時呼叫 (例如快取統計) """
+    REGISTRY.collectors.append(fn)
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+def prometheus_text():
+    """ Prometheus text exposition format """
+    lines = ["# HELP cue_stage_seconds Stage duration in seconds", "# TYPE cue_stage_seconds histogram"]
+    with REGISTRY.lock:
+        hist = {k: list(v) for k, v in REGISTRY.hist.items()}
+        sizes = {k: list(v) for k, v in REGISTRY.bytes.items()}
+    for (name, pairs), h in sorted(hist.items()):
+        base = (("stage", name),) + pairs
+        for i, b in enumerate(BUCKETS):
+            lines.append(f"cue_stage_seconds_bucket{_labels(base + (('le', b),))} {h[i]}")
+        lines.append(f"cue_stage_seconds_bucket{_labels(base + (('le', '+Inf'),))} {h[-2]}")
+        lines.append(f"cue_stage_seconds_count{_labels(base)} {h[-2]}")
+        lines.append(f"cue_stage_seconds_sum{_labels(base)} {h[-1]:.6f}")
+    lines += ["# HELP cue_payload_bytes Output payload size in bytes", "# TYPE cue_payload_bytes summary"]
+    for kind, (count, total, last) in sorted(sizes.items()):
+        lines.append(f"cue_payload_bytes_count{_labels((('kind', kind),))} {count}")
+        lines.append(f"cue_payload_bytes_sum{_labels((('kind', kind),))} {total}")
+        lines.append(f"cue_payload_last_bytes{_labels((('kind', kind),))} {last}")
+    for fn in REGISTRY.collectors:
+        for name, value in fn().items():
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+# ==========================================
+# /metrics HTTP endpoint (Streamlit 無法加路由，另開一個 port)
+# ==========================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_http_server(port, host="127.0.0.1"):
+    """ 背景 thread 提供 GET /metrics；同一 process 只會啟動一次 (Streamlit rerun 重複呼叫無妨) """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True, name="cue-metrics").start()
+    return _server
+
+# ==========================================
+# cProfile (選用)
+# ==========================================
+
+def profiling_requested(query_value=None):
+    """ CUE_PROFILE=1 或網址參數 ?profile=1 時開啟 """
+    return os.environ.get("CUE_PROFILE", "0") not in ("", "0") or str(query_value or "0") not in ("", "0")
+
+def start_profile():
+    """ 開始 cProfile；之後以 stop_profile() 取得結果 """
+    prof = cProfile.Profile()
+    prof.enable()
+    return prof
+
+def stop_profile(prof, top=30):
+    """ 停止 cProfile，回傳 (.prof 檔內容 bytes, 依累計時間排序的前 top 名摘要文字) """
+    prof.disable()
+    buf = io.StringIO()
+    pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(top)
+    with tempfile.NamedTemporaryFile(suffix=".prof", delete=False) as f:
+        path = f.name
+    try:
+        prof.dump_stats(path)
+        with open(path, "rb") as f:
+            stats = f.read()
+    finally:
+        os.unlink(path)
+    return stats, buf.getvalue()
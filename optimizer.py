@@ -0,0 +1,163 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import ratecard
+from engine import MEDIA_PREFIX, line_constants, line_spots, plan_many
+
+# ==========================================
+# 預算配置建議: 搜尋 媒體佔比 × 秒數佔比，使總檔次 (或牌價) 最大
+# ==========================================
+# 每條明細線的結果只與自己的預算有關 (可分離)，因此:
+#   1. 每個 (媒體, 秒數) 先向量化算出所有 (媒體佔比, 秒數佔比) 格點的結果
+#   2. 同一媒體內枚舉秒數佔比組合，每個媒體佔比只留前 N 名
+#   3. 跨媒體以動態規劃合併 (狀態 = 已分配佔比)，每個狀態只留前 N 名
+# 排序鍵 = 目標值 × 64 - 觸發 x1.1 的明細線數 (目標相同時偏好不觸發懲罰)
+
+OBJECTIVES = {"spots": "total_spots", "list": "total_list"}
+OBJECTIVE_LABELS = {"總檔次最大": "spots", "牌價總額最大": "list"}
+MAX_COMPOSITIONS = 200000
+
+def _compositions(units, mins):
+    """ 各項 >= mins[i] 且加總為 units 的所有整數組合，回傳 (n, len(mins)) 陣列 """
+    free = units - sum(mins)
+    k = len(mins)
+    if free < 0:
+        return np.zeros((0, k), dtype=np.int64)
+    if k == 1:
+        return np.array([[units]], dtype=np.int64)
+    # stars and bars: 在 free + k - 1 個位置中選 k - 1 個隔板
+    bars = np.array(list(itertools.combinations(range(free + k - 1), k - 1)), dtype=np.int64).reshape(-1, k - 1)
+    edges = np.hstack([np.full((len(bars), 1), -1), bars, np.full((len(bars), 1), free + k - 1)])
+    return np.diff(edges, axis=1) - 1 + np.array(mins, dtype=np.int64)
+
+def _line_keys(m_type, is_nat, regions, sec, budget, units, step, objective, card):
+    """ 單一 (媒體, 秒數) 在所有 (媒體佔比格, 秒數佔比格) 的排序鍵，shape (units + 1, units + 1) """
+    net_unit, std, nat_rate, list_rate, n_rows, super_ratio = line_constants(m_type, is_nat, regions, sec, card)
+    shares = np.arange(units + 1) * step
+    # 與 plan() 相同的運算順序: 總預算 × (媒體% / 100) × (秒數% / 100)
+    sec_budget = (budget * (shares / 100.0))[:, None] * (shares / 100.0)[None, :]
+    valid = sec_budget > 0
+    spots, under, _ = line_spots(np.where(valid, sec_budget, 1.0), net_unit, std)
+    if objective == "spots":
+        value = spots * n_rows + (spots * super_ratio).astype(np.int64)
+    elif nat_rate > 0:
+        value = np.floor(nat_rate * spots).astype(np.int64)
+    else:
+        value = list_rate * spots
+    return np.where(valid, value * 64 - under, 0)
+
+def _top_rows(keys, top_n):
+    """ 每列取前 top_n 大的欄位索引 (依鍵值遞減) """
+    k = min(top_n, keys.shape[1])
+    idx = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(keys, idx, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1)
+
+def _media_candidates(m_type, cfg, budget, units, step, objective, top_n, min_units, required, card):
+    """
+    單一媒體: 每個媒體佔比格回傳前 N 名秒數組合
+    回傳 (secs, comps, {媒體佔比格: (keys, comp 索引)})
+    """
+    secs = sorted(cfg["seconds"])
+    is_nat = cfg.get("is_national", True) if m_type != "家樂福" else True
+    regions = ["全省"] if m_type == "家樂福" else cfg["regions"]
+    comps = _compositions(units, [1 if s in required else 0 for s in secs])
+    if len(comps) > MAX_COMPOSITIONS:
+        raise ValueError(f"{m_type} 秒數組合過多 ({len(comps):,})，請加大佔比級距或減少秒數")
+
+    totals = np.zeros((units + 1, len(comps)), dtype=np.int64)
+    for i, sec in enumerate(secs):
+        totals += _line_keys(m_type, is_nat, regions, sec, budget, units, step, objective, card)[:, comps[:, i]]
+
+    cands = {}
+    best = _top_rows(totals, top_n) if len(comps) else None
+    for m_u in range(min_units, units + 1):
+        if m_u == 0:
+            cands[0] = (np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64))
+        elif len(comps):
+            cands[m_u] = (totals[m_u, best[m_u]], best[m_u])
+    return secs, comps, cands
+
+def _is_priced(m_type, cfg):
+    if not cfg.get("seconds"):
+        return False
+    if m_type == "家樂福" or cfg.get("is_national"):
+        return True
+    return bool(cfg.get("regions"))
+
+def optimize(config_media, total_budget, objective="spots", step=5, top_n=10, min_shares=None, required_secs=None, card=None):
+    """
+    在 config_media 的 媒體 / 區域 / 秒數 範圍內，搜尋總和 100% 的佔比配置
+    objective: "spots" = 總檔次最大 / "list" = 牌價總額最大
+    step: 佔比級距 (%)，需整除 100
+    min_shares: {媒體: 最低佔比%}；required_secs: {媒體: [必須投放的秒數]} (佔比至少一個級距)
+    回傳前 top_n 名 DataFrame (rank, <prefix>_share, <prefix>_secs, total_spots, total_list, discount_ratio, under_target_lines)
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective 需為 {list(OBJECTIVES)}")
+    if step <= 0 or 100 % step:
+        raise ValueError("佔比級距需整除 100")
+    card = card or ratecard.current()
+    min_shares = min_shares or {}
+    required_secs = required_secs or {}
+    units = 100 // step
+
+    media = []
+    for m_type, cfg in config_media.items():
+        required = set(required_secs.get(m_type, [])) & set(cfg.get("seconds", []))
+        min_units = -(-int(min_shares.get(m_type, 0)) // step)
+        if required:
+            min_units = max(min_units, 1)
+        if not _is_priced(m_type, cfg):
+            if min_units > 0:
+                return pd.DataFrame()
+            continue
+        secs, comps, cands = _media_candidates(m_type, cfg, total_budget, units, step, objective,
+                                               top_n, min_units, required, card)
+        media.append((m_type, secs, comps, cands))
+    if not media:
+        return pd.DataFrame()
+
+    # 跨媒體 DP: state[已分配格數] = (keys, 各媒體選擇 [(媒體佔比格, comp 索引), ...])
+    states = {0: (np.zeros(1, dtype=np.int64), [()])}
+    for _, _, _, cands in media:
+        merged = {}
+        for used, (keys, picks) in states.items():
+            for m_u, (c_keys, c_idx) in cands.items():
+                total = used + m_u
+                if total > units:
+                    continue
+                sums = (keys[:, None] + c_keys[None, :]).ravel()
+                new_picks = [p + ((m_u, c),) for p in picks for c in c_idx]
+                if total in merged:
+                    sums = np.concatenate([merged[total][0], sums])
+                    new_picks = merged[total][1] + new_picks
+                keep = np.argsort(-sums, kind="stable")[:top_n]
+                merged[total] = (sums[keep], [new_picks[k] for k in keep])
+        states = merged
+    if units not in states:
+        return pd.DataFrame()
+
+    records = []
+    for pick in states[units][1]:
+        brief = {"budget": total_budget, "days": 1}
+        for (m_type, secs, comps, _), (m_u, c) in zip(media, pick):
+            prefix = {v: k for k, v in MEDIA_PREFIX.items()}[m_type]
+            cfg = config_media[m_type]
+            brief[f"{prefix}_share"] = m_u * step
+            brief[f"{prefix}_secs"] = ",".join(f"{s}:{u * step}" for s, u in zip(secs, comps[c]))
+            if m_type != "家樂福":
+                brief[f"{prefix}_regions"] = "全省" if cfg.get("is_national") else ",".join(cfg["regions"])
+        records.append(brief)
+
+    # 以 plan_many 重算前 N 名 (與逐筆 plan() 結果一致)，順便取得折扣率等摘要
+    briefs = pd.DataFrame.from_records(records)
+    _, summary = plan_many(briefs, card=card)
+    out = briefs.drop(columns=["budget", "days"])
+    for col in ("total_spots", "total_list", "discount_ratio", "under_target_lines"):
+        out[col] = summary[col].to_numpy()
+    out = out.sort_values([OBJECTIVES[objective], "under_target_lines"], ascending=[False, True], kind="stable")
+    out.insert(0, "rank", np.arange(1, len(out) + 1))
+    return out.reset_index(drop=True)
@@ -0,0 +1,138 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# ==========================================
+# 播放清單 (playlist): 每日檔次展開到 Day_Part 時段內的分鐘 / 小時
+# ==========================================
+# 同一素材 (媒體 + 區域 + 地點) 的各秒數版本合併排成一條序列，在時段內等距排開:
+#   當天共 n 檔、時段長 W 分鐘 -> 第 j 檔在 start + floor((2j+1)·W / 2n)
+# 各版本依比例交錯 (第 k 檔的排序鍵 = (k+0.5) / 該版本當日檔次)，
+# 同一素材任兩檔的間隔因此最大 (約 W/n 分鐘)；低於 separation 分鐘的日子列為違規。
+# 全部以 numpy 陣列計算，不逐檔迴圈 (365 天全省計畫每區數萬檔)
+
+DEFAULT_SEPARATION = 5     # 同素材兩檔最少間隔 (分鐘)
+RESOLUTIONS = ("minute", "hour")
+CLOCK = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)], dtype=object)
+
+def parse_daypart(text):
+    """ "07:00-23:00" -> (420, 1380) 分鐘 """
+    start, end = text.split("-")
+    h1, m1 = start.split(":")
+    h2, m2 = end.split(":")
+    lo, hi = int(h1) * 60 + int(m1), int(h2) * 60 + int(m2)
+    if not 0 <= lo < hi <= 24 * 60:
+        raise ValueError(f"時段格式錯誤: {text}")
+    return lo, hi
+
+class Playlist:
+    """
+    陣列儲存的播放清單，每檔一筆:
+    row (對應 rows 的索引)、day (第幾天，0 起算)、minute (當日第幾分鐘)
+    依 (素材, 日, 分鐘) 排序
+    """
+    __slots__ = ("rows", "group", "row", "day", "minute")
+
+    def __init__(self, rows, group, row, day, minute):
+        self.rows = rows
+        self.group = group       # 每個 row 所屬素材編號 (np.ndarray)
+        self.row = row
+        self.day = day
+        self.minute = minute
+
+    def __len__(self):
+        return len(self.row)
+
+    def hourly(self):
+        """ 每 (row, 日, 小時) 的檔次，回傳 (row, day, hour, spots) 四個陣列 """
+        n_days = int(self.day.max()) + 1 if len(self) else 1
+        cell = (self.row.astype(np.int64) * n_days + self.day) * 24 + self.minute // 60
+        keys, counts = np.unique(cell, return_counts=True)
+        return keys // 24 // n_days, keys // 24 % n_days, keys % 24, counts
+
+    def min_gaps(self):
+        """ 每 (素材, 日) 相鄰兩檔的最小間隔 (分鐘)，回傳 (group, day, gap)；當天只有 1 檔的不列入 """
+        if len(self) < 2:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        n_days = int(self.day.max()) + 1
+        g = self.group[self.row]
+        same = (g[1:] == g[:-1]) & (self.day[1:] == self.day[:-1])
+        diffs = np.diff(self.minute)[same]
+        cell = (g[1:] * n_days + self.day[1:])[same]
+        keys, first = np.unique(cell, return_index=True)   # 已依 (素材, 日) 排序，first 即各段起點
+        gaps = np.minimum.reduceat(diffs, first) if len(diffs) else diffs
+        return keys // n_days, keys % n_days, gaps
+
+    def violations(self, separation=DEFAULT_SEPARATION):
+        """ 間隔不足 separation 分鐘的 (素材, 日) 數 """
+        return int((self.min_gaps()[2] < separation).sum())
+
+    def to_frame(self, start_date, resolution="minute"):
+        """
+        minute: 每檔一列 (date, time, media, region, location, daypart, seconds)
+        hour:   每 (日, 小時, 版本) 一列，spots 為檔次
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution 需為 {RESOLUTIONS}")
+        if resolution == "minute":
+            row, day = self.row, self.day
+            extra = {"time": CLOCK[self.minute]}
+        else:
+            row, day, hour, spots = self.hourly()
+            extra = {"hour": hour, "spots": spots}
+        n_days = int(day.max()) + 1 if len(day) else 0
+        dates = pd.date_range(start_date, periods=n_days).strftime("%Y-%m-%d").to_numpy(dtype=object)
+        meta = pd.DataFrame([{"media": r.media, "region": r.region, "location": r.location,
+                              "daypart": r.daypart, "seconds": r.seconds} for r in self.rows])
+        df = meta.iloc[row].reset_index(drop=True) if len(self.rows) else meta
+        df.insert(0, "date", dates[day])
+        for pos, (col, values) in enumerate(extra.items(), start=1):
+            df.insert(pos, col, values)
+        return df
+
+    def to_csv(self, start_date, resolution="minute"):
+        """ CSV bytes (utf-8-sig，Excel 直接開啟不亂碼) """
+        buf = io.BytesIO()
+        self.to_frame(start_date, resolution).to_csv(buf, index=False, encoding="utf-8-sig")
+        return buf.getvalue()
+
+def build_playlist(rows):
+    """
+    rows: plan() 的明細列 (CueRow)，回傳 Playlist
+    每列的每日檔次取自 schedule，時段取自 daypart
+    """
+    with metrics.stage("playlist"):
+        n_rows = len(rows)
+        days = rows[0].schedule.days if rows else 0
+        group_ids = {}
+        group = np.array([group_ids.setdefault((r.media, r.region, r.location), len(group_ids)) for r in rows], dtype=np.int64)
+        window = np.array([parse_daypart(r.daypart) for r in rows], dtype=np.int64).reshape(n_rows, 2)
+        counts = np.array([r.schedule.as_array() for r in rows], dtype=np.int64).reshape(n_rows, days)
+
+        # 每 (素材, 日) 當天總檔次
+        per_group = np.zeros((len(group_ids), days), dtype=np.int64)
+        np.add.at(per_group, group, counts)
+
+        # 展開成每檔一筆: cell = row * days + day，k = 該 row 當天第幾檔
+        flat = counts.ravel()
+        total = int(flat.sum())
+        cell = np.repeat(np.arange(flat.size, dtype=np.int64), flat)
+        k = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(flat) - flat, flat)
+        row, day = cell // max(days, 1), cell % max(days, 1)
+        share_key = (2 * k + 1) / (2 * flat[cell])
+
+        # 同素材同日排在一起，版本依比例交錯
+        g = group[row]
+        order = np.lexsort((row, share_key, day, g))
+        row, day, g = row[order], day[order], g[order]
+        gd = g * days + day
+        rank = np.arange(total, dtype=np.int64) - np.searchsorted(gd, gd, side="left")
+
+        n = per_group[g, day]
+        lo, hi = window[row, 0], window[row, 1]
+        minute = lo + (2 * rank + 1) * (hi - lo) // (2 * n)
+        return Playlist(rows, group, row.astype(np.int32), day.astype(np.int32), minute.astype(np.int16))
@@ -0,0 +1,69 @@
+"""
+報價請求解析: JSON body (service.py 的 POST /quote 等、manifest.py / schedule_export.py 的報價 JSON)
+-> (config_media, budget, start_date, days, client)
+
+不依賴 HTTP 服務 / 庫存帳 / 報價歷史 / xlsxwriter，CLI 可直接匯入
+"""
+from datetime import date
+
+from engine import MEDIA_ORDER_MAP, brief_to_config
+
+MAX_DAYS = 366   # 走期上限 (每列排程依天數展開)
+
+class BadRequest(ValueError):
+    """ 請求內容錯誤 (HTTP 400) """
+
+def _is_percent(v):
+    """ 0 ~ 100 的數字 (bool 不算) """
+    return isinstance(v, (int, float)) and not isinstance(v, bool) and 0 <= v <= 100
+
+def _normalize_media(media):
+    """ API 的 media 設定 -> 與 UI 相同格式的 config_media (plan_key 相同，快取可與 UI 共用) """
+    if not isinstance(media, dict):
+        raise BadRequest("media 需為 JSON 物件 (媒體 -> 設定)")
+    config_media = {}
+    for m_type, cfg in sorted(media.items(), key=lambda kv: MEDIA_ORDER_MAP.get(kv[0], 99)):
+        if m_type not in MEDIA_ORDER_MAP:
+            raise BadRequest(f"未知媒體: {m_type}")
+        if not isinstance(cfg, dict) or not isinstance(cfg.get("sec_shares", {}), dict):
+            raise BadRequest(f"{m_type} 設定與 sec_shares 需為 JSON 物件")
+        try:
+            sec_shares = {int(s): v for s, v in sorted(cfg.get("sec_shares", {}).items(), key=lambda kv: int(kv[0]))}
+        except ValueError:
+            raise BadRequest(f"{m_type} sec_shares 的秒數需為整數")
+        if not all(_is_percent(v) for v in sec_shares.values()):
+            raise BadRequest(f"{m_type} sec_shares 的佔比需為 0 ~ 100 的數字")
+        if not _is_percent(cfg.get("share", 0)):
+            raise BadRequest(f"{m_type} share 需為 0 ~ 100 的數字")
+        out = {"seconds": list(sec_shares), "share": cfg.get("share", 0), "sec_shares": sec_shares}
+        if m_type == "家樂福":
+            out["regions"] = ["全省"]
+        else:
+            regions = cfg.get("regions") or []
+            if not isinstance(regions, list) or not all(isinstance(r, str) for r in regions):
+                raise BadRequest(f"{m_type} regions 需為區域名稱的清單")
+            out["is_national"] = bool(cfg.get("is_national", not regions))
+            out["regions"] = ["全省"] if out["is_national"] else list(regions)
+        config_media[m_type] = out
+    return config_media
+
+def parse_request(payload):
+    """ 回傳 (config_media, budget, start_date, days, client) """
+    if not isinstance(payload, dict):
+        raise BadRequest("body 需為 JSON 物件")
+    try:
+        budget = payload["budget"]
+        start = date.fromisoformat(payload.get("start_date", "2025-01-01"))
+        if "days" in payload:
+            days = int(payload["days"])
+        else:
+            days = (date.fromisoformat(payload["end_date"]) - start).days + 1
+    except (KeyError, TypeError, ValueError) as e:
+        raise BadRequest(f"budget / start_date / end_date (或 days) 格式錯誤: {e}")
+    if not isinstance(budget, (int, float)) or isinstance(budget, bool) or not 0 < days <= MAX_DAYS:
+        raise BadRequest(f"budget 需為數字且走期為 1 ~ {MAX_DAYS} 天")
+    if "media" in payload:
+        config_media = _normalize_media(payload["media"])
+    else:
+        config_media = brief_to_config(payload)
+    return config_media, budget, start, days, str(payload.get("client", ""))
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import numpy as np
+
+# ==========================================
+# 價目表 (rate card): 由版本化 JSON 檔載入，預先算好查表陣列
+# ==========================================
+# 檔案格式 (ratecards/ratecard.json):
+#   version       版本名稱，實際版本 = "<version>-<檔案內容 SHA-256 前 8 碼>"
+#   store_counts  各區店數 / 面數 (報表 Program 欄)
+#   pricing       媒體 -> {Std_Spots, Base_Sec, Day_Part, 區域: [List, Net]}
+#                 (家樂福為 量販_全省 / 超市_全省 -> {List, Net, Std_Spots, Day_Part})
+#   sec_factors   媒體 -> {秒數: 係數}；未列出的秒數視為未定價，不可報價
+#
+# 每個 process 只建一次，所有 session 共用；檔案 mtime 改變時比對雜湊，
+# 內容不同才重建，建好後一次替換 (讀取端拿到的永遠是完整的一份)。
+
+RATECARD_PATH = os.environ.get("CUE_RATECARD", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ratecards", "ratecard.json"))
+CHECK_INTERVAL = float(os.environ.get("CUE_RATECARD_CHECK_SECS", "2"))
+
+class UnpricedError(ValueError):
+    """ 價目表沒有此 (媒體, 區域, 秒數) 的價格 """
+
+class RateCard:
+    """
+    單一版本的價目表 (建立後不再修改)
+    unit_net / unit_list: float64 陣列 [媒體, 區域, 秒數] = (Net 或 List / Std_Spots) × 秒數係數，未定價為 NaN
+    std: [媒體, 區域] 基準檔次
+    """
+
+    def __init__(self, data, version):
+        self.version = version
+        self.pricing = data["pricing"]
+        self.store_counts = data["store_counts"]
+        self.sec_factors = {m: {int(s): float(f) for s, f in fs.items()} for m, fs in data["sec_factors"].items()}
+
+        self.media = list(self.pricing)
+        self.regions = []
+        for entries in self.pricing.values():
+            for key, val in entries.items():
+                if isinstance(val, (list, dict)) and key not in self.regions:
+                    self.regions.append(key)
+        self.seconds = sorted({s for fs in self.sec_factors.values() for s in fs})
+        self.media_idx = {m: i for i, m in enumerate(self.media)}
+        self.region_idx = {r: i for i, r in enumerate(self.regions)}
+        self.sec_idx = {s: i for i, s in enumerate(self.seconds)}
+
+        shape = (len(self.media), len(self.regions), len(self.seconds))
+        self.unit_net = np.full(shape, np.nan)
+        self.unit_list = np.full(shape, np.nan)
+        self.std = np.zeros(shape[:2])
+        for m, entries in self.pricing.items():
+            mi = self.media_idx[m]
+            for reg, val in entries.items():
+                if isinstance(val, list):
+                    list_p, net_p, std = val[0], val[1], entries["Std_Spots"]
+                elif isinstance(val, dict):
+                    list_p, net_p, std = val["List"], val["Net"], val["Std_Spots"]
+                else:
+                    continue
+                ri = self.region_idx[reg]
+                self.std[mi, ri] = std
+                for sec, factor in self.sec_factors.get(m, {}).items():
+                    # 與原本逐筆計算相同的運算順序，結果逐位元一致
+                    self.unit_net[mi, ri, self.sec_idx[sec]] = (net_p / std) * factor
+                    self.unit_list[mi, ri, self.sec_idx[sec]] = (list_p / std) * factor
+        # 逐筆計算 (plan) 用 Python float 查表，省去 numpy scalar 轉換
+        self._net = self.unit_net.tolist()
+        self._list = self.unit_list.tolist()
+
+    def priced_seconds(self, media_type):
+        """ 該媒體有定價的秒數 (由小到大) """
+        return sorted(self.sec_factors.get(media_type, {}))
+
+    def factor(self, media_type, seconds):
+        factors = self.sec_factors.get(media_type, {})
+        if seconds not in factors:
+            raise UnpricedError(f"{media_type} 未定價秒數: {seconds}秒 (價目表 {self.version})")
+        return factors[seconds]
+
+    def _index(self, media_type, region, seconds):
+        self.factor(media_type, seconds)
+        if region not in self.region_idx:
+            raise UnpricedError(f"{media_type} 未定價區域: {region} (價目表 {self.version})")
+        return self.media_idx[media_type], self.region_idx[region], self.sec_idx[seconds]
+
+    def net_unit(self, media_type, region, seconds):
+        """ (Net / Std_Spots) × 秒數係數 """
+        mi, ri, si = self._index(media_type, region, seconds)
+        value = self._net[mi][ri][si]
+        if value != value:
+            raise UnpricedError(f"{media_type} {region} 未定價 (價目表 {self.version})")
+        return value
+
+    def list_unit(self, media_type, region, seconds):
+        """ (List / Std_Spots) × 秒數係數 """
+        mi, ri, si = self._index(media_type, region, seconds)
+        value = self._list[mi][ri][si]
+        if value != value:
+            raise UnpricedError(f"{media_type} {region} 未定價 (價目表 {self.version})")
+        return value
+
+    def std_spots(self, media_type, region=None):
+        if region is None:
+            return self.pricing[media_type]["Std_Spots"]
+        return self.pricing[media_type][region]["Std_Spots"]
+
+def load_ratecard(path=RATECARD_PATH):
+    """ 讀檔並建立 RateCard；回傳 (RateCard, 內容雜湊) """
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    data = json.loads(raw.decode("utf-8"))
+    return RateCard(data, f"{data.get('version', 'ratecard')}-{digest[:8]}"), digest
+
+class _Active:
+    """ 目前生效的價目表與熱更新狀態 """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.card, self.digest = load_ratecard(path)
+        self.stat = self._stat()
+        self.checked = time.monotonic()
+        self.error = ""
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.checked < CHECK_INTERVAL:
+            return self.card
+        if not self.lock.acquire(blocking=False):
+            return self.card   # 其他 thread 正在檢查，先沿用舊版
+        try:
+            self.checked = now
+            stat = self._stat()
+            if stat != self.stat or force:
+                card, digest = load_ratecard(self.path)
+                self.stat = stat
+                if digest != self.digest:
+                    self.card, self.digest = card, digest
+                self.error = ""
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # 檔案寫到一半 / 格式錯誤: 保留舊版，下次檢查再試
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.lock.release()
+        return self.card
+
+_active = _Active(RATECARD_PATH)
+
+def current():
+    """ 目前生效的 RateCard (每 CHECK_INTERVAL 秒最多檢查一次檔案) """
+    return _active.refresh()
+
+def reload(force=True):
+    """ 立即重新檢查價目表檔案 """
+    return _active.refresh(force=force)
+
+def last_error():
+    """ 最近一次重新載入失敗的原因 (成功為空字串) """
+    return _active.error
@@ -0,0 +1,161 @@
+from datetime import timedelta
+
+from engine import MEDIA_ORDER_MAP
+
+# ==========================================
+# HTML 預覽 (一次組裝 + 月 / 週分頁)
+# ==========================================
+
+WEEKDAYS_ZH = ["一", "二", "三", "四", "五", "六", "日"]
+
+CSS_STYLE = """
+    <style>
+        .preview-table { width: 100%; border-collapse: collapse; font-family: "Microsoft JhengHei", "Arial", sans-serif; font-size: 13px; color: #000; min-width: 1200px; background-color: #ffffff; }
+        .preview-table th, .preview-table td { border: 1px solid #555; padding: 8px; text-align: center; vertical-align: middle; }
+        .header-blue { background-color: #2c3e50; color: white !important; font-weight: bold; }
+        .header-yellow { background-color: #f1c40f; color: #000 !important; font-weight: bold; }
+        .cell-yellow { background-color: #fff3cd; color: #000 !important; font-weight: bold; }
+        .row-total { background-color: #d4edda; color: #000 !important; font-weight: bold; }
+        .row-grand-total { background-color: #ffc107; color: #000 !important; font-weight: bold; font-size: 15px; border-top: 2px solid #000; }
+        .align-left { text-align: left; }
+        .align-right { text-align: right; }
+        tr:nth-child(even) { background-color: #f2f2f2; }
+        tr:hover { background-color: #e6f7ff; }
+    </style>
+    """
+
+WINDOW_MODES = {"全部": "all", "月": "month", "週": "week"}
+
+def iter_windows(start_dt, days_cnt, mode="all"):
+    """
+    切分顯示區間，回傳 [(label, offset, length)]
+    mode: all = 整個走期 / month = 每個月一頁 / week = 每 7 天一頁
+    """
+    if mode == "all" or days_cnt <= 0:
+        return [("全部", 0, max(days_cnt, 0))]
+    windows = []
+    if mode == "week":
+        for offset in range(0, days_cnt, 7):
+            length = min(7, days_cnt - offset)
+            first = start_dt + timedelta(days=offset)
+            last = first + timedelta(days=length - 1)
+            windows.append((f"{first.month}/{first.day} - {last.month}/{last.day}", offset, length))
+        return windows
+    offset = 0
+    curr = start_dt
+    while offset < days_cnt:
+        # 到下個月 1 號為止
+        next_month = (curr.replace(day=28) + timedelta(days=4)).replace(day=1)
+        length = min((next_month - curr).days, days_cnt - offset)
+        windows.append((f"{curr.year}年{curr.month}月", offset, length))
+        offset += length
+        curr = next_month
+    return windows
+
+def _month_header(start_dt, offset, length, show_year):
+    """ 區間內每個月一格，colspan = 該月天數 """
+    cells = []
+    curr = start_dt + timedelta(days=offset)
+    remaining = length
+    while remaining > 0:
+        next_month = (curr.replace(day=28) + timedelta(days=4)).replace(day=1)
+        span = min((next_month - curr).days, remaining)
+        label = f"{curr.year}/{curr.month}月" if show_year else f"{curr.month}月"
+        cells.append(f"<th class='header-blue' colspan='{span}'>{label}</th>")
+        remaining -= span
+        curr = next_month
+    return "".join(cells)
+
+def generate_html_preview(rows, days_cnt, start_dt, c_name, products, total_list, grand_total, budget, prod, window=None):
+    """
+    window: (offset, length) 只輸出該區間的日期欄；None 表示整個走期
+    所有片段先收進 list 最後一次 join，輸出大小與 (列數 × 區間天數) 成正比
+    """
+    offset, length = window if window is not None else (0, days_cnt)
+    end_dt = start_dt + timedelta(days=days_cnt - 1)
+    used_media = sorted(list(set(r.media for r in rows)), key=lambda x: MEDIA_ORDER_MAP.get(x, 99))
+    mediums_str = "、".join(used_media)
+
+    date_header_row1 = _month_header(start_dt, offset, length, show_year=start_dt.year != end_dt.year)
+    header2, header3 = [], []
+    curr = start_dt + timedelta(days=offset)
+    for _ in range(length):
+        wd = curr.weekday()
+        cls = "header-yellow" if wd >= 5 else "header-blue"
+        header2.append(f"<th class='{cls}'>{curr.day}</th>")
+        header3.append(f"<th class='{cls}'>{WEEKDAYS_ZH[wd]}</th>")
+        curr += timedelta(days=1)
+
+    out = []
+    i = 0
+    while i < len(rows):
+        row = rows[i]
+        j = i + 1
+        while j < len(rows) and rows[j].media == row.media and rows[j].seconds == row.seconds:
+            j += 1
+        group_size = j - i
+        m_name = row.media
+        if "全家廣播" in m_name: m_name = "全家便利商店<br>通路廣播廣告"
+        if "新鮮視" in m_name: m_name = "全家便利商店<br>新鮮視廣告"
+
+        for k in range(group_size):
+            r_data = rows[i+k]
+            out.append("<tr>")
+            if k == 0:
+                out.append(f"<td rowspan='{group_size}' class='align-left'>{m_name}</td>")
+
+            loc_txt = r_data.location
+            if "北北基" in loc_txt and "廣播" in r_data.media: loc_txt = "北區-北北基+東"
+
+            rate_disp = f"{r_data.rate_list:,}" if isinstance(r_data.rate_list, int) else r_data.rate_list
+            out.append(f"<td>{loc_txt}</td><td>{r_data.program}</td><td>{r_data.daypart}</td>"
+                       f"<td>{r_data.seconds}秒</td><td class='align-right'>{rate_disp}</td>")
+
+            pkg_disp = f"{r_data.pkg_display_val:,}" if isinstance(r_data.pkg_display_val, int) else r_data.pkg_display_val
+            if row.is_pkg_start:
+                if k == 0:
+                    out.append(f"<td rowspan='{group_size}' class='align-right'>{pkg_disp}</td>")
+            elif not row.is_pkg_member:
+                out.append(f"<td class='align-right'>{pkg_disp}</td>")
+
+            out.append("".join(f"<td>{s_val}</td>" for s_val in r_data.schedule.window(offset, length)))
+            out.append(f"<td class='cell-yellow'>{r_data.spots}</td></tr>")
+        i = j
+    data_rows_html = "".join(out)
+
+    vat_val = int(round((budget + prod) * 0.05))
+    final_total = budget + prod + vat_val
+
+    html = f"""
+    {CSS_STYLE}
+    <div style="overflow-x: auto; width: 100%;">
+        <table class="preview-table">
+            <tr>
+                <td colspan="5" class="align-left" style="background-color:#fff; border:none;">
+                    <b>客戶名稱：</b> {c_name}<br><b>Product：</b> {products}<br><b>Period：</b> {start_dt.strftime('%Y. %m. %d')} - {end_dt.strftime('%Y. %m. %d')}<br><b>Medium：</b> {mediums_str}
+                </td>
+                <td colspan="{length + 3}" style="background-color:#fff; border:none;"></td>
+            </tr>
+            <tr><th colspan="7" style="border:none;"></th>{date_header_row1}<th style="border:none;"></th></tr>
+            <tr>
+                <th rowspan="2" class="header-blue">Station</th><th rowspan="2" class="header-blue">Location</th><th rowspan="2" class="header-blue">Program</th>
+                <th rowspan="2" class="header-blue">Day-part</th><th rowspan="2" class="header-blue">Size</th><th rowspan="2" class="header-blue">rate (List)</th>
+                <th rowspan="2" class="header-blue">Package-cost<br>(List)</th>{"".join(header2)}<th rowspan="2" class="header-blue">檔次</th>
+            </tr>
+            <tr>{"".join(header3)}</tr>
+            {data_rows_html}
+            <tr class="row-total">
+                <td colspan="5" class="align-right">Total (List Price)</td>
+                <td class="align-right">{sum(r.rate_list for r in rows if isinstance(r.rate_list, int)):,}</td>
+                <td class="align-right">{total_list:,}</td>
+                <td colspan="{length}"></td>
+                <td class="cell-yellow">{sum(r.spots for r in rows)}</td>
+            </tr>
+            <tr><td colspan="6" class="align-right">製作</td><td class="align-right">{prod:,}</td><td colspan="{length + 1}"></td></tr>
+            <tr><td colspan="6" class="align-right">專案優惠價 (Budget)</td><td class="align-right" style="color:red; font-weight:bold;">{budget:,}</td><td colspan="{length + 1}"></td></tr>
+            <tr><td colspan="6" class="align-right">5% VAT</td><td class="align-right">{vat_val:,}</td><td colspan="{length + 1}"></td></tr>
+            <tr class="row-grand-total"><td colspan="6" class="align-right">Grand Total</td><td class="align-right">{final_total:,}</td><td colspan="{length + 1}"></td></tr>
+        </table>
+    </div>
+    """
+    return html
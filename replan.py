@@ -0,0 +1,279 @@
+"""
+期中調整 (re-plan): 走期進行中延長、追加預算或補足未播檔次時，只重排尚未播出的日子
+
+    python replan.py --quote-id 12 --as-of 2025-01-15 --aired aired.csv --out new.xlsx --diff diff.csv
+    python replan.py --quote-id 12 --as-of 2025-01-15 --budget 1500000 --end-date 2025-02-28
+
+原計畫取自報價歷史 (history.py)；aired 為已播檔次，格式同 schedule_export.py 的 long 表
+(date, media, region, seconds, spots；campaign 欄可有可無)，沒有提供時視為照原排程播出。
+"""
+import sys
+import argparse
+from dataclasses import replace
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import ratecard
+import history
+import flighting
+from engine import DailySchedule, plan, summarize, product_string
+
+# ==========================================
+# 重排規則
+# ==========================================
+# as_of 之前的日子以實際播出 (aired) 為準，不再變動；as_of 起的剩餘窗口重新分配:
+#   目標檔次  未改預算 / 設定: 原計畫各列排程總檔次 (未播足的自動補到剩餘日子)
+#             改預算 / 設定 / 天數: 以新條件重跑 plan() 的各列檔次 (偶數修正與 Std_Spots x1.1 規則
+#             依整個走期的預算判斷，與新報價一致)
+#   剩餘檔次  max(目標 - 已播, 0)，奇數進位成偶數，依 flighting.allocate 分到剩餘日子 (平均分配時與
+#             calculate_schedule 相同；預設沿用報價存下的分配策略)
+#             走期不變且剩餘檔次等於原排程剩餘部分的列，直接沿用原排程 (不因重新分配的進位而變動)
+# 各列以 (媒體, 區域, 地點, 秒數) 對應；新計畫多出的列從 as_of 起開始排，少掉的列剩餘日子歸零
+# 金額欄位維持報價 (或新報價) 原值，與 ledger.clip 相同，各列與 Total (List) 一致
+# 成本與變動量成正比: 各列先以 window_total 比對合計 (封閉形式排程不展開)，整列不變的沿用原列；
+# 需要重排的列才一起以陣列分配剩餘日子，差異也只展開排程有變的列
+
+ROW_KEY = ("media", "region", "location", "seconds")
+CHANGE_COLUMNS = ["date", "media", "region", "location", "seconds", "old_spots", "new_spots"]
+SUMMARY_COLUMNS = ["media", "region", "location", "seconds", "old_total", "aired", "remaining", "new_total", "status"]
+
+def _key(r):
+    return tuple(getattr(r, k) for k in ROW_KEY)
+
+def _line(sch, days):
+    """ 排程的每日檔次，補 0 / 截到 days 天 """
+    out = np.zeros(days, dtype=np.int64)
+    out[:min(sch.days, days)] = sch.window(0, days)
+    return out
+
+def load_aired(path, rows, start_date, as_of):
+    """
+    已播檔次 long 表 -> [列, 日] 陣列 (前 as_of - start_date 天)
+    同一 (日, 媒體, 區域, 秒數) 對應多列時 (不同地點) 依序填入第一列；表上沒有的列視為 0 檔
+    """
+    k = (as_of - start_date).days
+    df = pd.read_csv(path, encoding="utf-8-sig")
+    missing = {"date", "media", "region", "seconds", "spots"} - set(df.columns)
+    if missing:
+        raise ValueError(f"已播檔次表缺少欄位: {', '.join(sorted(missing))}")
+    df["day"] = (pd.to_datetime(df["date"]).dt.date.map(date.toordinal) - start_date.toordinal()).astype(np.int64)
+    df = df[(df["day"] >= 0) & (df["day"] < k)]
+    index = {}
+    for i, r in enumerate(rows):
+        index.setdefault((r.media, r.region, int(r.seconds)), i)
+    keys = list(zip(df["media"].astype(str), df["region"].astype(str), df["seconds"].astype(int)))
+    row_idx = np.array([index.get(key, -1) for key in keys], dtype=np.int64)
+    unknown = sorted({key for key, i in zip(keys, row_idx) if i < 0})
+    if unknown:
+        raise ValueError(f"已播檔次表有原計畫沒有的列: {unknown[:5]}")
+    aired = np.zeros((len(rows), max(k, 0)), dtype=np.int64)
+    np.add.at(aired, (row_idx, df["day"].to_numpy()), df["spots"].to_numpy(dtype=np.int64))
+    return aired
+
+def replan(rows, start_date, as_of, aired=None, new_plan=None, days=None, spec=None):
+    """
+    rows: 原計畫明細；as_of: 第一個尚未播出的日期
+    aired: [列, 日] 已播檔次 (至少 as_of - start_date 天)；None 表示照原排程播出
+    new_plan: 改預算 / 設定 / 天數後的 plan() 結果 (各列新目標)；None 表示目標不變
+    days: 新的總天數 (延長 / 縮短走期)，預設為原天數
+    spec: 剩餘日子的分配策略 (flighting spec)，None 為平均分配 (replan_quote 預設沿用報價的策略)
+    回傳 dict: rows (新明細；不變的列沿用原排程物件，其餘為 DailySchedule)、changes (逐日差異)、summary (逐列)
+    """
+    old_days = max((r.schedule.days for r in rows), default=0)
+    days = days or old_days
+    k = (as_of - start_date).days
+    if not 0 <= k < days:
+        raise ValueError(f"as_of 需在走期內 ({start_date} ~ {start_date + timedelta(days=days - 1)})")
+    if aired is not None:
+        aired = np.asarray(aired, dtype=np.int64)[:, :k]
+        if aired.shape != (len(rows), k):
+            raise ValueError(f"aired 需為 {len(rows)} 列 × 至少 {k} 天")
+
+    # 原計畫各列已播: 檔次合計、是否與原排程相同 (相同排程物件只比對一次)
+    if aired is None:
+        aired_tot = np.array([r.schedule.window_total(0, k) for r in rows], dtype=np.int64)
+        same_past = np.ones(len(rows), dtype=bool)
+    else:
+        aired_tot = aired.sum(axis=1)
+        heads = {}
+        same_past = np.array([np.array_equal(aired[i], heads.setdefault(id(r.schedule), r.schedule.window(0, k)))
+                              for i, r in enumerate(rows)], dtype=bool)
+
+    def past(i):
+        return aired[i] if aired is not None else np.asarray(rows[i].schedule.window(0, k), dtype=np.int64)
+
+    # 新明細的列: 新計畫 (依原計畫對應已播) 或原計畫本身
+    by_key = {_key(r): i for i, r in enumerate(rows)}
+    targets = new_plan["rows"] if new_plan is not None else rows
+    src = np.array([by_key.get(_key(r), -1) for r in targets], dtype=np.int64)
+    matched = src >= 0
+    delivered = np.where(matched, aired_tot[src], 0)
+    dropped = sorted(set(range(len(rows))) - set(src[matched].tolist()))
+
+    goal = np.array([r.schedule.total for r in targets], dtype=np.int64)
+    remaining = np.maximum(goal - delivered, 0)
+    remaining += remaining % 2
+    # 走期不變且剩餘檔次等於原排程剩餘部分的列沿用原排程的剩餘日子 (只算合計，不展開)
+    keep = np.zeros(len(targets), dtype=bool)
+    if days == old_days:
+        keep[matched] = [rows[i].schedule.window_total(k, days - k) == rem
+                         for i, rem in zip(src[matched].tolist(), remaining[matched].tolist())]
+
+    # 只有剩餘日子需要重新分配的列才計算
+    redo = np.flatnonzero(~keep)
+    future = np.zeros((0, days - k), dtype=np.int64)
+    if len(redo):
+        if spec and not flighting.is_even(spec):
+            weights = flighting.day_weights(spec, flighting.calendar_index(start_date, days))[k:]
+            if not (weights > 0).any():
+                raise ValueError("剩餘日子全部停播，無法重排")
+        else:
+            weights = np.ones(days - k)
+        future = flighting.allocate(remaining[redo], weights)
+    future_of = dict(zip(redo.tolist(), future))
+
+    # 金額欄位 (套裝價 / 全省聯播套裝總價) 維持報價原值 (新計畫的列為新報價的值)，與 Total (List) 一致
+    # 相同排程的列 (全省聯播) 共用同一個排程物件
+    shared = {}
+    out = []
+    for j, r in enumerate(targets):
+        i = int(src[j])
+        if keep[j] and same_past[i]:
+            sch = rows[i].schedule   # 整列不變
+        else:
+            head = past(i) if i >= 0 else np.zeros(k, dtype=np.int64)
+            tail = np.asarray(rows[i].schedule.window(k, days - k), dtype=np.int64) if keep[j] else future_of[j]
+            line = np.concatenate([head, tail])
+            sch = shared.setdefault(line.tobytes(), DailySchedule(line))
+        if sch is r.schedule:
+            out.append(r)
+        else:
+            out.append(replace(r, schedule=sch, spots=r.spots if sch.total == r.schedule.total else sch.total))
+    # 新計畫沒有的舊列: 已播部分保留，剩餘歸零
+    for i in dropped:
+        line = np.concatenate([past(i), np.zeros(days - k, dtype=np.int64)])
+        out.append(replace(rows[i], schedule=DailySchedule(line), spots=int(line.sum())))
+
+    changes, summary = diff(rows, out, start_date, k, aired_tot)
+    return {"rows": out, "changes": changes, "summary": summary, "as_of": as_of, "days": days,
+            "dropped": [rows[i] for i in dropped]}
+
+def diff(old_rows, new_rows, start_date, k=0, aired_totals=None):
+    """
+    逐日差異 (changes: 檔次有變的 (日, 列)) 與逐列摘要 (summary)
+    列以 (媒體, 區域, 地點, 秒數) 對應；只出現在一邊的列另一邊視為 0 檔
+    aired_totals: old_rows 各列已播檔次 (前 k 天)；排程物件相同的列直接視為不變，不展開逐日比對
+    """
+    keys = list(dict.fromkeys([_key(r) for r in old_rows] + [_key(r) for r in new_rows]))
+    old_of = {_key(r): r for r in old_rows}
+    new_of = {_key(r): r for r in new_rows}
+    days = max([r.schedule.days for r in old_rows + new_rows], default=0)
+    aired_of = {} if aired_totals is None else {_key(r): int(t) for r, t in zip(old_rows, aired_totals)}
+
+    parts, records = [], []
+    for n, key in enumerate(keys):
+        o, w = old_of.get(key), new_of.get(key)
+        old_total = o.schedule.total if o else 0
+        new_total = w.schedule.total if w else 0
+        remaining = w.schedule.window_total(k, days - k) if w else 0
+        status = "新增" if o is None else "不變"
+        if o is None or w is None or o.schedule is not w.schedule:
+            a = _line(o.schedule, days) if o else np.zeros(days, dtype=np.int64)
+            b = _line(w.schedule, days) if w else np.zeros(days, dtype=np.int64)
+            day = np.flatnonzero(a != b)
+            if len(day):
+                parts.append((np.full(len(day), n), day, a[day], b[day]))
+                if o is not None:
+                    status = "變動"
+        records.append(key + (old_total, aired_of.get(key, 0), remaining, new_total, status))
+
+    if parts:
+        row, day, old, new = (np.concatenate(p) for p in zip(*parts))
+    else:
+        row = day = old = new = np.zeros(0, dtype=np.int64)
+    order = np.lexsort((row, day))
+    row, day, old, new = row[order], day[order], old[order], new[order]
+    changes = pd.DataFrame({
+        "date": [start_date + timedelta(days=int(d)) for d in day],
+        "media": [keys[i][0] for i in row], "region": [keys[i][1] for i in row],
+        "location": [keys[i][2] for i in row], "seconds": [keys[i][3] for i in row],
+        "old_spots": old.astype(np.int64), "new_spots": new.astype(np.int64),
+    }, columns=CHANGE_COLUMNS)
+    summary = pd.DataFrame(records, columns=SUMMARY_COLUMNS)
+    return changes, summary
+
+def _quoted_list(rows, card):
+    """ 列的報價牌價合計 (與 plan_media 累加 total_list 的方式相同)；檔次取報價時的 spots """
+    total = 0
+    for r in rows:
+        if r.is_pkg_start:
+            total += int(card.list_unit(r.media, "全省", r.seconds) * r.spots)
+        elif not r.is_pkg_member and isinstance(r.pkg_display_val, int):
+            total += r.pkg_display_val
+    return total
+
+def replan_quote(inputs, result, as_of, aired=None, budget=None, end_date=None, spec=None, card=None):
+    """
+    報價歷史的一份報價 (History.get 的 inputs / result) 重排
+    budget / end_date 有改時以新條件重跑 plan() 取得新目標；回傳 replan() 結果加上 total_list / totals / budget
+    spec 未指定時沿用報價存下的分配策略 (inputs["flighting"])
+    total_list 與各列金額一致: 報價 (或新報價) 的牌價總額，加上新報價沒有、只保留已播部分的列的原報價金額
+    """
+    if spec is None:
+        spec = inputs.get("flighting")
+    start = inputs["start_date"]
+    days = (end_date - start).days + 1 if end_date else inputs["days"]
+    budget = inputs["budget"] if budget is None else budget
+    card = card or ratecard.current()
+    new_plan = None
+    if budget != inputs["budget"] or days != inputs["days"]:
+        new_plan = plan(inputs["config_media"], budget, days, card)
+    out = replan(result["rows"], start, as_of, aired, new_plan, days, spec)
+    total_list = (new_plan or result)["total_list"] + _quoted_list(out["dropped"], card)
+    out.update(total_list=total_list, totals=summarize(budget, total_list), budget=budget,
+               products=product_string((new_plan or result)["secs"]))
+    return out
+
+def main(argv=None):
+    from excel_export import write_excel   # 只有輸出 xlsx 時需要 (app 匯入本模組時不載入 xlsxwriter)
+
+    parser = argparse.ArgumentParser(description="期中調整: 只重排尚未播出的日子並輸出差異")
+    parser.add_argument("--quote-id", type=int, required=True, help="報價歷史的報價編號")
+    parser.add_argument("--as-of", required=True, help="第一個尚未播出的日期 (YYYY-MM-DD)")
+    parser.add_argument("--aired", help="已播檔次 long 表 CSV (預設照原排程播出)")
+    parser.add_argument("--budget", type=int, help="新的總預算 (追加預算)")
+    parser.add_argument("--end-date", help="新的結束日 (延長走期)")
+    parser.add_argument("--flighting", help="剩餘日子的分配策略 (見 flighting.py，預設沿用報價的策略)")
+    parser.add_argument("--out", help="新 Cue 表 xlsx 路徑")
+    parser.add_argument("--diff", help="逐日差異 CSV 路徑")
+    args = parser.parse_args(argv)
+
+    try:
+        stored = history.default_history().get(args.quote_id)
+        if stored is None:
+            raise ValueError(f"找不到報價 #{args.quote_id}")
+        inputs, result = stored
+        as_of = date.fromisoformat(args.as_of)
+        aired = load_aired(args.aired, result["rows"], inputs["start_date"], as_of) if args.aired else None
+        end_date = date.fromisoformat(args.end_date) if args.end_date else None
+        spec = flighting.parse_spec(args.flighting) if args.flighting else None
+        out = replan_quote(inputs, result, as_of, aired, args.budget, end_date, spec)
+    except (OSError, ValueError) as e:   # 含 UnpricedError / 日期格式
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    changed = out["summary"][out["summary"]["status"] != "不變"]
+    print(f"✅ #{args.quote_id} {inputs['client']}: {len(out['changes']):,} 個 (日, 列) 變動，{len(changed)} 列受影響")
+    print(changed.to_string(index=False) if len(changed) else "   (排程不變)")
+    if args.diff:
+        out["changes"].to_csv(args.diff, index=False, encoding="utf-8-sig")
+    if args.out:
+        totals = out["totals"]
+        write_excel(args.out, out["rows"], out["days"], inputs["start_date"], inputs["client"], out["products"],
+                    out["total_list"], totals["grand_total"], out["budget"], totals["prod_cost"])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import breakpoints
+from engine import MEDIA_PREFIX, plan_many, parse_regions, parse_sec_shares
+
+# ==========================================
+# 情境比較: 預算 × 媒體佔比 × 秒數佔比 一次向量化計算
+# ==========================================
+
+def budget_steps(low, high, step):
+    """ low ~ high (含) 每 step 一點 """
+    if step <= 0 or high < low:
+        return [low]
+    return list(np.arange(low, high + step / 2, step).round().astype(np.int64))
+
+def two_way_splits(secs, step):
+    """ 兩種秒數時，第一個秒數佔比 0~100 每 step 一點: ["10:0,20:100", "10:10,20:90", ...] """
+    a, b = secs
+    return [f"{a}:{x},{b}:{100 - x}" for x in range(0, 101, step)]
+
+def scenario_grid(base_brief, budgets, fm_shares=None, fv_shares=None, sec_splits=None):
+    """
+    以 base_brief 為底展開情境表 (每列一個 brief)
+    fm_shares / fv_shares: 佔比候選值，None 表示沿用 base_brief
+    sec_splits: {"fm": ["10:40,20:60", ...], ...} 秒數佔比候選
+    家樂福有開啟時與 UI 相同自動填滿剩餘佔比；佔比總和超過 100 的組合略過
+    """
+    sec_splits = sec_splits or {}
+    fm_shares = fm_shares if fm_shares is not None else [base_brief.get("fm_share", 0)]
+    fv_shares = fv_shares if fv_shares is not None else [base_brief.get("fv_share", 0)]
+    split_keys = [p for p in MEDIA_PREFIX if sec_splits.get(p)]
+    split_lists = [sec_splits[p] for p in split_keys]
+    has_cf = "cf_share" in base_brief
+
+    records = []
+    for budget, fm, fv, *splits in itertools.product(budgets, fm_shares, fv_shares, *split_lists):
+        if fm + fv > 100:
+            continue
+        brief = dict(base_brief, budget=budget, fm_share=fm, fv_share=fv)
+        if has_cf:
+            brief["cf_share"] = 100 - fm - fv
+        brief.update({f"{p}_secs": s for p, s in zip(split_keys, splits)})
+        records.append(brief)
+    return pd.DataFrame.from_records(records)
+
+def sweep(base_brief, budgets, fm_shares=None, fv_shares=None, sec_splits=None, card=None):
+    """
+    一次 plan_many 算完整個情境表
+    回傳每個情境一列: 佔比 / 秒數設定、total_spots、total_list、discount_ratio，
+    以及各媒體是否有明細線觸發 x1.1 (fm_x11 / fv_x11 / cf_x11)
+    """
+    grid = scenario_grid(base_brief, budgets, fm_shares, fv_shares, sec_splits)
+    if grid.empty:
+        return grid
+    lines, summary = plan_many(grid, card=card)
+
+    points = grid[[c for c in grid.columns if c.endswith(("_share", "_secs"))]].copy()
+    points.insert(0, "budget", summary["budget"].to_numpy())
+    for col in ("total_spots", "total_list", "grand_total", "discount_ratio", "under_target_lines"):
+        points[col] = summary[col].to_numpy()
+    for prefix, m_type in MEDIA_PREFIX.items():
+        hit = lines.loc[(lines["media"] == m_type) & lines["under_target"], "brief"].to_numpy()
+        flags = np.zeros(len(grid), dtype=bool)
+        flags[hit] = True
+        points[f"{prefix}_x11"] = flags
+    return points
+
+def penalty_budgets(brief, card=None):
+    """
+    各明細線在目前佔比下，總預算低於多少會觸發 x1.1 (明細線門檻取自 breakpoints 索引，逐位元精確)
+    回傳 [(媒體, 秒數, 門檻總預算)]
+    """
+    index = breakpoints.index(card)
+    out = []
+    for prefix, m_type in MEDIA_PREFIX.items():
+        share = brief.get(f"{prefix}_share") or 0
+        if share <= 0 or not brief.get(f"{prefix}_secs"):
+            continue
+        is_nat, regions = (True, ["全省"]) if m_type == "家樂福" else parse_regions(brief.get(f"{prefix}_regions", "全省"))
+        for sec, sec_share in parse_sec_shares(brief[f"{prefix}_secs"]).items():
+            if sec_share <= 0:
+                continue
+            line_budget = index.penalty_budget(index.key_id(m_type, is_nat, regions, sec))
+            if line_budget > 0:
+                out.append((m_type, sec, line_budget / (share / 100.0) / (sec_share / 100.0)))
+    return out
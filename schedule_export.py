@@ -0,0 +1,161 @@
+"""
+機器可讀的排程輸出 (播放 / 帳務系統直接匯入，不必解析 Excel)
+
+    python schedule_export.py briefs.csv --out schedules.csv.gz --format long
+    python schedule_export.py quote.json --out schedule.jsonl
+
+輸入: brief 表 (.xlsx / .csv，欄位見 batch.py) 或報價 JSON (與 POST /quote 的 body 相同，見 service.py)
+格式:
+    csv    一個 Cue 表列一行: campaign, client, start_date, media, region, location, program, daypart,
+           seconds, spots, rate_list, package_list, d1 ... dN (第 N 天檔次；走期較短的案子留空)
+    jsonl  一個 Cue 表列一個 JSON 物件，schedule 為每日檔次陣列
+    long   每 (日, 列) 一行，只列有檔次的日子: campaign, date, media, region, seconds, spots
+
+整條流程為 generator: 逐個案子計算、組成文字區塊後寫出，不會一次產生全部資料；
+檔名以 .gz 結尾時以 gzip 壓縮。service.py 的 POST /schedule 以 chunked 回應串流同樣的內容
+"""
+import sys
+import json
+import time
+import argparse
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
+
+import ratecard
+import flighting
+from engine import plan, brief_to_config
+from quote_request import parse_request
+from textstream import CHUNK_ROWS, csv_field, iter_chunks, open_text
+
+FORMATS = ("csv", "jsonl", "long")
+CONTENT_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson; charset=utf-8", "long": "text/csv; charset=utf-8"}
+
+CSV_COLUMNS = ["campaign", "client", "start_date", "media", "region", "location", "program", "daypart",
+               "seconds", "spots", "rate_list", "package_list"]
+LONG_COLUMNS = ["campaign", "date", "media", "region", "seconds", "spots"]
+
+@lru_cache(maxsize=1024)
+def _dates(start_date, days):
+    """ 走期每天的 ISO 日期字串 (批次中相同走期共用) """
+    return tuple((start_date + timedelta(days=d)).isoformat() for d in range(days))
+
+def header(fmt, max_days=0):
+    """ 檔頭 (jsonl 沒有)；csv 的日期欄依最長走期 """
+    if fmt == "csv":
+        return ",".join(CSV_COLUMNS + [f"d{d + 1}" for d in range(max_days)]) + "\n"
+    if fmt == "long":
+        return ",".join(LONG_COLUMNS) + "\n"
+    return ""
+
+# ==========================================
+# generator pipeline: 案子 -> 文字區塊 -> 檔案 / HTTP 回應
+# ==========================================
+# campaign: dict campaign (編號)、client、start_date、rows (plan() 的明細列)
+
+def iter_lines(campaigns, fmt="csv", max_days=0):
+    """ 每個案子 yield 一段多行文字與行數 """
+    if fmt not in FORMATS:
+        raise ValueError(f"format 需為 {FORMATS}")
+    for c in campaigns:
+        rows = c["rows"]
+        if not rows:
+            continue
+        days = max(r.schedule.days for r in rows)
+        counts = np.zeros((len(rows), days), dtype=np.int64)
+        for i, r in enumerate(rows):
+            counts[i, :r.schedule.days] = r.schedule.as_array()
+        if fmt == "long":
+            # 依日期再依列排序，只輸出有檔次的 (日, 列)
+            day, row = np.nonzero(counts.T)
+            dates = _dates(c["start_date"], days)
+            head = f"{csv_field(c['campaign'])},"
+            mids = [f",{csv_field(r.media)},{csv_field(r.region)},{r.seconds}," for r in rows]
+            yield "".join([head + dates[d] + mids[r] + f"{n}\n" for d, r, n in
+                           zip(day.tolist(), row.tolist(), counts[row, day].tolist())]), len(day)
+        elif fmt == "csv":
+            head = f"{csv_field(c['campaign'])},{csv_field(c['client'])},{c['start_date'].isoformat()},"
+            pad = "," * max(max_days - days, 0)
+            yield "".join([head + ",".join(csv_field(v) for v in (r.media, r.region, r.location, r.program, r.daypart,
+                                                                    r.seconds, r.spots, r.rate_list, r.pkg_display_val))
+                           + "," + ",".join(map(str, line)) + pad + "\n" for r, line in zip(rows, counts.tolist())]), len(rows)
+        else:
+            base = {"campaign": c["campaign"], "client": c["client"], "start_date": c["start_date"].isoformat()}
+            yield "".join([json.dumps(dict(base, media=r.media, region=r.region, location=r.location, program=r.program,
+                                           daypart=r.daypart, seconds=r.seconds, spots=r.spots, rate_list=r.rate_list,
+                                           package_list=r.pkg_display_val, schedule=line),
+                                      ensure_ascii=False, separators=(",", ":")) + "\n"
+                           for r, line in zip(rows, counts.tolist())]), len(rows)
+
+def iter_export(campaigns, fmt="csv", max_days=0, chunk_rows=CHUNK_ROWS):
+    """ 檔頭 + 資料區塊 (檔頭的行數記為 0)；寫檔與 HTTP 串流共用 """
+    head = header(fmt, max_days)
+    if head:
+        yield head, 0
+    yield from iter_chunks(iter_lines(campaigns, fmt, max_days), chunk_rows)
+
+def write_stream(chunks, out):
+    """ 逐塊寫到文字檔 out；回傳 {"rows", "bytes"} (未壓縮) """
+    rows, nbytes = 0, 0
+    for text, count in chunks:
+        out.write(text)
+        rows += count
+        nbytes += len(text.encode("utf-8"))
+    return {"rows": rows, "bytes": nbytes}
+
+def export_schedules(campaigns, path, fmt="csv", max_days=0, chunk_rows=CHUNK_ROWS):
+    """ 寫檔；回傳 rows / bytes / seconds / rows_per_sec """
+    t0 = time.perf_counter()
+    with open_text(path) as out:
+        stats = write_stream(iter_export(campaigns, fmt, max_days, chunk_rows), out)
+    stats["seconds"] = time.perf_counter() - t0
+    stats["rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    return stats
+
+# ==========================================
+# 輸入: brief 表 (每列一個案子，依序計算) 或單一報價 JSON
+# ==========================================
+
+def iter_brief_campaigns(briefs, card=None):
+    """ brief 表逐列計算 (含分配策略欄)，一次只保留一個案子的明細 """
+    card = card or ratecard.current()
+    for i, b in enumerate(briefs.to_dict("records"), start=1):
+        days = int(b["days"])
+        rows = plan(brief_to_config(b), b["budget"], days, card)["rows"]
+        yield {"campaign": i, "client": b["client"], "start_date": b["start_date"],
+               "rows": flighting.apply_flighting(rows, b["start_date"], flighting.brief_spec(b))}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="排程串流輸出 (CSV / JSON Lines / long)")
+    parser.add_argument("input", help="brief 表 (.xlsx / .csv) 或報價 JSON")
+    parser.add_argument("--out", required=True, help="輸出路徑，.gz 結尾時壓縮")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="csv / jsonl / long (預設依副檔名，.jsonl 以外為 csv)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help=f"每次寫出的行數 (預設 {CHUNK_ROWS})")
+    args = parser.parse_args(argv)
+    fmt = args.format or ("jsonl" if ".jsonl" in args.out else "csv")
+
+    try:
+        if args.input.lower().endswith(".json"):
+            with open(args.input, encoding="utf-8") as f:
+                config_media, budget, start, days, client = parse_request(json.load(f))
+            campaigns = [{"campaign": 1, "client": client, "start_date": start, "rows": plan(config_media, budget, days)["rows"]}]
+            n_campaigns, max_days = 1, days
+        else:
+            from batch import read_briefs   # batch 會載入 xlsxwriter；app 匯入本模組時不需要
+            briefs = read_briefs(args.input)
+            campaigns = iter_brief_campaigns(briefs, ratecard.current())
+            n_campaigns, max_days = len(briefs), (int(briefs["days"].max()) if len(briefs) else 0)
+        stats = export_schedules(campaigns, args.out, fmt, max_days, args.chunk_rows)
+    except (OSError, ValueError) as e:   # 含 BadRequest / UnpricedError / 分配策略錯誤
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    secs = stats["seconds"]
+    print(f"✅ {n_campaigns} 個案子, {stats['rows']:,} 行 -> {args.out}")
+    print(f"   耗時 {secs:.2f}s, {stats['rows_per_sec']:,.0f} 行/秒, "
+          f"{stats['bytes'] / 1e6 / secs if secs > 0 else 0:.1f} MB/s (未壓縮)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
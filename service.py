@@ -0,0 +1,269 @@
+"""
+報價 HTTP 服務 (給 CRM 等系統呼叫，不經過 Streamlit)
+
+    python service.py --port 8765 --workers 4
+
+POST /quote           JSON 報價，回傳明細列、總計；body 帶 "xlsx": true 時附上 base64 xlsx，
+                      帶 "capacity": true 時附上檔期庫存檢查 (超賣的日期 / 區域，見 ledger.py)，
+                      帶 "save": true 時存入報價歷史 (見 history.py) 並附上 history_id；未帶時不寫入
+POST /cuesheet.xlsx   同樣的輸入，直接回傳 xlsx 檔 (同樣可帶 "save": true)
+POST /schedule        同樣的輸入，以 chunked 回應串流每日排程；body 的 "format": csv / jsonl / long
+                      (見 schedule_export.py，預設 long)
+GET  /healthz         價目表版本與快取統計
+GET  /metrics         Prometheus 文字格式 (各階段耗時 histogram、輸出大小、快取統計)
+
+輸入 (兩種寫法擇一):
+    {"client": "萬國通路", "budget": 1000000, "start_date": "2025-01-01", "end_date": "2025-01-31",
+     "media": {"全家廣播": {"is_national": true, "share": 70, "sec_shares": {"20": 100}},
+               "新鮮視": {"regions": ["北區", "桃竹苗"], "share": 20, "sec_shares": {"10": 100}},
+               "家樂福": {"share": 10, "sec_shares": {"20": 100}}}}
+    或 batch.py 的 brief 欄位: {"budget": ..., "days": 31, "fm_share": 70, "fm_secs": "20", ...}
+"""
+import sys
+import json
+import base64
+import argparse
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ratecard
+import metrics
+import ledger
+import history
+import schedule_export
+from engine import plan, product_string, summarize
+from cache import RESULT_CACHE, plan_key
+from quote_request import BadRequest, parse_request
+from excel_export import generate_excel
+
+MAX_BODY = 1024 * 1024
+
+def _row_json(r):
+    return {
+        "media": r.media, "region": r.region, "location": r.location, "program": r.program,
+        "daypart": r.daypart, "seconds": r.seconds, "spots": r.spots,
+        "rate_list": r.rate_list, "package_list": r.pkg_display_val,
+        "schedule": r.schedule.to_list(),
+    }
+
+class QuoteService:
+    """ 報價計算 (與 HTTP 無關，可直接在程式內呼叫 / 測試) """
+
+    def __init__(self, workers):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cue-quote")
+
+    def _compute(self, config_media, budget, start, days, client):
+        card = ratecard.current()
+        end = start + timedelta(days=days - 1)
+        key = plan_key(config_media, budget, start, end, client, card.version)
+        result = RESULT_CACHE.get_or_compute((key, "plan"), lambda: plan(config_media, budget, days, card))
+        return key, result
+
+    def _save(self, key, result, config_media, budget, start, days, client):
+        """ 存入報價歷史 (呼叫端帶 "save": true 時)；相同報價只寫入一次，回傳報價編號 """
+        if not result["rows"]:
+            return None
+        return RESULT_CACHE.get_or_compute((key, "history"), lambda: history.default_history().record(
+            key, config_media, budget, start, days, client, result, summarize(budget, result["total_list"])))
+
+    def quote(self, payload):
+        """ 回傳 JSON bytes；同一組輸入直接取快取 """
+        args = parse_request(payload)
+        key, result = self.pool.submit(self._compute, *args).result()
+        body = RESULT_CACHE.get_or_compute((key, "quote"), lambda: self._quote_body(key, result, *args))
+        # 在快取的 JSON 尾端補上 capacity / history_id / xlsx 欄位，不必重新序列化整份明細
+        if payload.get("save"):
+            body = body[:-1] + b',"history_id":' + json.dumps(self._save(key, result, *args)).encode("utf-8") + b"}"
+        if payload.get("capacity"):
+            body = body[:-1] + b',"capacity":' + self._capacity(result, args[2]) + b"}"
+        if not payload.get("xlsx"):
+            return body
+        xlsx = self.xlsx(payload, _parsed=(key, result, args))
+        return body[:-1] + b',"xlsx_base64":"' + base64.b64encode(xlsx) + b'"}'
+
+    def _capacity(self, result, start):
+        """ 檔期庫存檢查: 超賣的 (日, 媒體, 區域)，不快取 (庫存帳隨時變動) """
+        book_ledger = ledger.default_ledger()
+        over = ledger.check(result["rows"], start, book_ledger)
+        over["date"] = over["date"].map(lambda d: d.isoformat())
+        doc = {"ledger_revision": book_ledger.revision(), "overbooked_days": int(over["date"].nunique()),
+               "overbooked": over.to_dict("records")}
+        return json.dumps(doc, ensure_ascii=False, separators=(",", ":"), default=int).encode("utf-8")
+
+    def _quote_body(self, key, result, config_media, budget, start, days, client):
+        totals = summarize(budget, result["total_list"])
+        doc = {
+            "cache_key": key,
+            "pricing_version": result["pricing_version"],
+            "client": client,
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=days - 1)).isoformat(),
+            "days": days,
+            "products": product_string(result["secs"]),
+            "totals": {
+                "budget": budget, "prod_cost": totals["prod_cost"], "vat": totals["vat"],
+                "grand_total": totals["grand_total"], "total_list": result["total_list"],
+                "total_spots": sum(r.spots for r in result["rows"]),
+                "discount_ratio": totals["discount_ratio"],
+            },
+            "rows": [_row_json(r) for r in result["rows"]],
+            "logs": result["logs"],
+        }
+        return json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def xlsx(self, payload, _parsed=None):
+        """ 回傳 xlsx bytes (與 UI 下載相同內容，快取鍵與 UI 共用) """
+        if _parsed is None:
+            args = parse_request(payload)
+            key, result = self.pool.submit(self._compute, *args).result()
+            if payload.get("save"):   # 經由 quote() 呼叫時已存過
+                self._save(key, result, *args)
+        else:
+            key, result, args = _parsed
+        config_media, budget, start, days, client = args
+
+        def build():
+            totals = summarize(budget, result["total_list"])
+            with metrics.stage("xlsx_build"):
+                data = generate_excel(result["rows"], days, start, client, product_string(result["secs"]),
+                                      result["total_list"], totals["grand_total"], budget, totals["prod_cost"]).getvalue()
+            metrics.payload("xlsx", len(data))
+            return data
+
+        return RESULT_CACHE.get_or_compute((key, "xlsx"), lambda: self.pool.submit(build).result())
+
+    def schedule(self, payload):
+        """ 回傳 (content type, 文字區塊 generator)；計算在開始串流前完成，錯誤仍可回 400 """
+        fmt = payload.get("format", "long") if isinstance(payload, dict) else None
+        if fmt not in schedule_export.FORMATS:
+            raise BadRequest(f"format 需為 {schedule_export.FORMATS}")
+        args = parse_request(payload)
+        _, result = self.pool.submit(self._compute, *args).result()
+        config_media, budget, start, days, client = args
+        campaign = {"campaign": 1, "client": client, "start_date": start, "rows": result["rows"]}
+        return schedule_export.CONTENT_TYPES[fmt], schedule_export.iter_export([campaign], fmt, days)
+
+    def health(self):
+        card = ratecard.current()
+        return json.dumps({"status": "ok", "pricing_version": card.version, "ratecard_error": ratecard.last_error(),
+                           "cache": RESULT_CACHE.stats()}).encode("utf-8")
+
+class QuoteHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 + 一律回 Content-Length: 同一條連線可連續送多個請求 (keep-alive)
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    service = None
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunked(self, status, chunks, content_type):
+        """ chunked 回應: 逐塊編碼送出，不必先組出整份內容；回傳送出的 bytes """
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        total = 0
+        for text, _ in chunks:
+            data = text.encode("utf-8")
+            if data:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                total += len(data)
+        self.wfile.write(b"0\r\n\r\n")
+        return total
+
+    def _error(self, status, message):
+        self._send(status, json.dumps({"error": message}, ensure_ascii=False).encode("utf-8"))
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            self.close_connection = True   # 未讀完 body，這條連線不能再用
+            raise BadRequest("body 過大")
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw.decode("utf-8") or "null")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise BadRequest(f"JSON 格式錯誤: {e}")
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._send(200, self.service.health())
+        elif self.path == "/metrics":
+            self._send(200, metrics.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._error(404, "not found")
+
+    def do_POST(self):
+        # 每個請求一個 Run；path 只用已知路由當 label，避免 metrics 無限增長
+        route = self.path if self.path in ("/quote", "/cuesheet.xlsx", "/schedule") else "other"
+        with metrics.collect("request"), metrics.stage("request", route=route):
+            self._handle_post()
+
+    def _handle_post(self):
+        try:
+            if self.path == "/quote":
+                self._send(200, self.service.quote(self._read_json()))
+            elif self.path == "/cuesheet.xlsx":
+                data = self.service.xlsx(self._read_json())
+                self._send(200, data, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                           {"Content-Disposition": 'attachment; filename="CueSheet.xlsx"'})
+            elif self.path == "/schedule":
+                content_type, chunks = self.service.schedule(self._read_json())
+                try:
+                    metrics.payload("schedule", self._send_chunked(200, chunks, content_type))
+                except OSError:   # 用戶端中途斷線；標頭已送出，不能再回錯誤
+                    self.close_connection = True
+            else:
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                self._error(404, "not found")
+        except ValueError as e:   # BadRequest / UnpricedError
+            self._error(400, str(e))
+        except Exception as e:
+            self._error(500, f"{type(e).__name__}: {e}")
+
+def make_server(host="127.0.0.1", port=8765, workers=4, verbose=False):
+    """ 建立 server (每條連線一個 thread 處理 I/O，計算交給 worker pool) """
+    handler = type("Handler", (QuoteHandler,), {"service": QuoteService(workers)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    return server
+
+def serve_in_thread(host="127.0.0.1", port=0, workers=4):
+    """ 在背景 thread 啟動 (本機測試用)，回傳 (server, base_url) """
+    server = make_server(host, port, workers)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cue 表報價 HTTP 服務")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4, help="計算 worker thread 數 (預設 4)")
+    parser.add_argument("--verbose", action="store_true", help="輸出每個請求的 access log")
+    args = parser.parse_args(argv)
+    server = make_server(args.host, args.port, args.workers, args.verbose)
+    print(f"🚀 listening on http://{args.host}:{server.server_address[1]} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
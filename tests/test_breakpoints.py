@@ -0,0 +1,40 @@
+import threading
+
+import breakpoints
+import ratecard
+
+# 每個媒體: 全省聯播、單區、多區、依 REGIONS_ORDER 以外順序的多區 (補建路徑) × 兩種秒數；家樂福全部秒數
+KEYS = [(m_type, is_nat, regions, sec)
+        for m_type in ("全家廣播", "新鮮視")
+        for is_nat, regions in [(True, ("全省",)), (False, ("東區",)), (False, ("北區", "中區", "高屏")), (False, ("高屏", "北區"))]
+        for sec in (10, 30)] + [("家樂福", True, ("全省",), sec) for sec in ratecard.current().priced_seconds("家樂福")]
+
+def test_verify_reduced_set():
+    """ 斷點、斷點右側一個浮點數、表格上限之後的預算，與 plan_media 逐一相同 """
+    assert breakpoints.verify(keys=KEYS, beyond=4) == []
+
+def test_concurrent_key_id():
+    """ 補建組合時其他 thread 的查詢不受影響 """
+    card = ratecard.current()
+    idx, ref = breakpoints.BreakpointIndex(card), breakpoints.BreakpointIndex(card)
+    budgets = [1000.0, 50000.0, 300000.0, 2000000.0]
+    region_sets = [("高屏", "東區"), ("東區", "桃竹苗", "北區"), ("北區", "中區"), ("中區", "北區")]
+    expected = {regions: ref.quote("新鮮視", False, regions, 10, 300000.0) for regions in region_sets}
+    errors = []
+
+    def worker(regions):
+        try:
+            for _ in range(50):
+                cid = idx.key_id("新鮮視", False, regions, 10)
+                idx.lookup([cid] * len(budgets), budgets)
+                if idx.quote("新鮮視", False, regions, 10, 300000.0) != expected[regions]:
+                    errors.append(regions)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(regions,)) for regions in region_sets]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
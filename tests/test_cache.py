@@ -0,0 +1,65 @@
+import pickle
+import threading
+from datetime import date
+
+import numpy as np
+
+from cache import ResultCache, digest, estimate_bytes, plan_key
+from engine import plan
+
+CONFIG = {
+    "全家廣播": {"is_national": True, "regions": ["全省"], "seconds": [20], "share": 60, "sec_shares": {20: 100}},
+    "家樂福": {"regions": ["全省"], "seconds": [20], "share": 40, "sec_shares": {20: 100}},
+}
+
+def test_keys_ignore_field_order():
+    assert digest({"a": 1, "b": [1, 2]}) == digest({"b": [1, 2], "a": 1})
+    reordered = dict(reversed(list(CONFIG.items())))
+    args = (500000, date(2025, 1, 1), date(2025, 1, 31), "c", "v1")
+    assert plan_key(CONFIG, *args) == plan_key(reordered, *args)
+    assert plan_key(CONFIG, *args) != plan_key(CONFIG, *args[:-1], "v2")
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResultCache(max_bytes=100, max_entries=3)
+    for k in "abc":
+        cache.put(k, b"x" * 10)
+    assert cache.get("a") == b"x" * 10       # a 變成最近使用
+    cache.put("d", b"x" * 10)                 # 超過筆數: 淘汰 b
+    assert cache.get("b") is None and cache.get("a") is not None
+    cache.put("e", b"x" * 80)                 # 超過位元組: 從最舊的開始淘汰
+    stats = cache.stats()
+    assert stats["bytes"] <= 100 and stats["entries"] <= 3 and cache.get("e") is not None
+    assert stats["evictions"] == 2 and cache.get("c") is None and cache.get("a") is not None
+    assert cache.put("big", b"x" * 101) == b"x" * 101 and cache.get("big") is None
+
+def test_get_or_compute_once():
+    cache = ResultCache(max_bytes=1 << 20, max_entries=10)
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute("k", lambda: calls.append(1) or "v") == "v"
+    assert calls == [1] and cache.stats()["hits"] == 2
+
+def test_estimate_bytes_structural():
+    """ 不序列化估計大小；共用的排程只算一次，大小與 pickle 長度同一量級 """
+    assert estimate_bytes(b"abc") == 3 and estimate_bytes("報價") == 6
+    assert estimate_bytes(np.zeros(100)) == 800
+    result = plan(CONFIG, 500000, 365)
+    size = estimate_bytes(result)
+    assert len(pickle.dumps(result)) / 4 < size < len(pickle.dumps(result)) * 4
+    shared = [result["rows"][0].schedule] * 50
+    assert estimate_bytes(shared) < estimate_bytes(result["rows"][0].schedule) + 50 * 8 + 100
+
+def test_concurrent_puts_keep_byte_count():
+    cache = ResultCache(max_bytes=5000, max_entries=1000)
+
+    def worker(n):
+        for i in range(200):
+            cache.put((n, i % 30), b"x" * (i % 50 + 1))
+            cache.get((n, (i * 7) % 30))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.stats()["bytes"] == sum(n for _, n in cache._data.values()) <= 5000
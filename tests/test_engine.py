@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import REGIONS_ORDER, brief_to_config, plan, plan_many, summarize
+
+# 全省聯播 + 分區 + 家樂福、區域順序打亂、未達標 (x1.1)、預算 0
+BRIEFS = [
+    {"budget": 1000000, "days": 31, "fm_share": 50, "fm_regions": "全省", "fm_secs": "10:50,20:50",
+     "fv_share": 30, "fv_regions": "北區,中區", "fv_secs": "10", "cf_share": 20, "cf_secs": "20"},
+    {"budget": 250000, "days": 14, "fv_share": 100, "fv_regions": "高屏,北區,東區", "fv_secs": "15:60,30:40"},
+    {"budget": 30000, "days": 7, "fm_share": 70, "fm_regions": "桃竹苗", "fm_secs": "5", "cf_share": 30, "cf_secs": "10"},
+    {"budget": 5000000, "days": 92, "fm_share": 40, "fm_regions": "全省", "fm_secs": "30",
+     "fv_share": 60, "fv_regions": "全省", "fv_secs": "20:25,10:75"},
+    {"budget": 0, "days": 10, "cf_share": 100, "cf_secs": "15"},
+]
+
+# 目前價目表 (ratecards/ratecard.json) 下的結果: (總檔次, 牌價總額, 含稅總額, 未達標明細線數)
+EXPECTED_SUMMARY = [
+    (9318, 1190034, 1060500, 2),
+    (858, 287188, 273000, 2),
+    (365, 34076, 42000, 2),
+    (84156, 6250594, 5260500, 0),
+    (0, 0, 10500, 0),
+]
+
+# 各明細線 (媒體, 秒數, 檔次, 是否未達標)
+EXPECTED_LINES = [
+    [("全家廣播", 10, 750, False), ("全家廣播", 20, 402, True), ("新鮮視", 10, 788, False), ("家樂福", 20, 306, True)],
+    [("新鮮視", 15, 214, True), ("新鮮視", 30, 72, True)],
+    [("全家廣播", 5, 306, True), ("家樂福", 10, 22, True)],
+    [("全家廣播", 30, 3000, False), ("新鮮視", 10, 9450, False), ("新鮮視", 20, 1576, False)],
+    [],
+]
+
+def test_plan_many_fixed_outputs():
+    lines, summary = plan_many(pd.DataFrame(BRIEFS))
+    got = [tuple(int(v) for v in s) for s in
+           summary[["total_spots", "total_list", "grand_total", "under_target_lines"]].itertuples(index=False)]
+    assert got == EXPECTED_SUMMARY
+    for i, expected in enumerate(EXPECTED_LINES):
+        mine = lines[lines["brief"] == i]
+        assert list(zip(mine["media"], mine["seconds"].astype(int), mine["spots"].astype(int), mine["under_target"].astype(bool))) == expected
+
+@pytest.mark.parametrize("i", range(len(BRIEFS)))
+def test_plan_matches_plan_many(i):
+    """ 逐筆 plan() 與 plan_many 的固定結果相同 """
+    brief = BRIEFS[i]
+    result = plan(brief_to_config(brief), brief["budget"], brief["days"])
+    totals = summarize(brief["budget"], result["total_list"])
+    under = sum(log["status"] == "未達標" for log in result["logs"])
+    assert (sum(r.spots for r in result["rows"]), result["total_list"], totals["grand_total"], under) == EXPECTED_SUMMARY[i]
+    assert [(log["media"], log["sec"], log["spots"], log["status"] == "未達標") for log in result["logs"]] == EXPECTED_LINES[i]
+
+def _random_brief(rng):
+    """ 隨機 brief: 媒體 / 區域 / 秒數佔比組合，預算含 0 與未達標的小額 """
+    brief = {"budget": int(rng.choice([0, 5000, 50000, 123456, 1000000, int(rng.integers(1, 5000000))])),
+             "days": int(rng.integers(1, 120))}
+    left = 100
+    for prefix in ("fm", "fv", "cf"):
+        if rng.random() < 0.2:
+            continue
+        share = left if prefix == "cf" else int(rng.integers(0, left + 1))
+        left -= share
+        brief[f"{prefix}_share"] = share
+        if prefix != "cf":
+            regions = rng.choice(REGIONS_ORDER, size=int(rng.integers(1, 7)), replace=False)
+            brief[f"{prefix}_regions"] = "全省" if rng.random() < 0.4 else ",".join(regions)
+        secs = sorted(rng.choice([5, 10, 15, 20, 30], size=int(rng.integers(1, 3)), replace=False).tolist())
+        first = int(rng.integers(0, 101))
+        brief[f"{prefix}_secs"] = str(secs[0]) if len(secs) == 1 else f"{secs[0]}:{first},{secs[1]}:{100 - first}"
+    return brief
+
+def test_plan_many_matches_plan_random():
+    """ 向量化 plan_many 與逐筆 plan() 相同 (隨機 brief) """
+    rng = np.random.default_rng(1)
+    briefs = [_random_brief(rng) for _ in range(200)]
+    _, summary = plan_many(pd.DataFrame(briefs))
+    for brief, s in zip(briefs, summary.itertuples(index=False)):
+        result = plan(brief_to_config(brief), brief["budget"], brief["days"])
+        totals = summarize(brief["budget"], result["total_list"])
+        assert (s.total_spots, s.total_list, s.grand_total) == \
+            (sum(r.spots for r in result["rows"]), result["total_list"], totals["grand_total"]), brief
@@ -0,0 +1,74 @@
+import hashlib
+import zipfile
+from datetime import date
+
+import openpyxl
+import pytest
+
+from engine import PROD_COST, plan, product_string, summarize
+from excel_export import generate_excel, write_excel
+
+# 全省聯播 (第 0 欄 + 套裝價欄合併)、分區 (第 0 欄合併)、家樂福 (量販 / 超市兩列)
+CONFIG = {
+    "全家廣播": {"is_national": True, "regions": ["全省"], "seconds": [10, 20], "share": 50, "sec_shares": {10: 50, 20: 50}},
+    "新鮮視": {"is_national": False, "regions": ["北區", "中區"], "seconds": [10], "share": 30, "sec_shares": {10: 100}},
+    "家樂福": {"regions": ["全省"], "seconds": [20], "share": 20, "sec_shares": {20: 100}},
+}
+
+# 樣板快取之前 (逐格建立格式 / 表頭) 的寫法產生的內容 SHA-256；docProps/core.xml 含建立時間，不比對
+EXPECTED_PARTS = {
+    31: {"xl/worksheets/sheet1.xml": "210e03ce1825aa1ffdbfba358183230370431e5532582dbc20e27e027b3eba86",
+         "xl/sharedStrings.xml": "c984ae819e9fad63df29df0d9273278d37ff17ac21fed1c33e7f5490e6c553c9",
+         "xl/styles.xml": "c35d98af244edf20e7437fd6e971cb320a026bbaa3d21182a6f851cffc85d89e"},
+    92: {"xl/worksheets/sheet1.xml": "a2c7c0a2fd8c7f17b0244a6d870ce69d8052ccd37d9acd5071bbed1cb91f958a",
+         "xl/sharedStrings.xml": "537db9e942f6f698ad5809d0c60c78ac4ea46d90dea00689e43e559cf5b551f5",
+         "xl/styles.xml": "c35d98af244edf20e7437fd6e971cb320a026bbaa3d21182a6f851cffc85d89e"},
+}
+
+def _args(days):
+    result = plan(CONFIG, 1000000, days)
+    totals = summarize(1000000, result["total_list"])
+    return (result["rows"], days, date(2025, 1, 1), "萬國通路", product_string(result["secs"]),
+            result["total_list"], totals["grand_total"], 1000000, PROD_COST)
+
+def _cells(ws):
+    """ 每格的值與主要格式 """
+    out = {}
+    for row in ws.iter_rows():
+        for c in row:
+            out[c.coordinate] = (c.value, c.number_format, c.font.b, c.fill.fgColor.rgb, c.alignment.horizontal, c.border.left.style)
+    return out
+
+@pytest.mark.parametrize("days", [5, 31, 92])
+def test_constant_memory_matches_in_memory(tmp_path, days):
+    """ constant_memory (串流，不合併媒體 / 套裝價欄) 與一般模式的內容、格式一致 """
+    path = tmp_path / "mem.xlsx"
+    path.write_bytes(generate_excel(*_args(days)).getvalue())
+    streamed = write_excel(str(tmp_path / "cm.xlsx"), *_args(days))
+    mem = openpyxl.load_workbook(path).active
+    cm = openpyxl.load_workbook(streamed).active
+
+    assert set(map(str, cm.merged_cells.ranges)) == {"A1:AJ1"}
+    # 一般模式合併範圍內 (左上格以外) 的格子在串流檔為空白格，不比對格式
+    covered = {cell.coordinate for rng in mem.merged_cells.ranges if str(rng) != "A1:AJ1"
+               for row in mem[str(rng)] for cell in row if cell.coordinate != rng.start_cell.coordinate}
+    ours, ref = _cells(cm), _cells(mem)
+    assert all(ours[k][0] is None for k in covered)
+    assert {k: v for k, v in ours.items() if k not in covered} == {k: v for k, v in ref.items() if k not in covered}
+
+def test_national_group_merged(tmp_path):
+    """ 全省聯播 6 區: 媒體欄與套裝價欄各合併一次 """
+    path = tmp_path / "mem.xlsx"
+    path.write_bytes(generate_excel(*_args(31)).getvalue())
+    ws = openpyxl.load_workbook(path).active
+    merged = set(map(str, ws.merged_cells.ranges))
+    assert {"A10:A15", "G10:G15"} <= merged
+    assert ws["A10"].value == "全家便利商店\n通路廣播廣告"
+    assert isinstance(ws["G10"].value, int) and ws["G10"].value > 0
+
+@pytest.mark.parametrize("days", sorted(EXPECTED_PARTS))
+def test_bytes_match_reference(days):
+    """ 同一份報價重複匯出 (第二次沿用快取的樣板) 都與固定的參考內容逐位元相同 """
+    for _ in range(2):
+        with zipfile.ZipFile(generate_excel(*_args(days))) as z:
+            assert {name: hashlib.sha256(z.read(name)).hexdigest() for name in EXPECTED_PARTS[days]} == EXPECTED_PARTS[days]
@@ -0,0 +1,56 @@
+import threading
+
+import export_jobs
+from cache import RESULT_CACHE
+from export_jobs import get_export, release_export, submit_export
+
+def _finish(job):
+    job.future.result(timeout=30)
+    return job
+
+def test_done_result_served_from_cache():
+    job = _finish(submit_export("ej-small", lambda progress: progress(0.5) or b"xlsx"))
+    assert job.status == "done" and job.progress == 1.0
+    assert get_export("ej-small") == (b"xlsx", None)
+    assert RESULT_CACHE.get(("ej-small", "xlsx")) == b"xlsx"
+    assert "ej-small" not in export_jobs._jobs
+
+def test_one_job_per_key_while_running():
+    gate = threading.Event()
+    first = submit_export("ej-running", lambda progress: gate.wait(30) and b"a")
+    assert submit_export("ej-running", lambda progress: b"b") is first
+    data, job = get_export("ej-running")
+    assert data is None and job is first and job.status == "running"
+    release_export("ej-running")   # 進行中的不受影響
+    assert get_export("ej-running")[1] is first
+    gate.set()
+    _finish(first)
+    assert get_export("ej-running") == (b"a", None)
+
+def test_over_cap_result_kept_until_released(monkeypatch):
+    monkeypatch.setattr(RESULT_CACHE, "max_bytes", 4)
+    _finish(submit_export("ej-big", lambda progress: b"too large"))
+    assert RESULT_CACHE.get(("ej-big", "xlsx")) is None
+    assert get_export("ej-big") == (b"too large", None)
+    assert get_export("ej-big") == (b"too large", None)   # 重跑 / 下載前仍在
+    release_export("ej-big")
+    assert get_export("ej-big") == (None, None)
+
+def test_error_kept_until_shown_then_resubmitted():
+    def fail(progress):
+        raise RuntimeError("disk full")
+    job = _finish(submit_export("ej-error", fail))
+    data, got = get_export("ej-error")
+    assert data is None and got is job and job.status == "error" and job.error == "RuntimeError: disk full"
+    assert _finish(submit_export("ej-error", lambda progress: b"ok")) is not job
+    assert get_export("ej-error") == (b"ok", None)
+    _finish(submit_export("ej-error2", fail))
+    release_export("ej-error2")
+    assert get_export("ej-error2") == (None, None)
+
+def test_unclaimed_jobs_swept(monkeypatch):
+    monkeypatch.setattr(RESULT_CACHE, "max_bytes", 4)
+    _finish(submit_export("ej-stale", lambda progress: b"too large"))
+    monkeypatch.setattr(export_jobs, "RETAIN_SECS", 0.0)
+    export_jobs._jobs["ej-stale"].finished -= 1
+    assert get_export("ej-stale") == (None, None) and "ej-stale" not in export_jobs._jobs
@@ -0,0 +1,63 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+import flighting
+from engine import calculate_schedule, plan
+
+CONFIG = {
+    "全家廣播": {"is_national": True, "regions": ["全省"], "seconds": [20], "share": 60, "sec_shares": {20: 100}},
+    "家樂福": {"regions": ["全省"], "seconds": [20], "share": 40, "sec_shares": {20: 100}},
+}
+START = date(2025, 1, 27)   # 星期一 (彈性放假)
+
+def test_equal_weights_match_calculate_schedule():
+    totals = [0, 1, 2, 31, 100, 1001]
+    for days in (1, 7, 31):
+        got = flighting.allocate(totals, np.ones(days))
+        assert got.tolist() == [calculate_schedule(t, days).to_list() for t in totals]
+
+def test_allocate_keeps_totals_and_even_days():
+    rng = np.random.default_rng(3)
+    totals = rng.integers(0, 5000, 50) * 2
+    weights = rng.random(45) * (rng.random(45) > 0.2)
+    weights[0] = 1
+    got = flighting.allocate(totals, weights)
+    assert got.sum(axis=1).tolist() == totals.tolist()
+    assert (got % 2 == 0).all() and (got[:, weights == 0] == 0).all()
+
+def test_weekday_weights_follow_calendar():
+    cal = flighting.calendar_index(START, 14)
+    assert cal.weekday[:7].tolist() == list(range(7))
+    assert cal.holiday[0] and not cal.holiday[13]
+    w = flighting.day_weights({"strategy": "weekday", "weights": [1, 1, 1, 1, 1, 2, 2]}, cal)
+    assert w.tolist() == [1, 1, 1, 1, 1, 2, 2] * 2
+    with pytest.raises(ValueError):
+        flighting.day_weights({"strategy": "weekday", "weights": [1, 2]}, cal)
+
+def test_blackout_and_holidays_masked():
+    rows = plan(CONFIG, 500000, 14)["rows"]
+    spec = flighting.parse_spec("週末加重", "2025-02-01", skip_holidays=True)
+    assert spec == {"strategy": "weekday", "weights": list(flighting.WEEKEND_HEAVY), "blackout": ["2025-02-01"], "skip_holidays": True}
+    out = flighting.apply_flighting(rows, START, spec)
+    for old, new in zip(rows, out):
+        counts = new.schedule.as_array()
+        assert counts.sum() == old.schedule.total and (counts % 2 == 0).all()
+        assert counts[0] == 0 and counts[5] == 0   # 1/27 假日、2/1 停播
+        assert counts[6] >= counts[1]               # 星期日權重較高
+        assert new.pkg_display_val == old.pkg_display_val
+    national = [r.schedule for r in out if r.is_pkg_member]
+    assert all(s is national[0] for s in national)
+    with pytest.raises(ValueError):
+        flighting.apply_flighting(rows, START, {"strategy": "even", "blackout": [f"2025-02-{d:02d}" for d in range(1, 10)]
+                                                 + [f"2025-01-{d}" for d in range(27, 32)]})
+
+def test_even_spec_keeps_rows():
+    rows = plan(CONFIG, 500000, 14)["rows"]
+    assert flighting.apply_flighting(rows, START, {"strategy": "even"}) is rows
+    assert flighting.brief_spec({"flighting": None, "blackout": float("nan")}) is None
+    assert flighting.brief_spec({"flighting": "burst:2:5", "skip_holidays": "是"}) == {
+        "strategy": "burst", "factor": 2.0, "half_life": 5.0, "skip_holidays": True}
+    with pytest.raises(ValueError):
+        flighting.parse_spec("random")
@@ -0,0 +1,64 @@
+import json
+import zlib
+from datetime import date
+
+import pytest
+
+from engine import DailySchedule, Schedule, plan, summarize
+from history import History
+
+CONFIG = {
+    "全家廣播": {"is_national": True, "regions": ["全省"], "seconds": [20], "share": 60, "sec_shares": {20: 100}},
+    "家樂福": {"regions": ["全省"], "seconds": [10], "share": 40, "sec_shares": {10: 100}},
+}
+
+@pytest.fixture
+def store(tmp_path):
+    h = History(str(tmp_path / "history.sqlite3"))
+    yield h
+    h.close()
+
+def _record(store, key, budget=500000, start=date(2025, 1, 20), days=31, client="萬國通路", result=None, flighting=None):
+    result = result or plan(CONFIG, budget, days)
+    return store.record(key, CONFIG, budget, start, days, client, result, summarize(budget, result["total_list"]), flighting)
+
+def test_round_trip_rebuilds_rows(store):
+    """ 存成 JSON (不 pickle)，取回的列與排程與原結果相同；全省聯播各區仍共用同一個排程 """
+    result = plan(CONFIG, 500000, 31)
+    result["rows"][-1].schedule = DailySchedule([0, 2] * 15 + [4])   # 刪減 / 分配策略後的排程
+    spec = {"strategy": "weekday", "weights": [1, 1, 1, 1, 1, 2, 2]}
+    quote_id = _record(store, "k1", result=result, flighting=spec)
+
+    blob = store.conn.execute("SELECT result FROM quotes WHERE id = ?", (quote_id,)).fetchone()[0]
+    assert json.loads(zlib.decompress(blob))["rows"][0]["media"] == "全家廣播"
+
+    inputs, loaded = store.get(quote_id)
+    assert inputs["flighting"] == spec and inputs["start_date"] == date(2025, 1, 20)
+    assert inputs["config_media"]["全家廣播"]["sec_shares"] == {20: 100}
+    assert loaded["total_list"] == result["total_list"] and loaded["secs"] == result["secs"]
+    for got, want in zip(loaded["rows"], result["rows"]):
+        assert (got.media, got.region, got.spots, got.pkg_display_val) == (want.media, want.region, want.spots, want.pkg_display_val)
+        assert got.schedule.to_list() == want.schedule.to_list()
+    national = [r for r in loaded["rows"] if r.is_pkg_member]
+    assert len(national) == 6 and all(r.schedule is national[0].schedule for r in national)
+    assert isinstance(national[0].schedule, Schedule)
+    assert isinstance(loaded["rows"][-1].schedule, DailySchedule)
+
+def test_same_key_recorded_once(store):
+    assert _record(store, "k1") == _record(store, "k1")
+    assert len(store.search()) == 1
+    assert store.monthly_summary()["quotes"].tolist() == [1]
+
+def test_search_and_monthly_rollups(store):
+    _record(store, "a", budget=310000, client="萬國通路")
+    _record(store, "b", budget=200000, start=date(2025, 3, 1), days=10, client="大同")
+    assert store.search(client="萬國")["client"].tolist() == ["萬國通路"]
+    assert store.search(start_date=date(2025, 2, 20))["client"].tolist() == ["大同"]
+    assert len(store.search(media="家樂福")) == 2
+    # 1/20 起 31 天: 12 天在 1 月、19 天在 2 月，媒體預算依天數分攤
+    spend = store.monthly_spend()
+    assert spend.loc["2025-01", "全家廣播"] == pytest.approx(310000 * 0.6 * 12 / 31)
+    assert spend.loc["2025-02", "全家廣播"] == pytest.approx(310000 * 0.6 * 19 / 31)
+    assert spend.loc["2025-03", "家樂福"] == pytest.approx(200000 * 0.4)
+    assert store.monthly_summary()["month"].tolist() == ["2025-01", "2025-03"]
+    assert store.get(999) is None
@@ -0,0 +1,60 @@
+from datetime import date
+
+import pytest
+
+import ledger
+from engine import plan
+
+CONFIG = {
+    "全家廣播": {"is_national": True, "regions": ["全省"], "seconds": [20], "share": 60, "sec_shares": {20: 100}},
+    "家樂福": {"regions": ["全省"], "seconds": [20], "share": 40, "sec_shares": {20: 100}},
+}
+START = date(2025, 1, 1)
+
+@pytest.fixture
+def book(tmp_path):
+    b = ledger.Ledger(str(tmp_path / "ledger.sqlite3"))
+    yield b
+    b.close()
+
+def test_capacity_bounded_by_daypart(monkeypatch):
+    """ 量販 09:00-23:00 (14 小時)、超市 00:00-24:00；容量不超過時段總秒數 """
+    assert ledger.capacity_secs("家樂福", "全省量販") == 420 * 20
+    assert ledger.capacity_secs("家樂福", "全省超市") == 720 * 20
+    monkeypatch.setattr(ledger, "CAPACITY_FACTOR", 10.0)
+    assert ledger.capacity_secs("家樂福", "全省量販") == 14 * 3600
+    assert ledger.capacity_secs("家樂福", "全省超市") == 24 * 3600
+    assert ledger.capacity_secs("全家廣播", "北區") == 16 * 3600
+
+def test_book_load_and_cancel(book):
+    rows = plan(CONFIG, 500000, 14)["rows"]
+    rev = book.revision()
+    bid = book.book(rows, START, "q-1", "萬國通路", "v1")
+    assert book.revision() == rev + 1
+    row = next(r for r in rows if r.media == "家樂福" and r.region == "全省量販")
+    assert book.load("家樂福", "全省量販", START, 14).tolist() == (row.schedule.as_array() * 20).tolist()
+    found = book.overlapping("家樂福", "全省量販", date(2025, 1, 10), date(2025, 1, 20))
+    assert found[["booking_id", "campaign", "client", "spots"]].values.tolist() == [[bid, "q-1", "萬國通路", row.spots]]
+    assert book.cancel(bid) and not book.cancel(bid)
+    assert not book.load("家樂福", "全省量販", START, 14).any()
+    assert book.overlapping("家樂福", "全省量販", START, date(2025, 1, 14)).empty
+
+def test_check_and_clip(book):
+    """ 與已成交檔期合計超過容量的日子列出；刪減後每日偶數檔且不超賣，金額不變 """
+    rows = plan(CONFIG, 3000000, 14)["rows"]
+    assert ledger.check(rows, START, book).empty
+    book.book(rows, START, "q-1")
+    book.book(rows, START, "q-2")
+    over = ledger.check(rows, START, book)
+    caps = dict(zip(over["region"], over["capacity_secs"]))
+    assert set(over["media"]) == {"家樂福"} and caps == {"全省量販": 8400, "全省超市": 14400}
+    assert (over["booked_secs"] + over["quote_secs"] - over["capacity_secs"] == over["over_secs"]).all()
+
+    clipped = ledger.clip(rows, START, book)
+    assert ledger.check(clipped, START, book).empty
+    for old, new in zip(rows, clipped):
+        counts = new.schedule.as_array()
+        if new.media != "家樂福":
+            assert new is old
+        assert (counts % 2 == 0).all() and (counts <= old.schedule.as_array()).all()
+        assert new.spots == counts.sum() and new.pkg_display_val == old.pkg_display_val
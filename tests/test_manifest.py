@@ -0,0 +1,90 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date
+
+import pytest
+
+import manifest
+from engine import plan
+
+CONFIG = {
+    "新鮮視": {"is_national": False, "regions": ["北區", "東區"], "seconds": [10], "share": 70, "sec_shares": {10: 100}},
+    "家樂福": {"regions": ["全省"], "seconds": [20], "share": 30, "sec_shares": {20: 100}},
+}
+START = date(2025, 1, 1)
+REGISTRY = {
+    ("新鮮視", "北區"): [("FV-1", "台北, 信義"), ("FV-2", "板橋")],
+    ("新鮮視", "東區"): [("FV-3", "花蓮")],
+    ("家樂福", "全省量販"): [("HM-1", "桂林")],
+    ("家樂福", "全省超市"): [("SM-1", "天母"), ("SM-2", "內湖")],
+}
+
+def _rows():
+    return plan(CONFIG, 200000, 7)["rows"]
+
+def _spots(rows):
+    """ 每家店的總檔次 = 所在列的總檔次 """
+    return sum(r.schedule.total * len(REGISTRY[(r.media, r.region)]) for r in rows)
+
+def test_synthetic_registry_follows_store_counts():
+    registry = manifest.synthetic_registry()
+    assert len(registry[("全家廣播", "北區")]) == 1649
+    assert len(registry[("新鮮視", "東區")]) == 83
+    assert len(registry[("家樂福", "全省量販")]) == 68 and len(registry[("家樂福", "全省超市")]) == 249
+    assert registry[("全家廣播", "東區")][0] == ("FM-東區-0001", "東區 #1")
+
+def test_csv_lines_expand_store_by_day():
+    rows = _rows()
+    text = "".join(t for t, _ in manifest.iter_lines(rows, START, REGISTRY))
+    recs = list(csv.DictReader(io.StringIO(",".join(manifest.COLUMNS) + "\n" + text)))
+    assert sum(int(r["spots"]) for r in recs) == _spots(rows)
+    assert all(int(r["spots"]) > 0 for r in recs)
+    assert {r["store_name"] for r in recs if r["store_id"] == "FV-1"} == {"台北, 信義"}
+    assert min(r["date"] for r in recs) == "2025-01-01" and max(r["date"] for r in recs) <= "2025-01-07"
+
+def test_jsonl_matches_csv():
+    rows = _rows()
+    as_csv = list(csv.DictReader(io.StringIO(",".join(manifest.COLUMNS) + "\n" +
+                                             "".join(t for t, _ in manifest.iter_lines(rows, START, REGISTRY)))))
+    as_json = [json.loads(line) for t, _ in manifest.iter_lines(rows, START, REGISTRY, "jsonl") for line in t.splitlines()]
+    assert [list(r) for r in as_json[:1]] == [manifest.COLUMNS]
+    assert [{k: str(v) for k, v in r.items()} for r in as_json] == as_csv
+
+def test_missing_region_and_bad_format():
+    rows = _rows()
+    with pytest.raises(ValueError):
+        list(manifest.iter_lines(rows, START, {}))
+    with pytest.raises(ValueError):
+        list(manifest.iter_lines(rows, START, REGISTRY, "xml"))
+
+def test_split_files_each_with_header(tmp_path):
+    rows = _rows()
+    path = str(tmp_path / "m.csv.gz")
+    stats = manifest.export_manifest(rows, START, path, REGISTRY, split=10, chunk_rows=5)
+    assert len(stats["files"]) > 1 and stats["files"][0].endswith("m_0001.csv.gz")
+    total = 0
+    for p in stats["files"]:
+        with gzip.open(p, "rt", encoding="utf-8") as f:
+            recs = list(csv.DictReader(f))
+        assert 0 < len(recs) < 10 + 5
+        total += sum(int(r["spots"]) for r in recs)
+    assert total == _spots(rows)
+
+def test_registry_csv_and_cli(tmp_path):
+    reg = tmp_path / "stores.csv"
+    with open(reg, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["store_id", "media", "region", "name"])
+        for (media, region), stores in REGISTRY.items():
+            w.writerows([sid, media, region, name] for sid, name in stores)
+    assert manifest.load_registry(str(reg)) == REGISTRY
+
+    quote = tmp_path / "quote.json"
+    quote.write_text(json.dumps({"budget": 200000, "start_date": "2025-01-01", "days": 7, "media": CONFIG}), encoding="utf-8")
+    out = tmp_path / "m.jsonl"
+    assert manifest.main([str(quote), "--out", str(out), "--registry", str(reg), "--no-trace"]) == 0
+    assert sum(json.loads(line)["spots"] for line in out.read_text(encoding="utf-8").splitlines()) == _spots(_rows())
+    quote.write_text(json.dumps({"budget": 200000, "days": 7, "media": {"電視": {}}}), encoding="utf-8")
+    assert manifest.main([str(quote), "--out", str(out), "--no-trace"]) == 1
@@ -0,0 +1,54 @@
+import pytest
+
+import optimizer
+from engine import plan
+
+CONFIG = {
+    "全家廣播": {"is_national": True, "regions": ["全省"], "seconds": [10, 20], "share": 60, "sec_shares": {10: 50, 20: 50}},
+    "新鮮視": {"is_national": False, "regions": ["北區", "東區"], "seconds": [10], "share": 20, "sec_shares": {10: 100}},
+    "家樂福": {"regions": ["全省"], "seconds": [20], "share": 20, "sec_shares": {20: 100}},
+}
+BUDGET = 300000
+STEP = 25
+
+def _brute_force():
+    """ 逐一 plan() 所有 (媒體佔比, 秒數佔比) 配置: {(fm, fm_10, fv, cf): (總檔次, 牌價)} """
+    out = {}
+    for fm in range(0, 101, STEP):
+        for fv in range(0, 101 - fm, STEP):
+            cf = 100 - fm - fv
+            for fm_10 in range(0, 101, STEP):
+                config = {
+                    "全家廣播": dict(CONFIG["全家廣播"], share=fm, sec_shares={10: fm_10, 20: 100 - fm_10}),
+                    "新鮮視": dict(CONFIG["新鮮視"], share=fv),
+                    "家樂福": dict(CONFIG["家樂福"], share=cf),
+                }
+                result = plan(config, BUDGET, 1)
+                out[(fm, fm_10, fv, cf)] = (sum(r.spots for r in result["rows"]), result["total_list"])
+    return out
+
+def _config(rec):
+    fm_10 = int(rec["fm_secs"].split(",")[0].split(":")[1])
+    return (rec["fm_share"], fm_10, rec["fv_share"], rec["cf_share"])
+
+@pytest.mark.parametrize("objective,col", [("spots", 0), ("list", 1)])
+def test_best_matches_brute_force(objective, col):
+    brute = _brute_force()
+    best = optimizer.optimize(CONFIG, BUDGET, objective, step=STEP, top_n=5)
+    assert best["rank"].tolist() == [1, 2, 3, 4, 5]
+    assert best[optimizer.OBJECTIVES[objective]].iloc[0] == max(v[col] for v in brute.values())
+    for rec in best.to_dict("records"):
+        assert (rec["total_spots"], rec["total_list"]) == brute[_config(rec)]
+    assert best[optimizer.OBJECTIVES[objective]].is_monotonic_decreasing
+
+def test_min_shares_and_required_secs():
+    best = optimizer.optimize(CONFIG, BUDGET, step=STEP, top_n=5, min_shares={"家樂福": 30}, required_secs={"全家廣播": [20]})
+    assert (best["cf_share"] >= 50).all()
+    assert all(int(s.split(",")[1].split(":")[1]) >= STEP for s in best["fm_secs"])
+    assert optimizer.optimize(CONFIG, BUDGET, step=STEP, min_shares={"家樂福": 80, "新鮮視": 80}).empty
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        optimizer.optimize(CONFIG, BUDGET, step=30)
+    with pytest.raises(ValueError):
+        optimizer.optimize(CONFIG, BUDGET, objective="reach")
@@ -0,0 +1,67 @@
+import csv
+import io
+from datetime import date
+
+import numpy as np
+import pytest
+
+from engine import DailySchedule, plan
+from playlist import build_playlist, parse_daypart
+
+CONFIG = {
+    "全家廣播": {"is_national": True, "regions": ["全省"], "seconds": [10, 20], "share": 60, "sec_shares": {10: 50, 20: 50}},
+    "家樂福": {"regions": ["全省"], "seconds": [20], "share": 40, "sec_shares": {20: 100}},
+}
+
+def _rows(budget=600000, days=10):
+    return plan(CONFIG, budget, days)["rows"]
+
+def test_parse_daypart():
+    assert parse_daypart("07:00-23:00") == (420, 1380)
+    assert parse_daypart("00:00-24:00") == (0, 1440)
+    with pytest.raises(ValueError):
+        parse_daypart("23:00-07:00")
+
+def test_spots_match_schedule_inside_daypart():
+    rows = _rows()
+    pl = build_playlist(rows)
+    assert len(pl) == sum(r.schedule.total for r in rows)
+    for i, r in enumerate(rows):
+        mine = pl.row == i
+        assert np.bincount(pl.day[mine], minlength=10).tolist() == r.schedule.to_list()
+        lo, hi = parse_daypart(r.daypart)
+        assert (pl.minute[mine] >= lo).all() and (pl.minute[mine] < hi).all()
+    row, day, hour, spots = pl.hourly()
+    assert spots.sum() == len(pl)
+
+def test_versions_interleaved_evenly():
+    """ 同素材的 10 秒 / 20 秒版本交錯排開，當日間隔約為 時段長 / 檔次 """
+    rows = _rows()
+    pl = build_playlist(rows)
+    group, day, gaps = pl.min_gaps()
+    north = [i for i, r in enumerate(rows) if r.media == "全家廣播" and r.region == "北區"]
+    per_day = sum(rows[i].schedule.as_array() for i in north)
+    g = pl.group[north[0]]
+    assert (pl.group[north] == g).all()
+    assert (gaps[group == g] >= 960 // per_day[day[group == g]]).all()
+    assert pl.violations() == 0
+
+def test_violations_when_over_daypart():
+    rows = _rows(budget=60000, days=2)
+    rows[0].schedule = DailySchedule([400, 2])   # 北區 1/1 在 16 小時內排 400 檔以上，間隔不足 5 分鐘
+    pl = build_playlist(rows)
+    assert pl.violations() == 1
+    assert pl.violations(separation=1) == 0
+
+def test_csv_minute_and_hour():
+    rows = _rows(days=3)
+    pl = build_playlist(rows)
+    text = pl.to_csv(date(2025, 1, 1)).decode("utf-8-sig")
+    recs = list(csv.DictReader(io.StringIO(text)))
+    assert len(recs) == len(pl)
+    assert list(recs[0]) == ["date", "time", "media", "region", "location", "daypart", "seconds"]
+    assert {r["date"] for r in recs} == {"2025-01-01", "2025-01-02", "2025-01-03"}
+    hourly = pl.to_frame(date(2025, 1, 1), "hour")
+    assert hourly["spots"].sum() == len(pl) and hourly["hour"].between(0, 23).all()
+    with pytest.raises(ValueError):
+        pl.to_frame(date(2025, 1, 1), "second")
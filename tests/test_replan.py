@@ -0,0 +1,73 @@
+from datetime import date
+
+import numpy as np
+
+import ratecard
+import replan
+from engine import plan
+
+CONFIG = {
+    "全家廣播": {"is_national": True, "regions": ["全省"], "seconds": [10, 20], "share": 50, "sec_shares": {10: 50, 20: 50}},
+    "新鮮視": {"is_national": False, "regions": ["北區", "中區"], "seconds": [10], "share": 30, "sec_shares": {10: 100}},
+    "家樂福": {"regions": ["全省"], "seconds": [20], "share": 20, "sec_shares": {20: 100}},
+}
+START = date(2025, 1, 1)
+AS_OF = date(2025, 1, 15)   # 已播 14 天
+
+def _quote(budget=1000000, days=31):
+    inputs = {"config_media": CONFIG, "budget": budget, "start_date": START, "days": days, "client": "c", "flighting": None}
+    return inputs, plan(CONFIG, budget, days)
+
+def _amounts(rows):
+    return [(r.media, r.region, r.seconds, r.pkg_display_val) for r in rows]
+
+def test_no_change_keeps_rows():
+    """ 照原排程播出、條件不變: 沒有差異，各列沿用原列 (不重建排程) """
+    inputs, result = _quote()
+    out = replan.replan_quote(inputs, result, AS_OF)
+    assert out["changes"].empty
+    assert set(out["summary"]["status"]) == {"不變"}
+    assert all(new is old for new, old in zip(out["rows"], result["rows"]))
+    assert out["total_list"] == result["total_list"]
+
+def test_under_delivery_made_up_in_remaining_days():
+    """ 未播足的檔次補到剩餘日子；已播日子以實際為準，金額維持報價 """
+    inputs, result = _quote()
+    rows = result["rows"]
+    aired = np.stack([r.schedule.as_array()[:14] for r in rows])
+    aired[0, 3] -= 2   # 全家廣播北區 1/4 少播 2 檔 (全省聯播其他區照播)
+    out = replan.replan_quote(inputs, result, AS_OF, aired)
+
+    new = out["rows"][0]
+    assert new.schedule.total == rows[0].schedule.total
+    assert new.schedule.window(0, 14) == aired[0].tolist()
+    assert new.schedule.window_total(14, 17) == rows[0].schedule.window_total(14, 17) + 2
+    changed = out["summary"][out["summary"]["status"] == "變動"]
+    assert list(zip(changed["media"], changed["region"], changed["seconds"])) == [("全家廣播", "北區", 10)]
+    assert (out["changes"]["date"] >= date(2025, 1, 4)).all()
+    assert _amounts(out["rows"]) == _amounts(rows)
+    assert out["total_list"] == result["total_list"]
+
+def test_extension_replans_only_the_remaining_window():
+    """ 延長走期: 前 14 天不變，新目標依新條件的 plan() (與新報價的金額 / Total 一致) """
+    inputs, result = _quote()
+    out = replan.replan_quote(inputs, result, AS_OF, end_date=date(2025, 2, 28))
+    new_plan = plan(CONFIG, 1000000, 59)
+
+    assert out["days"] == 59
+    assert (out["changes"]["date"] >= AS_OF).all()
+    for old, new, target in zip(result["rows"], out["rows"], new_plan["rows"]):
+        assert new.schedule.days == 59
+        assert new.schedule.window(0, 14) == old.schedule.window(0, 14)
+        assert new.schedule.total == target.schedule.total
+        assert new.pkg_display_val == target.pkg_display_val
+    assert out["total_list"] == new_plan["total_list"]
+
+def test_dropped_rows_keep_quoted_amounts_in_total():
+    """ 新報價沒有的列 (預算歸零): 保留已播部分，金額與原報價相同並計入 Total (List) """
+    inputs, result = _quote()
+    out = replan.replan_quote(inputs, result, AS_OF, budget=0)
+    assert len(out["dropped"]) == len(result["rows"])
+    assert all(r.schedule.window_total(14, 17) == 0 for r in out["rows"])
+    assert _amounts(out["rows"]) == _amounts(result["rows"])
+    assert out["total_list"] == replan._quoted_list(result["rows"], ratecard.current()) == result["total_list"]
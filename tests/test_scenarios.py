@@ -0,0 +1,46 @@
+import scenarios
+from engine import plan, summarize
+
+BRIEF = {"budget": 300000, "days": 30, "fm_share": 70, "fm_secs": "10:50,20:50", "fm_regions": "全省",
+         "cf_share": 30, "cf_secs": "20:100"}
+
+def _config(rec):
+    """ 情境列 -> plan() 的 config_media """
+    fm_secs = dict((int(s), int(v)) for s, v in (p.split(":") for p in rec["fm_secs"].split(",")))
+    return {
+        "全家廣播": {"is_national": True, "regions": ["全省"], "seconds": sorted(fm_secs), "share": rec["fm_share"], "sec_shares": fm_secs},
+        "家樂福": {"regions": ["全省"], "seconds": [20], "share": rec["cf_share"], "sec_shares": {20: 100}},
+    }
+
+def test_grid_helpers():
+    assert scenarios.budget_steps(100000, 300000, 100000) == [100000, 200000, 300000]
+    assert scenarios.budget_steps(100000, 50000, 100000) == [100000]
+    assert scenarios.two_way_splits((10, 20), 50) == ["10:0,20:100", "10:50,20:50", "10:100,20:0"]
+    grid = scenarios.scenario_grid(BRIEF, [100000], fm_shares=[40, 80], fv_shares=[0, 30])
+    assert list(zip(grid["fm_share"], grid["fv_share"], grid["cf_share"])) == [(40, 0, 60), (40, 30, 30), (80, 0, 20)]
+
+def test_sweep_matches_plan():
+    points = scenarios.sweep(BRIEF, [100000, 300000], fm_shares=[50, 70],
+                             sec_splits={"fm": scenarios.two_way_splits((10, 20), 50)})
+    assert len(points) == 2 * 2 * 3
+    for rec in points.to_dict("records"):
+        result = plan(_config(rec), rec["budget"], 30)
+        assert rec["total_spots"] == sum(r.spots for r in result["rows"])
+        assert rec["total_list"] == result["total_list"]
+        assert rec["grand_total"] == summarize(rec["budget"], result["total_list"])["grand_total"]
+        under = {log["media"] for log in result["logs"] if log["status"] != "達標"}
+        assert (rec["fm_x11"], rec["cf_x11"]) == ("全家廣播" in under, "家樂福" in under)
+
+def test_penalty_budgets_are_thresholds():
+    """ 總預算略高於門檻即不觸發 x1.1，略低則觸發 """
+    thresholds = dict(((m, sec), t) for m, sec, t in scenarios.penalty_budgets(BRIEF))
+    assert set(thresholds) == {("全家廣播", 10), ("全家廣播", 20), ("家樂福", 20)}
+    fm = max(t for (m, _), t in thresholds.items() if m == "全家廣播")
+    points = scenarios.sweep(BRIEF, [fm * 0.999, fm * 1.001])
+    assert points["fm_x11"].tolist() == [True, False]
+    cf = thresholds[("家樂福", 20)]
+    assert scenarios.sweep(BRIEF, [cf * 0.999, cf * 1.001])["cf_x11"].tolist() == [True, False]
+    assert scenarios.penalty_budgets(dict(BRIEF, fm_share=0, cf_share=0)) == []
+
+def test_empty_grid():
+    assert scenarios.sweep(BRIEF, [100000], fm_shares=[80], fv_shares=[30]).empty
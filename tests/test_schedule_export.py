@@ -0,0 +1,59 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date
+
+import schedule_export
+from engine import plan
+from textstream import csv_field, iter_chunks
+
+CONFIG = {
+    "全家廣播": {"is_national": True, "regions": ["全省"], "seconds": [20], "share": 70, "sec_shares": {20: 100}},
+    "家樂福": {"regions": ["全省"], "seconds": [10], "share": 30, "sec_shares": {10: 100}},
+}
+
+def _campaigns():
+    return [{"campaign": 1, "client": "萬國, 通路", "start_date": date(2025, 1, 1), "rows": plan(CONFIG, 300000, 14)["rows"]},
+            {"campaign": 2, "client": "大同", "start_date": date(2025, 2, 1), "rows": plan(CONFIG, 100000, 5)["rows"]}]
+
+def _text(fmt, max_days=14, chunk_rows=7):
+    chunks = list(schedule_export.iter_export(_campaigns(), fmt, max_days, chunk_rows))
+    return "".join(text for text, _ in chunks), sum(n for _, n in chunks)
+
+def test_long_format_lists_every_spot_day():
+    text, n = _text("long")
+    recs = list(csv.DictReader(io.StringIO(text)))
+    assert len(recs) == n
+    campaigns = _campaigns()
+    for c in campaigns:
+        mine = [r for r in recs if r["campaign"] == str(c["campaign"])]
+        assert sum(int(r["spots"]) for r in mine) == sum(r.schedule.total for r in c["rows"])
+        assert all(int(r["spots"]) > 0 for r in mine)
+    # 依日期再依列排序
+    first = [r for r in recs if r["campaign"] == "1"]
+    assert [r["date"] for r in first] == sorted(r["date"] for r in first)
+    assert first[0]["date"] == "2025-01-01" and first[0]["region"] == "北區"
+
+def test_csv_pads_shorter_campaigns_and_quotes_fields():
+    text, n = _text("csv")
+    recs = list(csv.reader(io.StringIO(text)))
+    assert recs[0][-1] == "d14" and len(recs) == n + 1
+    assert {len(r) for r in recs} == {len(schedule_export.CSV_COLUMNS) + 14}
+    assert recs[1][1] == "萬國, 通路"
+    short = [r for r in recs[1:] if r[0] == "2"]
+    assert short and all(r[-9:] == [""] * 9 for r in short)
+
+def test_jsonl_schedule_matches_rows(tmp_path):
+    path = str(tmp_path / "s.jsonl.gz")
+    stats = schedule_export.export_schedules(_campaigns(), path, "jsonl", 14)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        recs = [json.loads(line) for line in f]
+    assert stats["rows"] == len(recs) == sum(len(c["rows"]) for c in _campaigns())
+    for rec, row in zip(recs, _campaigns()[0]["rows"]):
+        assert rec["schedule"] == row.schedule.to_list() and rec["spots"] == row.spots
+
+def test_textstream_helpers():
+    assert csv_field('a,"b"') == '"a,""b"""' and csv_field(20) == "20"
+    chunks = list(iter_chunks([("a\n", 1), ("b\nc\n", 2), ("d\n", 1)], chunk_rows=3))
+    assert chunks == [("a\nb\nc\n", 3), ("d\n", 1)]
@@ -0,0 +1,46 @@
+import pytest
+
+from quote_request import MAX_DAYS, BadRequest, parse_request
+from service import QuoteService
+
+@pytest.mark.parametrize("media", [
+    [1],
+    "家樂福",
+    {"家樂福": 3},
+    {"家樂福": {"sec_shares": [20]}},
+    {"家樂福": {"sec_shares": {"二十": 100}}},
+    {"電視": {}},
+    {"家樂福": {"share": "100", "sec_shares": {"20": 100}}},
+    {"家樂福": {"share": True, "sec_shares": {"20": 100}}},
+    {"家樂福": {"share": 120, "sec_shares": {"20": 100}}},
+    {"家樂福": {"share": 100, "sec_shares": {"20": "100"}}},
+    {"家樂福": {"share": 100, "sec_shares": {"20": -5}}},
+    {"新鮮視": {"share": 100, "regions": "北區", "sec_shares": {"10": 100}}},
+    {"新鮮視": {"share": 100, "regions": ["北區", 3], "sec_shares": {"10": 100}}},
+])
+def test_malformed_media_is_bad_request(media):
+    """ media 格式錯誤回 400 (BadRequest)，不是 500 """
+    with pytest.raises(BadRequest):
+        parse_request({"budget": 100000, "days": 7, "media": media})
+
+def test_media_normalized():
+    config_media, budget, _, days, _ = parse_request(
+        {"budget": 100000, "days": 7, "media": {"家樂福": {"share": 100, "sec_shares": {"20": 100}}}})
+    assert config_media == {"家樂福": {"seconds": [20], "share": 100, "sec_shares": {20: 100}, "regions": ["全省"]}}
+    assert (budget, days) == (100000, 7)
+
+@pytest.mark.parametrize("payload", [
+    {"budget": 100000, "days": MAX_DAYS + 1},
+    {"budget": 100000, "days": 0},
+    {"budget": 100000, "start_date": "2025-01-01", "end_date": "2035-01-01"},
+    {"budget": True, "days": 7},
+])
+def test_bad_budget_or_days(payload):
+    with pytest.raises(BadRequest):
+        parse_request(dict(payload, media={"家樂福": {"share": 100, "sec_shares": {"20": 100}}}))
+
+def test_quote_rejects_before_planning():
+    """ 字串佔比在計算前就回 BadRequest (以前到 plan() 才 TypeError -> 500) """
+    service = QuoteService(workers=1)
+    with pytest.raises(BadRequest):
+        service.quote({"budget": 100000, "days": 7, "media": {"家樂福": {"share": 100, "sec_shares": {"20": "100"}}}})